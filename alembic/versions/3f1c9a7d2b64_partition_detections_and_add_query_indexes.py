@@ -0,0 +1,179 @@
+"""Partition detections by month and add query indexes
+
+Revision ID: 3f1c9a7d2b64
+Revises: 96782474bacd
+Create Date: 2025-07-08 10:12:41.905113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b64'
+down_revision = '96782474bacd'
+branch_labels = None
+depends_on = None
+
+# Months of partitions created ahead of the current month, then kept ahead by services.partitions
+MONTHS_AHEAD = 3
+
+DETECTION_COLUMNS = (
+    "id, plate_number, confidence, detection_confidence, recognition_confidence, ocr_text, bounding_box, "
+    "recognition_polygon, image_path, image_data, processing_time, vehicle_type, vehicle_color, vehicle_brand, "
+    "vehicle_model, detection_metadata, is_alert_triggered, vehicle_id, camera_id, created_by_id, detected_at, "
+    "created_at, updated_at"
+)
+
+# Creates the partition of the month of `month` (months start in UTC). Rows of that month already stored in the
+# default partition would prevent attaching it, so they are moved into the new partition.
+CREATE_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_detections_partition(month date) RETURNS text AS $$
+DECLARE
+    start_at timestamptz := date_trunc('month', month::timestamp) AT TIME ZONE 'UTC';
+    end_at timestamptz := (date_trunc('month', month::timestamp) + interval '1 month') AT TIME ZONE 'UTC';
+    partition_name text := format('detections_%s', to_char(month, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN partition_name;
+    END IF;
+    CREATE TEMP TABLE detections_moved AS
+        SELECT * FROM detections_default WHERE detected_at >= start_at AND detected_at < end_at;
+    DELETE FROM detections_default WHERE detected_at >= start_at AND detected_at < end_at;
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF detections FOR VALUES FROM (%L) TO (%L)', partition_name, start_at, end_at
+    );
+    INSERT INTO detections SELECT * FROM detections_moved;
+    DROP TABLE detections_moved;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Creates the partitions of the current month and of the `months_ahead` following months, returns their names
+CREATE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION create_detections_partitions(months_ahead integer DEFAULT 3) RETURNS SETOF text AS $$
+    SELECT create_detections_partition(month::date)
+    FROM generate_series(
+        date_trunc('month', now() AT TIME ZONE 'UTC'),
+        date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => months_ahead),
+        interval '1 month'
+    ) AS month;
+$$ LANGUAGE sql
+"""
+
+
+def upgrade() -> None:
+    # A primary or unique key of a partitioned table must contain the partition key, so detections.id can no longer
+    # be referenced on its own: alerts keep detection_id without a foreign key constraint.
+    op.drop_constraint('alerts_detection_id_fkey', 'alerts', type_='foreignkey')
+
+    # Keep the data and the id sequence aside while the partitioned table replaces the plain one
+    op.execute("ALTER TABLE detections RENAME TO detections_unpartitioned")
+    op.execute("ALTER TABLE detections_unpartitioned RENAME CONSTRAINT detections_pkey TO detections_unpartitioned_pkey")
+    op.drop_index('ix_detections_id', table_name='detections_unpartitioned')
+    op.drop_index('ix_detections_plate_number', table_name='detections_unpartitioned')
+    op.execute("ALTER SEQUENCE detections_id_seq OWNED BY NONE")
+
+    op.create_table('detections',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('detections_id_seq'::regclass)"), nullable=False),
+    sa.Column('plate_number', sa.String(), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=False),
+    sa.Column('detection_confidence', sa.Float(), nullable=True),
+    sa.Column('recognition_confidence', sa.Float(), nullable=True),
+    sa.Column('ocr_text', sa.String(), nullable=True),
+    sa.Column('bounding_box', sa.JSON(), nullable=True),
+    sa.Column('recognition_polygon', sa.JSON(), nullable=True),
+    sa.Column('image_path', sa.String(), nullable=True),
+    sa.Column('image_data', sa.Text(), nullable=True),
+    sa.Column('processing_time', sa.Float(), nullable=True),
+    sa.Column('vehicle_type', sa.String(), nullable=True),
+    sa.Column('vehicle_color', sa.String(), nullable=True),
+    sa.Column('vehicle_brand', sa.String(), nullable=True),
+    sa.Column('vehicle_model', sa.String(), nullable=True),
+    sa.Column('detection_metadata', sa.JSON(), nullable=True),
+    sa.Column('is_alert_triggered', sa.Boolean(), server_default=sa.text('false'), nullable=False),
+    sa.Column('vehicle_id', sa.Integer(), nullable=True),
+    sa.Column('camera_id', sa.Integer(), nullable=True),
+    sa.Column('created_by_id', sa.Integer(), nullable=True),
+    sa.Column('detected_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['camera_id'], ['cameras.id'], ),
+    sa.ForeignKeyConstraint(['created_by_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['vehicle_id'], ['vehicles.id'], ),
+    sa.PrimaryKeyConstraint('id', 'detected_at'),
+    postgresql_partition_by='RANGE (detected_at)'
+    )
+    # Rows outside every monthly partition, e.g. when the partitions were not created in time
+    op.execute("CREATE TABLE detections_default PARTITION OF detections DEFAULT")
+    op.execute(CREATE_PARTITION_FUNCTION)
+    op.execute(CREATE_PARTITIONS_FUNCTION)
+
+    # Indexes of the parent are created on every partition, present and future
+    op.create_index('ix_detections_camera_id_detected_at', 'detections', ['camera_id', 'detected_at'], unique=False)
+    op.create_index('ix_detections_plate_number_detected_at', 'detections', ['plate_number', 'detected_at'], unique=False)
+    op.create_index('ix_detections_alert_triggered_detected_at', 'detections', ['detected_at'], unique=False,
+                    postgresql_where=sa.text('is_alert_triggered'))
+
+    # One partition per month of existing data up to MONTHS_AHEAD months from now, then the data itself
+    op.execute(f"""
+        SELECT create_detections_partition(month::date)
+        FROM generate_series(
+            date_trunc('month', coalesce((SELECT min(detected_at) FROM detections_unpartitioned), now()) AT TIME ZONE 'UTC'),
+            date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months',
+            interval '1 month'
+        ) AS month
+    """)
+    op.execute(f"INSERT INTO detections ({DETECTION_COLUMNS}) SELECT {DETECTION_COLUMNS} FROM detections_unpartitioned")
+    op.drop_table('detections_unpartitioned')
+    op.execute("ALTER SEQUENCE detections_id_seq OWNED BY detections.id")
+
+    op.create_index('ix_alerts_detection_id', 'alerts', ['detection_id'], unique=False)
+    op.create_index('ix_alerts_status_created_at', 'alerts', ['status', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_alerts_status_created_at', table_name='alerts')
+    op.drop_index('ix_alerts_detection_id', table_name='alerts')
+
+    op.execute("ALTER TABLE detections RENAME TO detections_partitioned")
+    op.execute("ALTER TABLE detections_partitioned RENAME CONSTRAINT detections_pkey TO detections_partitioned_pkey")
+    op.execute("ALTER SEQUENCE detections_id_seq OWNED BY NONE")
+    op.create_table('detections',
+    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('detections_id_seq'::regclass)"), autoincrement=False, nullable=False),
+    sa.Column('plate_number', sa.String(), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=False),
+    sa.Column('detection_confidence', sa.Float(), nullable=True),
+    sa.Column('recognition_confidence', sa.Float(), nullable=True),
+    sa.Column('ocr_text', sa.String(), nullable=True),
+    sa.Column('bounding_box', sa.JSON(), nullable=True),
+    sa.Column('recognition_polygon', sa.JSON(), nullable=True),
+    sa.Column('image_path', sa.String(), nullable=True),
+    sa.Column('image_data', sa.Text(), nullable=True),
+    sa.Column('processing_time', sa.Float(), nullable=True),
+    sa.Column('vehicle_type', sa.String(), nullable=True),
+    sa.Column('vehicle_color', sa.String(), nullable=True),
+    sa.Column('vehicle_brand', sa.String(), nullable=True),
+    sa.Column('vehicle_model', sa.String(), nullable=True),
+    sa.Column('detection_metadata', sa.JSON(), nullable=True),
+    sa.Column('is_alert_triggered', sa.Boolean(), nullable=False),
+    sa.Column('vehicle_id', sa.Integer(), nullable=True),
+    sa.Column('camera_id', sa.Integer(), nullable=True),
+    sa.Column('created_by_id', sa.Integer(), nullable=True),
+    sa.Column('detected_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['camera_id'], ['cameras.id'], ),
+    sa.ForeignKeyConstraint(['created_by_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['vehicle_id'], ['vehicles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f"INSERT INTO detections ({DETECTION_COLUMNS}) SELECT {DETECTION_COLUMNS} FROM detections_partitioned")
+    op.execute("DROP TABLE detections_partitioned CASCADE")
+    op.execute("ALTER SEQUENCE detections_id_seq OWNED BY detections.id")
+    op.execute("DROP FUNCTION create_detections_partitions(integer)")
+    op.execute("DROP FUNCTION create_detections_partition(date)")
+    op.create_index('ix_detections_id', 'detections', ['id'], unique=False)
+    op.create_index('ix_detections_plate_number', 'detections', ['plate_number'], unique=False)
+    op.create_foreign_key('alerts_detection_id_fkey', 'alerts', 'detections', ['detection_id'], ['id'])
@@ -1,7 +1,7 @@
 """Initial database schema
 
 Revision ID: 96782474bacd
-Revises: 
+Revises:
 Create Date: 2025-06-24 06:45:23.487418
 
 """
@@ -18,11 +18,175 @@ depends_on = None
 
 def upgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
-    pass
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('hashed_password', sa.String(), nullable=False),
+    sa.Column('first_name', sa.String(), nullable=False),
+    sa.Column('last_name', sa.String(), nullable=False),
+    sa.Column('role', sa.Enum('ADMIN', 'OPERATOR', 'VIEWER', name='userrole'), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('last_login', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_table('cameras',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('location_name', sa.String(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.Column('address', sa.String(), nullable=True),
+    sa.Column('camera_type', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('stream_url', sa.String(), nullable=True),
+    sa.Column('rtsp_url', sa.String(), nullable=True),
+    sa.Column('ip_address', sa.String(), nullable=True),
+    sa.Column('port', sa.Integer(), nullable=True),
+    sa.Column('username', sa.String(), nullable=True),
+    sa.Column('password', sa.String(), nullable=True),
+    sa.Column('camera_settings', sa.JSON(), nullable=True),
+    sa.Column('last_ping', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cameras_id'), 'cameras', ['id'], unique=False)
+    op.create_table('vehicles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plate_number', sa.String(), nullable=False),
+    sa.Column('brand', sa.String(), nullable=True),
+    sa.Column('model', sa.String(), nullable=True),
+    sa.Column('color', sa.String(), nullable=True),
+    sa.Column('vehicle_type', sa.String(), nullable=True),
+    sa.Column('year', sa.Integer(), nullable=True),
+    sa.Column('country', sa.String(), nullable=False),
+    sa.Column('is_stolen', sa.Boolean(), nullable=False),
+    sa.Column('stolen_reported_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('stolen_reported_by', sa.Integer(), nullable=True),
+    sa.Column('vehicle_metadata', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_vehicles_id'), 'vehicles', ['id'], unique=False)
+    op.create_index(op.f('ix_vehicles_plate_number'), 'vehicles', ['plate_number'], unique=True)
+    op.create_table('detections',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plate_number', sa.String(), nullable=False),
+    sa.Column('confidence', sa.Float(), nullable=False),
+    sa.Column('detection_confidence', sa.Float(), nullable=True),
+    sa.Column('recognition_confidence', sa.Float(), nullable=True),
+    sa.Column('ocr_text', sa.String(), nullable=True),
+    sa.Column('bounding_box', sa.JSON(), nullable=True),
+    sa.Column('recognition_polygon', sa.JSON(), nullable=True),
+    sa.Column('image_path', sa.String(), nullable=True),
+    sa.Column('image_data', sa.Text(), nullable=True),
+    sa.Column('processing_time', sa.Float(), nullable=True),
+    sa.Column('vehicle_type', sa.String(), nullable=True),
+    sa.Column('vehicle_color', sa.String(), nullable=True),
+    sa.Column('vehicle_brand', sa.String(), nullable=True),
+    sa.Column('vehicle_model', sa.String(), nullable=True),
+    sa.Column('detection_metadata', sa.JSON(), nullable=True),
+    sa.Column('is_alert_triggered', sa.Boolean(), nullable=False),
+    sa.Column('vehicle_id', sa.Integer(), nullable=True),
+    sa.Column('camera_id', sa.Integer(), nullable=True),
+    sa.Column('created_by_id', sa.Integer(), nullable=True),
+    sa.Column('detected_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['camera_id'], ['cameras.id'], ),
+    sa.ForeignKeyConstraint(['created_by_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['vehicle_id'], ['vehicles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_detections_id'), 'detections', ['id'], unique=False)
+    op.create_index(op.f('ix_detections_plate_number'), 'detections', ['plate_number'], unique=False)
+    op.create_table('stolen_vehicles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('plate_number', sa.String(), nullable=False),
+    sa.Column('report_number', sa.String(), nullable=False),
+    sa.Column('stolen_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('stolen_location', sa.String(), nullable=True),
+    sa.Column('stolen_location_lat', sa.Float(), nullable=True),
+    sa.Column('stolen_location_lng', sa.Float(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('police_station', sa.String(), nullable=True),
+    sa.Column('contact_person', sa.String(), nullable=True),
+    sa.Column('contact_phone', sa.String(), nullable=True),
+    sa.Column('contact_email', sa.String(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('recovered_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('recovered_location', sa.String(), nullable=True),
+    sa.Column('recovery_notes', sa.Text(), nullable=True),
+    sa.Column('stolen_vehicle_metadata', sa.JSON(), nullable=True),
+    sa.Column('vehicle_id', sa.Integer(), nullable=False),
+    sa.Column('reported_by_id', sa.Integer(), nullable=False),
+    sa.Column('recovered_by_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['recovered_by_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['reported_by_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['vehicle_id'], ['vehicles.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('report_number')
+    )
+    op.create_index(op.f('ix_stolen_vehicles_id'), 'stolen_vehicles', ['id'], unique=False)
+    op.create_index(op.f('ix_stolen_vehicles_plate_number'), 'stolen_vehicles', ['plate_number'], unique=False)
+    op.create_table('alerts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.Enum('STOLEN_VEHICLE', 'SUSPICIOUS_VEHICLE', 'CAMERA_OFFLINE', 'DETECTION_ERROR', 'SYSTEM_ERROR', 'LOW_CONFIDENCE', name='alerttype'), nullable=False),
+    sa.Column('severity', sa.Enum('LOW', 'MEDIUM', 'HIGH', 'CRITICAL', name='alertseverity'), nullable=False),
+    sa.Column('status', sa.Enum('NEW', 'ACKNOWLEDGED', 'RESOLVED', 'DISMISSED', name='alertstatus'), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('details', sa.JSON(), nullable=True),
+    sa.Column('acknowledged_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('resolved_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('acknowledged_by_id', sa.Integer(), nullable=True),
+    sa.Column('resolved_by_id', sa.Integer(), nullable=True),
+    sa.Column('detection_id', sa.Integer(), nullable=True),
+    sa.Column('vehicle_id', sa.Integer(), nullable=True),
+    sa.Column('camera_id', sa.Integer(), nullable=True),
+    sa.Column('created_by_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.ForeignKeyConstraint(['acknowledged_by_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['camera_id'], ['cameras.id'], ),
+    sa.ForeignKeyConstraint(['created_by_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['detection_id'], ['detections.id'], ),
+    sa.ForeignKeyConstraint(['resolved_by_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['vehicle_id'], ['vehicles.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alerts_id'), 'alerts', ['id'], unique=False)
     # ### end Alembic commands ###
 
 
 def downgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
-    pass
-    # ### end Alembic commands ### 
\ No newline at end of file
+    op.drop_index(op.f('ix_alerts_id'), table_name='alerts')
+    op.drop_table('alerts')
+    op.drop_index(op.f('ix_stolen_vehicles_plate_number'), table_name='stolen_vehicles')
+    op.drop_index(op.f('ix_stolen_vehicles_id'), table_name='stolen_vehicles')
+    op.drop_table('stolen_vehicles')
+    op.drop_index(op.f('ix_detections_plate_number'), table_name='detections')
+    op.drop_index(op.f('ix_detections_id'), table_name='detections')
+    op.drop_table('detections')
+    op.drop_index(op.f('ix_vehicles_plate_number'), table_name='vehicles')
+    op.drop_index(op.f('ix_vehicles_id'), table_name='vehicles')
+    op.drop_table('vehicles')
+    op.drop_index(op.f('ix_cameras_id'), table_name='cameras')
+    op.drop_table('cameras')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    sa.Enum(name='alertstatus').drop(op.get_bind(), checkfirst=False)
+    sa.Enum(name='alertseverity').drop(op.get_bind(), checkfirst=False)
+    sa.Enum(name='alerttype').drop(op.get_bind(), checkfirst=False)
+    sa.Enum(name='userrole').drop(op.get_bind(), checkfirst=False)
+    # ### end Alembic commands ###
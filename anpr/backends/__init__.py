@@ -0,0 +1,59 @@
+from pathlib import Path
+from typing import Optional, Union
+
+BACKENDS = ("reference", "onnxruntime", "openvino")
+
+# Default location of the models exported by `python -m anpr.export`
+ONNX_DIR = Path(__file__).parent.parent / 'onnx'
+DETECTOR_ONNX = 'detector.onnx'
+RECOGNISER_ONNX = 'recogniser.onnx'
+CHARACTER_DICT = 'rec_dict.txt'
+
+
+def create_detector(
+        backend: str,
+        detection_model: Union[str, Path],
+        device: str,
+        num_threads: Optional[int] = None,
+        onnx_dir: Union[str, Path] = ONNX_DIR
+):
+    """Creates the plate detector of a backend: ultralytics for "reference", the exported ONNX model otherwise."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Expected backend to be one of {BACKENDS}, but {backend} received.")
+    if backend == "reference":
+        from ..detection import Detector
+        return Detector(detection_model=detection_model, device=device, num_threads=num_threads)
+    if device != "cpu":
+        raise ValueError(f"The {backend} backend runs on cpu, but {device} received.")
+    from .detection import OnnxDetector
+    return OnnxDetector(Path(onnx_dir) / DETECTOR_ONNX, engine=backend, num_threads=num_threads)
+
+
+def create_recogniser(
+        backend: str,
+        device: str,
+        batch_size: int = 8,
+        mode: str = "det_rec",
+        num_threads: Optional[int] = None,
+        onnx_dir: Union[str, Path] = ONNX_DIR,
+        model_dir: Optional[Union[str, Path]] = None
+):
+    """Creates the plate recogniser of a backend: PaddleOCR for "reference", loaded from the `model_dir` cache if
+    given, the exported ONNX model otherwise. Only the recognition model is exported, so the ONNX backends need the
+    "rec" mode."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Expected backend to be one of {BACKENDS}, but {backend} received.")
+    if backend == "reference":
+        from ..recognition import Recogniser
+        return Recogniser(
+            device=device, batch_size=batch_size, mode=mode, num_threads=num_threads, model_dir=model_dir
+        )
+    if device != "cpu":
+        raise ValueError(f"The {backend} backend runs on cpu, but {device} received.")
+    if mode != "rec":
+        raise ValueError(f"The {backend} backend only supports the \"rec\" mode, but {mode} received.")
+    from .recognition import OnnxRecogniser
+    return OnnxRecogniser(
+        Path(onnx_dir) / RECOGNISER_ONNX, Path(onnx_dir) / CHARACTER_DICT, engine=backend, num_threads=num_threads,
+        batch_size=batch_size
+    )
@@ -0,0 +1,99 @@
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+from ..detection import Detection, crop_detections
+from .sessions import SESSIONS
+
+
+class OnnxDetector:
+    """Runs the YOLOv8 plate detector exported to ONNX by `python -m anpr.export`, reproducing the pre and post
+    processing of `ultralytics` (letterbox, NMS, rescaling) so that its detections match the reference `Detector`.
+
+    Frames are letterboxed to the full `image_size` square, where ultralytics only pads them to a multiple of the
+    model stride, so boxes and confidences differ slightly from the reference, see `tests/test_backends.py`."""
+
+    def __init__(
+            self,
+            model: Union[str, Path],
+            engine: str = "onnxruntime",
+            num_threads: Optional[int] = None,
+            conf_threshold: float = 0.25,
+            iou_threshold: float = 0.7,
+            max_det: int = 300
+    ):
+        self.session = SESSIONS[engine](model, num_threads=num_threads)
+        self.image_size = self.session.input_shape[2] if isinstance(self.session.input_shape[2], int) else 640
+        self.conf_threshold = conf_threshold
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+    def run(self, images: List[np.ndarray]) -> List[List[Detection]]:
+        inputs = [_letterbox(image, self.image_size) for image in images]
+        if self.session.dynamic_batch:
+            outputs = list(self.session.run(np.stack(inputs))[0])
+        else:
+            outputs = [self.session.run(image[None])[0][0] for image in inputs]
+
+        results = []
+        for image, output in zip(images, outputs):
+            det_boxes, det_confs = _postprocess(
+                output, image.shape[:2], self.image_size, self.conf_threshold, self.iou_threshold, self.max_det
+            )
+            results.append(crop_detections(image, det_boxes, det_confs))
+        return results
+
+
+def _letterbox(image: np.ndarray, size: int) -> np.ndarray:
+    """Resizes and pads an image to a `size` square CHW float input, as `ultralytics.data.augment.LetterBox`."""
+    height, width = image.shape[:2]
+    ratio = min(size / height, size / width)
+    resized_width, resized_height = int(round(width * ratio)), int(round(height * ratio))
+    pad_x, pad_y = (size - resized_width) / 2, (size - resized_height) / 2
+    if (width, height) != (resized_width, resized_height):
+        image = cv2.resize(image, (resized_width, resized_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+    # ultralytics treats ndarray inputs as BGR and reverses their channels
+    return np.ascontiguousarray(image[..., ::-1].transpose(2, 0, 1), dtype=np.float32) / 255.0
+
+
+def _postprocess(
+        output: np.ndarray,
+        image_shape: Tuple[int, int],
+        size: int,
+        conf_threshold: float,
+        iou_threshold: float,
+        max_det: int
+) -> Tuple[List[List[int]], List[float]]:
+    """Converts a raw (4 + classes, anchors) YOLOv8 output into integer boxes in image coordinates, highest
+    confidence first."""
+    predictions = output.T
+    confs = predictions[:, 4:].max(axis=1)
+    keep = confs > conf_threshold
+    predictions, confs = predictions[keep], confs[keep]
+    if len(predictions) == 0:
+        return [], []
+
+    # cx, cy, w, h to x_min, y_min, x_max, y_max
+    boxes = np.empty((len(predictions), 4), dtype=np.float32)
+    boxes[:, :2] = predictions[:, :2] - predictions[:, 2:4] / 2
+    boxes[:, 2:] = predictions[:, :2] + predictions[:, 2:4] / 2
+
+    indices = cv2.dnn.NMSBoxes(
+        np.concatenate([boxes[:, :2], boxes[:, 2:] - boxes[:, :2]], axis=1).tolist(), confs.tolist(),
+        conf_threshold, iou_threshold
+    )
+    indices = np.asarray(indices, dtype=int).reshape(-1)[:max_det]
+    boxes, confs = boxes[indices], confs[indices]
+
+    # Undo the letterbox as `ultralytics.utils.ops.scale_boxes`
+    height, width = image_shape
+    gain = min(size / height, size / width)
+    pad_x = round((size - width * gain) / 2 - 0.1)
+    pad_y = round((size - height * gain) / 2 - 0.1)
+    boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad_x) / gain).clip(0, width)
+    boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad_y) / gain).clip(0, height)
+    return boxes.astype(int).tolist(), confs.tolist()
@@ -0,0 +1,90 @@
+import cv2
+import math
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+from ..recognition import Recognition, _clean_text
+from .sessions import SESSIONS
+
+
+class OnnxRecogniser:
+    """Runs the PaddleOCR text recognition model exported to ONNX by `python -m anpr.export`, reproducing the
+    pre-processing and CTC decoding of PaddleOCR's `TextRecognizer`.
+
+    Only the recognition model is exported, so every crop is read as a single text line, like the "rec" mode of
+    `Recogniser` but without its line detection fallback for multi-line plates.
+    """
+
+    def __init__(
+            self,
+            model: Union[str, Path],
+            character_dict: Union[str, Path],
+            engine: str = "onnxruntime",
+            num_threads: Optional[int] = None,
+            batch_size: int = 8,
+            image_shape: Tuple[int, int, int] = (3, 48, 320),
+            drop_score: float = 0.5
+    ):
+        self.session = SESSIONS[engine](model, num_threads=num_threads)
+        self.batch_size = batch_size
+        self.image_shape = image_shape
+        self.drop_score = drop_score
+        with open(character_dict, "rb") as file:
+            characters = [line.decode("utf-8").strip("\n").strip("\r\n") for line in file]
+        # Blank token first and space last, as PaddleOCR's CTCLabelDecode with use_space_char
+        self.characters = ["blank"] + characters + [" "]
+
+    def run(self, image: np.ndarray) -> Optional[Recognition]:
+        return self.run_batch([image])[0]
+
+    def run_batch(self, images: List[np.ndarray], batch_size: Optional[int] = None) -> List[Optional[Recognition]]:
+        """Recognises each crop as a single text line whose polygon is the whole crop. Crops are sorted by aspect
+        ratio before batching, as in PaddleOCR, so each batch is padded to a similar width."""
+        batch_size = batch_size or self.batch_size
+        order = np.argsort([image.shape[1] / max(image.shape[0], 1) for image in images])
+        results: List[Optional[Recognition]] = [None] * len(images)
+        for start in range(0, len(images), batch_size):
+            indices = order[start:start + batch_size]
+            batch = [images[idx] for idx in indices]
+            for idx, (text, conf) in zip(indices, self._recognise(batch)):
+                text = _clean_text(text)
+                if text and conf >= self.drop_score:
+                    height, width = images[idx].shape[:2]
+                    results[idx] = Recognition(
+                        text=text, poly=[[0, 0], [width, 0], [width, height], [0, height]], conf=conf
+                    )
+        return results
+
+    def _recognise(self, images: List[np.ndarray]) -> List[Tuple[str, float]]:
+        _, height, width = self.image_shape
+        max_wh_ratio = max([width / height] + [image.shape[1] / max(image.shape[0], 1) for image in images])
+        inputs = np.stack([_resize_norm(image, self.image_shape, max_wh_ratio) for image in images])
+        return _ctc_decode(self.session.run(inputs)[0], self.characters)
+
+
+def _resize_norm(image: np.ndarray, image_shape: Tuple[int, int, int], max_wh_ratio: float) -> np.ndarray:
+    """Resizes a line image to the model height keeping its aspect ratio, normalises it to [-1, 1] and pads it to
+    the batch width, as PaddleOCR's `TextRecognizer.resize_norm_img`."""
+    channels, height, _ = image_shape
+    width = int(height * max_wh_ratio)
+    resized_width = min(width, int(math.ceil(height * image.shape[1] / max(image.shape[0], 1))))
+    resized = cv2.resize(image, (resized_width, height)).astype(np.float32)
+    resized = (resized.transpose(2, 0, 1) / 255 - 0.5) / 0.5
+    padded = np.zeros((channels, height, width), dtype=np.float32)
+    padded[:, :, :resized_width] = resized
+    return padded
+
+
+def _ctc_decode(predictions: np.ndarray, characters: List[str]) -> List[Tuple[str, float]]:
+    """Greedy CTC decoding of (batch, steps, classes) probabilities, dropping repeated and blank tokens."""
+    indices = predictions.argmax(axis=2)
+    probs = predictions.max(axis=2)
+    results = []
+    for sequence, sequence_probs in zip(indices, probs):
+        keep = np.ones(len(sequence), dtype=bool)
+        keep[1:] = sequence[1:] != sequence[:-1]
+        keep &= sequence != 0
+        text = "".join(characters[index] for index in sequence[keep])
+        conf = float(sequence_probs[keep].mean()) if keep.any() else 0.0
+        results.append((text, conf))
+    return results
@@ -0,0 +1,65 @@
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Union
+
+
+class OnnxRuntimeSession:
+    """Runs an ONNX model on CPU with ONNX Runtime, using `num_threads` intra-op threads."""
+
+    def __init__(self, model: Union[str, Path], num_threads: Optional[int] = None):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnxruntime backend needs onnxruntime, run `pip install onnxruntime`.") from e
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.inter_op_num_threads = 1
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(str(model), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_shape = self.session.get_inputs()[0].shape
+
+    @property
+    def dynamic_batch(self) -> bool:
+        return not isinstance(self.input_shape[0], int)
+
+    def run(self, inputs: np.ndarray) -> List[np.ndarray]:
+        return self.session.run(None, {self.input_name: inputs})
+
+
+class OpenVINOSession:
+    """Runs an ONNX model on CPU with OpenVINO, using `num_threads` inference threads."""
+
+    def __init__(self, model: Union[str, Path], num_threads: Optional[int] = None):
+        try:
+            import openvino
+        except ImportError as e:
+            raise ImportError("The openvino backend needs openvino, run `pip install openvino`.") from e
+
+        core = openvino.Core()
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if num_threads:
+            config["INFERENCE_NUM_THREADS"] = num_threads
+        network = core.read_model(str(model))
+        self.input_shape = [
+            dimension.get_length() if dimension.is_static else None for dimension in network.inputs[0].partial_shape
+        ]
+        self.model = core.compile_model(network, "CPU", config)
+        self.request = self.model.create_infer_request()
+
+    @property
+    def dynamic_batch(self) -> bool:
+        return self.input_shape[0] is None
+
+    def run(self, inputs: np.ndarray) -> List[np.ndarray]:
+        results = self.request.infer({0: inputs})
+        return [results[output] for output in self.model.outputs]
+
+
+SESSIONS = {
+    "onnxruntime": OnnxRuntimeSession,
+    "openvino": OpenVINOSession,
+}
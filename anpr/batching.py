@@ -0,0 +1,110 @@
+import asyncio
+import numpy as np
+from typing import Callable, List, Optional, Tuple
+from .numberplate import NumberPlate
+
+
+class BatchScheduler:
+    """Coalesces concurrent single image requests into batched `FastANPR.run` calls. A batch is dispatched once it
+    holds `max_batch_size` images or `max_wait_ms` after its first image arrived, whichever comes first. `on_batch`
+    is called with the time in seconds each image of a batch waited in the queue when the batch is dispatched."""
+
+    def __init__(
+            self,
+            fast_anpr,
+            max_batch_size: int = 8,
+            max_wait_ms: float = 10.0,
+            max_in_flight: int = 1,
+            on_batch: Optional[Callable[[List[float]], None]] = None
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"Expected max_batch_size of at least 1, but {max_batch_size} received.")
+        self.fast_anpr = fast_anpr
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.on_batch = on_batch
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        # Images with their future and the loop time they were queued at
+        self._queue: "asyncio.Queue[Tuple[np.ndarray, asyncio.Future, float]]" = asyncio.Queue()
+        self._collector: Optional[asyncio.Task] = None
+        self._batches = set()
+
+    def start(self):
+        if self._collector is None:
+            self._collector = asyncio.get_running_loop().create_task(self._collect())
+
+    async def stop(self):
+        """Stops collecting new batches and waits for the batches in flight to finish."""
+        if self._collector is not None:
+            self._collector.cancel()
+            try:
+                await self._collector
+            except asyncio.CancelledError:
+                pass
+            self._collector = None
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def submit(self, image: np.ndarray) -> List[NumberPlate]:
+        """Queues a single image for the next batch and returns its number plates."""
+        if self._collector is None:
+            raise RuntimeError("BatchScheduler must be started before submitting images.")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((image, future, loop.time()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                # Requests cancelled while waiting for the batch to fill are not sent to inference
+                batch = [(image, future, queued_at) for image, future, queued_at in batch if not future.done()]
+                if batch:
+                    await self._in_flight.acquire()
+            except asyncio.CancelledError:
+                # Stopped while building the batch: its requests are out of the queue and would never be answered
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.cancel()
+                raise
+
+            if batch:
+                if self.on_batch is not None:
+                    now = loop.time()
+                    self.on_batch([now - queued_at for _, _, queued_at in batch])
+                task = loop.create_task(self._run_batch(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: List[Tuple[np.ndarray, asyncio.Future, float]]):
+        try:
+            results = await self.fast_anpr.run([image for image, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future, _), number_plates in zip(batch, results):
+                if not future.done():
+                    future.set_result(number_plates)
+        finally:
+            self._in_flight.release()
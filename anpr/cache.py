@@ -0,0 +1,140 @@
+import cv2
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Hashable, List, Optional, Tuple
+from .numberplate import NumberPlate
+
+
+@dataclass(slots=True)
+class _Entry:
+    number_plates: List[NumberPlate]
+    dhash: Optional[int]
+    expires_at: float
+
+
+class ResultCache:
+    """LRU cache of `FastANPR` results keyed by the content of the frames, so that the identical frames fixed
+    cameras send again and again are only run once.
+
+    Frames are keyed by a BLAKE2b digest of their pixels. When `max_distance` is set, a frame missing the cache can
+    also reuse the result of a near-identical frame of the same scope, whose difference hash (dHash) of a
+    `hash_size` x `hash_size` downscaled grey image is at most `max_distance` bits away. Entries are scoped, e.g. by
+    camera, expire `ttl` seconds after being stored and the least recently used is evicted beyond `max_entries`.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 1024,
+            ttl: float = 60.0,
+            max_distance: Optional[int] = None,
+            hash_size: int = 16,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        if max_entries < 1:
+            raise ValueError(f"Expected max_entries of at least 1, but {max_entries} received.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self.clock = clock
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Tuple[Hashable, bytes], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, image: np.ndarray) -> bytes:
+        """Digest of the frame's shape and pixels."""
+        digest = hashlib.blake2b(repr(image.shape).encode(), digest_size=16)
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.digest()
+
+    def get(self, image: np.ndarray, scope: Hashable = None) -> Optional[List[NumberPlate]]:
+        """Returns the cached number plates of the frame, or of a near-identical frame of the same scope, if any."""
+        key = (scope, self.key(image))
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.number_plates
+        if self.max_distance is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        dhash = self.dhash(image)
+        with self._lock:
+            near_key = self._nearest(scope, dhash, now)
+            if near_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(near_key)
+            self.near_hits += 1
+            return self._entries[near_key].number_plates
+
+    def put(self, image: np.ndarray, number_plates: List[NumberPlate], scope: Hashable = None):
+        """Stores the number plates of a frame. Cache hits run no inference, so the plates are stored without their
+        timings."""
+        number_plates = [replace(number_plate, timings=None) for number_plate in number_plates]
+        key = (scope, self.key(image))
+        dhash = self.dhash(image) if self.max_distance is not None else None
+        with self._lock:
+            self._entries[key] = _Entry(number_plates, dhash, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, scope: Hashable = None):
+        """Drops every entry of a scope, e.g. when a camera is moved or its settings change."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == scope]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0
+        }
+
+    def dhash(self, image: np.ndarray) -> int:
+        """Difference hash: one bit per horizontally adjacent pair of pixels of the downscaled grey frame, set when
+        the left pixel is brighter. Robust to sensor noise and recompression, not to a plate entering the frame."""
+        grey = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        small = cv2.resize(grey, (self.hash_size + 1, self.hash_size), interpolation=cv2.INTER_AREA)
+        bits = (small[:, :-1] > small[:, 1:]).flatten()
+        return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    def _nearest(self, scope: Hashable, dhash: int, now: float) -> Optional[Tuple[Hashable, bytes]]:
+        best_key, best_distance = None, self.max_distance + 1
+        expired = []
+        for key, entry in self._entries.items():
+            if key[0] != scope or entry.dhash is None:
+                continue
+            if entry.expires_at <= now:
+                expired.append(key)
+                continue
+            distance = (entry.dhash ^ dhash).bit_count()
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        for key in expired:
+            del self._entries[key]
+        return best_key
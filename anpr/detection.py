@@ -1,24 +1,26 @@
 from pathlib import Path
-from ultralytics import YOLO
-from pydantic import BaseModel
-from typing import Union, List
+from dataclasses import dataclass
+from typing import Union, List, Optional
 
 import numpy as np
 
 
-class Detection(BaseModel):
+@dataclass(frozen=True, slots=True, eq=False)
+class Detection:
     image: np.ndarray
     box: List[int]
     conf: float
 
-    class Config:
-        frozen = True
-        arbitrary_types_allowed = True
-
 
 class Detector:
-    def __init__(self, detection_model: Union[str, Path], device: str):
+    def __init__(self, detection_model: Union[str, Path], device: str, num_threads: Optional[int] = None):
+        # ultralytics and torch are imported when a detector is created, as importing them is slow
+        import torch
+        from ultralytics import YOLO
+
         self.device = device
+        if num_threads:
+            torch.set_num_threads(num_threads)
         self.model = YOLO(model=detection_model)
 
     def run(self, images: List[np.ndarray]) -> List[List[Detection]]:
@@ -29,10 +31,17 @@ class Detector:
             if detection.boxes:
                 det_boxes = detection.boxes.cpu().data.numpy().astype(int).tolist()
                 det_confs = detection.boxes.cpu().conf.numpy().tolist()
-                for det_box, det_conf in zip(det_boxes, det_confs):
-                    x_min, x_max, y_min, y_max = det_box[0], det_box[2], det_box[1], det_box[3]
-                    image_detections.append(
-                        Detection(image=image[y_min:y_max, x_min:x_max, :], box=det_box[:4], conf=det_conf)
-                    )
+                image_detections = crop_detections(image, det_boxes, det_confs)
             results.append(image_detections)
         return results
+
+
+def crop_detections(image: np.ndarray, det_boxes: List[List[int]], det_confs: List[float]) -> List[Detection]:
+    """Builds the detections of an image from its integer boxes (x_min, y_min, x_max, y_max, ...) and confidences."""
+    image_detections = []
+    for det_box, det_conf in zip(det_boxes, det_confs):
+        x_min, x_max, y_min, y_max = det_box[0], det_box[2], det_box[1], det_box[3]
+        image_detections.append(
+            Detection(image=image[y_min:y_max, x_min:x_max, :], box=det_box[:4], conf=det_conf)
+        )
+    return image_detections
@@ -0,0 +1,63 @@
+"""Exports the plate detector and the PaddleOCR recognition model to ONNX for the onnxruntime and openvino backends.
+
+Usage: python -m anpr.export [--detection-model anpr/best.pt] [--output anpr/onnx] [--opset 12]
+"""
+import sys
+import shutil
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Union
+
+from .backends import ONNX_DIR, DETECTOR_ONNX, RECOGNISER_ONNX, CHARACTER_DICT
+
+
+def export_detector(detection_model: Union[str, Path], output_dir: Path, opset: int) -> Path:
+    """Exports the YOLOv8 detector with a dynamic batch dimension, using ultralytics' own exporter."""
+    from ultralytics import YOLO
+
+    exported = YOLO(model=detection_model).export(format="onnx", dynamic=True, simplify=True, opset=opset)
+    destination = output_dir / DETECTOR_ONNX
+    shutil.move(str(exported), destination)
+    return destination
+
+
+def export_recogniser(output_dir: Path, opset: int) -> Path:
+    """Exports the English PaddleOCR recognition model, downloaded if needed by PaddleOCR, with paddle2onnx, and
+    copies its character dictionary next to it."""
+    from paddleocr import PaddleOCR
+
+    ocr = PaddleOCR(lang="en", use_angle_cls=False, show_log=False)
+    model_dir = Path(ocr.args.rec_model_dir)
+    destination = output_dir / RECOGNISER_ONNX
+    subprocess.run(
+        [
+            sys.executable, "-m", "paddle2onnx.command",
+            "--model_dir", str(model_dir),
+            "--model_filename", "inference.pdmodel",
+            "--params_filename", "inference.pdiparams",
+            "--save_file", str(destination),
+            "--opset_version", str(opset),
+            "--enable_onnx_checker", "True",
+        ],
+        check=True
+    )
+    shutil.copy(ocr.args.rec_char_dict_path, output_dir / CHARACTER_DICT)
+    return destination
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--detection-model', type=str, default=str(Path(__file__).parent / 'best.pt'))
+    parser.add_argument('--output', type=str, default=str(ONNX_DIR))
+    parser.add_argument('--opset', type=int, default=12)
+    args = parser.parse_args()
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Detector exported to {export_detector(args.detection_model, output_dir, args.opset)}")
+    print(f"Recogniser exported to {export_recogniser(output_dir, args.opset)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,288 @@
+import cv2
+import time
+import asyncio
+import multiprocessing
 import numpy as np
 from pathlib import Path
-from typing import Union, List
-from .detection import Detector
-from .recognition import Recogniser
+from functools import partial
+from typing import Union, List, Optional, Hashable, Sequence, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from .detection import Detection
+from .recognition import Recognition
+from .backends import ONNX_DIR, create_detector, create_recogniser
 from .numberplate import NumberPlate
+from .profiling import ProfileStats, profile_call
+from .timing import StageTimings, TimingHook
+from .tracking import PlateTracker
+
+EXECUTORS = ("inline", "thread", "process")
+
+# Representative frame shapes (HWC) run by `FastANPR.warmup`
+WARMUP_SHAPES = ((720, 1280, 3), (1080, 1920, 3))
 
 
 class FastANPR:
     def __init__(
             self,
             detection_model: Union[str, Path] = Path(__file__).parent / 'best.pt',
-            device: str = "cpu"
+            device: str = "cpu",
+            rec_batch_size: int = 8,
+            rec_mode: str = "det_rec",
+            backend: str = "reference",
+            num_threads: Optional[int] = None,
+            onnx_dir: Union[str, Path] = ONNX_DIR,
+            model_dir: Optional[Union[str, Path]] = None,
+            executor: str = "thread",
+            workers: int = 1,
+            tracker: Optional[PlateTracker] = None,
+            timing_hook: Optional[TimingHook] = None
     ):
-        self.detector = Detector(detection_model=detection_model, device=device)
-        self.recogniser = Recogniser(device=device)
-        self.device = device
+        """`rec_mode` is the `Recogniser` mode. `backend` selects the inference engines: "reference" runs ultralytics
+        and PaddleOCR, while "onnxruntime" and "openvino" run the models exported to `onnx_dir` on cpu, each engine
+        using `num_threads` threads. `model_dir` is a local PaddleOCR model cache, see `anpr.model_cache`.
 
-    async def run(self, images: Union[np.ndarray, List[np.ndarray]]) -> List[List[NumberPlate]]:
-        """Runs ANPR on a list of images and return a list of detected number plates."""
+        `executor` selects where `run` executes inference: "inline" runs it inside the coroutine, "thread" on a single
+        dedicated thread (the models are not thread safe) and "process" on `workers` processes that each load their
+        own models. `tracker` enables plate tracking for images passed with stream ids. `timing_hook` is called with
+        the `StageTimings` of every run, in the process that called `run`."""
+        if executor not in EXECUTORS:
+            raise ValueError(f"Expected executor to be one of {EXECUTORS}, but {executor} received.")
+        if executor != "process" and workers != 1:
+            raise ValueError(f"Expected a single worker for the {executor} executor, but {workers} received.")
+        if executor == "process" and tracker is not None:
+            raise ValueError("Tracking needs every frame of a stream in the same process, use the thread executor.")
 
-        # Images are expected to be numpy arrays of dimension 3 (HWC) or 4 (BHWC), or list of numpy arrays
-        if isinstance(images, np.ndarray):
-            if len(images.shape) == 3:
-                images = [images]
-            elif len(images.shape) == 4:
-                images = [image for image in images]
-            else:
-                raise ValueError(f"Expected ndarray images of dimension 3 or 4, but {len(images.shape)} received.")
-        elif isinstance(images, List):
-            pass
+        self.device = device
+        self.executor = executor
+        self.tracker = tracker
+        self.timing_hook = timing_hook
+        self._executor: Optional[Executor] = None
+        model_kwargs = dict(
+            detection_model=detection_model, device=device, rec_batch_size=rec_batch_size, rec_mode=rec_mode,
+            backend=backend, num_threads=num_threads, onnx_dir=onnx_dir, model_dir=model_dir
+        )
+        if executor == "process":
+            # Models are loaded by each worker process, the parent only dispatches images
+            self.detector = None
+            self.recogniser = None
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(model_kwargs,)
+            )
         else:
-            raise ValueError(f"Expected images of type ndarray or List[ndarray], but {type(images).__name__} received.")
+            # Load both models in parallel, most of their loading time is spent outside the GIL
+            with ThreadPoolExecutor(max_workers=2, thread_name_prefix="fastanpr-load") as loader:
+                detector = loader.submit(create_detector, backend, detection_model, device, num_threads, onnx_dir)
+                recogniser = loader.submit(
+                    create_recogniser, backend, device, rec_batch_size, rec_mode, num_threads, onnx_dir, model_dir
+                )
+                self.detector, self.recogniser = detector.result(), recogniser.result()
+            if executor == "thread":
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fastanpr")
+
+    async def run(
+            self,
+            images: Union[np.ndarray, List[np.ndarray]],
+            stream_ids: Optional[Sequence[Hashable]] = None
+    ) -> List[List[NumberPlate]]:
+        """Runs ANPR on a list of images and return a list of detected number plates, without blocking the event
+        loop unless the executor is "inline"."""
+        images = self._to_image_list(images)
+        if self._executor is None:
+            return self.run_sync(images, stream_ids)
+
+        # If the awaiting task is cancelled, asyncio cancels the executor future too: queued work is dropped, while
+        # work that has already started runs to completion and its result is discarded.
+        loop = asyncio.get_running_loop()
+        if self.executor == "process":
+            results, timings = await loop.run_in_executor(self._executor, _run_in_worker, images)
+            if self.timing_hook is not None:
+                self.timing_hook(timings)
+            return results
+        return await loop.run_in_executor(self._executor, partial(self.run_sync, stream_ids=stream_ids), images)
+
+    async def run_profiled(
+            self,
+            images: Union[np.ndarray, List[np.ndarray]]
+    ) -> Tuple[List[List[NumberPlate]], ProfileStats]:
+        """`run` under cProfile, in the thread or worker process that runs inference. Returns the number plates and
+        the profile statistics of the call, see `anpr.profiling`."""
+        images = self._to_image_list(images)
+        if self._executor is None:
+            return profile_call(self.run_sync, images)
+
+        loop = asyncio.get_running_loop()
+        if self.executor == "process":
+            (results, timings), stats = await loop.run_in_executor(
+                self._executor, profile_call, _run_in_worker, images
+            )
+            if self.timing_hook is not None:
+                self.timing_hook(timings)
+            return results, stats
+        return await loop.run_in_executor(self._executor, profile_call, self.run_sync, images)
+
+    def run_sync(
+            self,
+            images: Union[np.ndarray, List[np.ndarray]],
+            stream_ids: Optional[Sequence[Hashable]] = None
+    ) -> List[List[NumberPlate]]:
+        """Runs ANPR on a list of images in the calling thread and return a list of detected number plates.
+
+        With a tracker, `stream_ids` gives the stream (e.g. camera) of each image, in frame order. Plates already
+        read on earlier frames of their stream are not OCR'd again and get the merged read of their track."""
+        results, timings = self.run_timed(images, stream_ids)
+        if self.timing_hook is not None:
+            self.timing_hook(timings)
+        return results
+
+    def run_timed(
+            self,
+            images: Union[np.ndarray, List[np.ndarray]],
+            stream_ids: Optional[Sequence[Hashable]] = None
+    ) -> Tuple[List[List[NumberPlate]], StageTimings]:
+        """`run_sync` returning the timings of the run along with the number plates."""
+        if self.detector is None:
+            raise RuntimeError("Models are only loaded in the worker processes when using the process executor.")
+        images = self._to_image_list(images)
+        if stream_ids is not None and len(stream_ids) != len(images):
+            raise ValueError(f"Expected {len(images)} stream ids, but {len(stream_ids)} received.")
 
         # Detect number plates
+        timings = StageTimings(frames=len(images))
+        start = time.perf_counter()
         detections = self.detector.run(images)
+        timings.detect = time.perf_counter() - start
+        if self.tracker is not None and stream_ids is not None:
+            results = self._recognise_tracked(detections, stream_ids, timings)
+            timings.plates = [len(image_results) for image_results in results]
+            return results, timings
 
-        # OCR detected number plates
+        # OCR every detected number plate of every image in batches, then map the results back to their image
+        start = time.perf_counter()
+        crops = [detection.image for image_detections in detections for detection in image_detections]
+        recognitions = iter(self.recogniser.run_batch(crops))
+        timings.ocr, timings.crops = time.perf_counter() - start, len(crops)
+
+        start = time.perf_counter()
+        plate_timings = timings.plate_timings()
         results = []
         for image_detections in detections:
             image_results = []
-            if image_detections:
-                for detection in image_detections:
-                    recognition = self.recogniser.run(detection.image)
-                    if recognition:
-                        offset_recog_poly = self._offset_recognition_poly(detection.box, recognition.poly)
-                        image_results.append(
-                            NumberPlate(
-                                det_box=detection.box,
-                                det_conf=detection.conf,
-                                rec_poly=offset_recog_poly,
-                                rec_text=recognition.text,
-                                rec_conf=recognition.conf
-                            )
-                        )
-                    else:
-                        image_results.append(NumberPlate(det_box=detection.box, det_conf=detection.conf))
+            for detection in image_detections:
+                image_results.append(self._number_plate(detection, next(recognitions), timings=plate_timings))
             results.append(image_results)
+        timings.merge = time.perf_counter() - start
+        timings.plates = [len(image_results) for image_results in results]
+        return results, timings
+
+    def _recognise_tracked(
+            self, detections: List[List[Detection]], stream_ids: Sequence[Hashable], timings: StageTimings
+    ) -> List[List[NumberPlate]]:
+        # Associate detections to tracks frame by frame, then OCR only the plates that need it in one batch
+        self.tracker.start_batch()
+        associations = [
+            self.tracker.associate(stream_id, image_detections)
+            for stream_id, image_detections in zip(stream_ids, detections)
+        ]
+        start = time.perf_counter()
+        crops = [
+            detection.image
+            for image_detections, image_associations in zip(detections, associations)
+            for detection, (_, needs_ocr, _) in zip(image_detections, image_associations) if needs_ocr
+        ]
+        recognitions = iter(self.recogniser.run_batch(crops))
+        timings.ocr, timings.crops = time.perf_counter() - start, len(crops)
+
+        start = time.perf_counter()
+        # Plates read by their track cost no OCR
+        ocr_timings = timings.plate_timings()
+        tracked_timings = {**ocr_timings, "ocr": 0.0}
+        results = []
+        for image_detections, image_associations in zip(detections, associations):
+            image_results = []
+            for detection, (track, needs_ocr, sharpness) in zip(image_detections, image_associations):
+                if needs_ocr:
+                    track.add_read(next(recognitions), detection.image, sharpness)
+                image_results.append(self._number_plate(
+                    detection, track.read(detection.image), track_id=track.track_id,
+                    timings=ocr_timings if needs_ocr else tracked_timings
+                ))
+            results.append(image_results)
+        timings.merge = time.perf_counter() - start
         return results
 
+    def _number_plate(
+            self,
+            detection: Detection,
+            recognition: Optional[Recognition],
+            track_id: Optional[int] = None,
+            timings: Optional[dict] = None
+    ) -> NumberPlate:
+        if recognition:
+            return NumberPlate(
+                det_box=detection.box,
+                det_conf=detection.conf,
+                rec_poly=self._offset_recognition_poly(detection.box, recognition.poly),
+                rec_text=recognition.text,
+                rec_conf=recognition.conf,
+                track_id=track_id,
+                timings=timings
+            )
+        return NumberPlate(det_box=detection.box, det_conf=detection.conf, track_id=track_id, timings=timings)
+
     @staticmethod
     def _offset_recognition_poly(detection_box: List[int], recognition_poly: List[List[int]]) -> List[List[int]]:
         return [[point[0] + detection_box[0], point[1] + detection_box[1]] for point in recognition_poly]
+
+    def warmup(self, shapes: Sequence[Tuple[int, int, int]] = WARMUP_SHAPES, batch_size: int = 1):
+        """Runs the detector on blank frames of each shape and the recogniser on a synthetic plate, so that the lazy
+        initialisation of both models is done before the first request. Process workers warm up when they start."""
+        if self.detector is None:
+            return
+        for shape in shapes:
+            self.detector.run([np.zeros(shape, dtype=np.uint8)] * batch_size)
+        self.recogniser.run_batch([_synthetic_plate()] * batch_size)
+
+    @staticmethod
+    def _to_image_list(images: Union[np.ndarray, List[np.ndarray]]) -> List[np.ndarray]:
+        # Images are expected to be numpy arrays of dimension 3 (HWC) or 4 (BHWC), or list of numpy arrays
+        if isinstance(images, np.ndarray):
+            if len(images.shape) == 3:
+                return [images]
+            elif len(images.shape) == 4:
+                return [image for image in images]
+            else:
+                raise ValueError(f"Expected ndarray images of dimension 3 or 4, but {len(images.shape)} received.")
+        elif isinstance(images, List):
+            return images
+        else:
+            raise ValueError(f"Expected images of type ndarray or List[ndarray], but {type(images).__name__} received.")
+
+    def close(self):
+        """Shuts down the inference executor, waiting for running work to finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+# FastANPR instance owned by each worker process of the process executor
+_worker_anpr: Optional[FastANPR] = None
+
+
+def _init_worker(model_kwargs: dict):
+    global _worker_anpr
+    _worker_anpr = FastANPR(executor="inline", **model_kwargs)
+    _worker_anpr.warmup()
+
+
+def _run_in_worker(images: List[np.ndarray]) -> Tuple[List[List[NumberPlate]], StageTimings]:
+    return _worker_anpr.run_timed(images)
+
+
+def _synthetic_plate() -> np.ndarray:
+    """A black on white plate crop whose text is found by the OCR models."""
+    plate = np.full((64, 240, 3), 255, dtype=np.uint8)
+    cv2.putText(plate, "AB1234", (12, 46), cv2.FONT_HERSHEY_SIMPLEX, 1.4, (0, 0, 0), 3)
+    return plate
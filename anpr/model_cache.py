@@ -0,0 +1,47 @@
+"""Local cache of the PaddleOCR models, so that servers load them from disk instead of downloading them at startup.
+
+Usage: python -m anpr.model_cache [MODEL_DIR]    # defaults to $ANPR_MODEL_DIR
+"""
+import os
+import sys
+import shutil
+from pathlib import Path
+from typing import Dict, Union
+
+PADDLE_MODELS = ("det", "rec")
+PADDLE_MODEL_FILES = ("inference.pdmodel", "inference.pdiparams")
+
+
+def paddle_model_dirs(model_dir: Union[str, Path]) -> Dict[str, str]:
+    """Returns the PaddleOCR model directory arguments of a cache, failing if a model is missing rather than
+    letting PaddleOCR download it."""
+    dirs = {}
+    for model in PADDLE_MODELS:
+        directory = Path(model_dir) / "paddleocr" / model
+        missing = [file for file in PADDLE_MODEL_FILES if not (directory / file).is_file()]
+        if missing:
+            raise FileNotFoundError(
+                f"{', '.join(missing)} missing from {directory}, run `python -m anpr.model_cache {model_dir}`."
+            )
+        dirs[f"{model}_model_dir"] = str(directory)
+    return dirs
+
+
+def populate(model_dir: Union[str, Path]) -> Path:
+    """Resolves the PaddleOCR models used by `Recogniser`, downloading them if needed, and copies them to the
+    cache."""
+    from paddleocr import PaddleOCR
+
+    ocr = PaddleOCR(lang="en", use_angle_cls=False, show_log=False)
+    for model in PADDLE_MODELS:
+        destination = Path(model_dir) / "paddleocr" / model
+        shutil.copytree(getattr(ocr.args, f"{model}_model_dir"), destination, dirs_exist_ok=True)
+    paddle_model_dirs(model_dir)
+    return Path(model_dir)
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else os.getenv("ANPR_MODEL_DIR")
+    if not target:
+        sys.exit(__doc__)
+    print(f"PaddleOCR models cached in {populate(target)}")
@@ -0,0 +1,128 @@
+import cv2
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Callable, Hashable, List, Optional
+from .numberplate import NumberPlate
+
+
+@dataclass(slots=True)
+class _Stream:
+    # Downscaled grey frame of the last frame that went through inference
+    reference: np.ndarray
+    refreshed_at: float
+    number_plates: Optional[List[NumberPlate]] = None
+
+
+@dataclass(frozen=True, slots=True)
+class MotionCheck:
+    """A frame let through by `MotionGate.check`, made the reference of its stream by `MotionGate.remember`."""
+    stream_id: Hashable
+    reference: np.ndarray
+    checked_at: float
+
+
+class MotionGate:
+    """Per stream (e.g. camera) pre-filter that skips inference on frames where nothing moved.
+
+    Each frame is downscaled to `width` pixels wide, converted to grey and blurred, then compared to the same image
+    of the last frame of its stream that went through inference. The frame is static, and `check` returns None,
+    unless more than `min_area` (a fraction) of its pixels changed by more than `threshold` grey levels: lower values
+    make the gate more sensitive. A frame let through only becomes the reference of its stream once `remember` is
+    called with its check, after its inference succeeded, so static frames never get the plates of a frame still
+    being inferred. As static frames are compared to the last inferred frame rather than to the
+    previous one, a slow change adds up until it is seen. Every stream still runs inference at least every
+    `refresh_interval` seconds. The state of the least recently seen stream is dropped beyond `max_streams`.
+    """
+
+    def __init__(
+            self,
+            threshold: int = 25,
+            min_area: float = 0.005,
+            width: int = 160,
+            refresh_interval: float = 10.0,
+            max_streams: int = 1024,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        if not 0 <= min_area < 1:
+            raise ValueError(f"Expected min_area to be a fraction between 0 and 1, but {min_area} received.")
+        self.threshold = threshold
+        self.min_area = min_area
+        self.width = width
+        self.refresh_interval = refresh_interval
+        self.max_streams = max_streams
+        self.clock = clock
+        self.frames = 0
+        self.skipped = 0
+        self.forced = 0
+        self._streams: "OrderedDict[Hashable, _Stream]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._streams)
+
+    def check(self, stream_id: Hashable, image: np.ndarray) -> Optional[MotionCheck]:
+        """Checks whether a frame must go through inference: the first frame of a stream, a frame where something
+        moved or the first frame after `refresh_interval` seconds. Returns None for the other, static, frames."""
+        small = self.downscale(image)
+        now = self.clock()
+        with self._lock:
+            self.frames += 1
+            stream = self._streams.get(stream_id)
+            if stream is not None and stream.reference.shape == small.shape:
+                self._streams.move_to_end(stream_id)
+                if now - stream.refreshed_at >= self.refresh_interval:
+                    self.forced += 1
+                elif not self.moved(stream.reference, small):
+                    self.skipped += 1
+                    return None
+        return MotionCheck(stream_id, small, now)
+
+    def remember(self, check: MotionCheck, number_plates: Optional[List[NumberPlate]] = None):
+        """Makes a checked frame the reference of its stream, with its number plates as the answer for the static
+        frames that follow. Those run no inference, so the plates are kept without their timings."""
+        if number_plates is not None:
+            number_plates = [replace(number_plate, timings=None) for number_plate in number_plates]
+        with self._lock:
+            stream = self._streams.get(check.stream_id)
+            # The check of a slower concurrent frame must not replace a more recent reference
+            if stream is not None and check.checked_at < stream.refreshed_at:
+                return
+            self._streams[check.stream_id] = _Stream(check.reference, check.checked_at, number_plates)
+            self._streams.move_to_end(check.stream_id)
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+
+    def last(self, stream_id: Hashable) -> List[NumberPlate]:
+        """Number plates of the reference frame of a stream, as passed to `remember`."""
+        stream = self._streams.get(stream_id)
+        return (stream.number_plates or []) if stream is not None else []
+
+    def reset(self, stream_id: Hashable = None):
+        """Forgets a stream, e.g. when a camera is moved, so that its next frame goes through inference."""
+        with self._lock:
+            self._streams.pop(stream_id, None)
+
+    def downscale(self, image: np.ndarray) -> np.ndarray:
+        grey = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        height, width = grey.shape
+        if width > self.width:
+            grey = cv2.resize(grey, (self.width, max(1, round(height * self.width / width))),
+                              interpolation=cv2.INTER_AREA)
+        # Smooths out sensor noise and compression artefacts
+        return cv2.GaussianBlur(grey, (5, 5), 0)
+
+    def moved(self, reference: np.ndarray, small: np.ndarray) -> bool:
+        changed = cv2.absdiff(reference, small) > self.threshold
+        return np.count_nonzero(changed) > self.min_area * changed.size
+
+    def stats(self) -> dict:
+        return {
+            "streams": len(self._streams),
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "forced_refreshes": self.forced,
+            "skipped_fraction": self.skipped / self.frames if self.frames else 0.0,
+        }
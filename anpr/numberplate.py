@@ -1,13 +1,31 @@
-from typing import List
-from pydantic import BaseModel
+from typing import Dict, List, Optional
+from dataclasses import dataclass, field
 
 
-class NumberPlate(BaseModel):
+@dataclass(frozen=True, slots=True)
+class NumberPlate:
     det_box: List[int]
     det_conf: float
-    rec_poly: List[List[int]] = None
-    rec_text: str = None
-    rec_conf: float = None
+    rec_poly: Optional[List[List[int]]] = None
+    rec_text: Optional[str] = None
+    rec_conf: Optional[float] = None
+    track_id: Optional[int] = None
+    # Milliseconds spent on the plate per stage, see `StageTimings.plate_timings`
+    timings: Optional[Dict[str, float]] = field(default=None, compare=False)
 
-    class Config:
-        frozen = True
+    @property
+    def processing_time(self) -> Optional[float]:
+        """Milliseconds of inference spent on the plate, None if it was not timed."""
+        return sum(self.timings.values()) if self.timings else None
+
+    def to_dict(self) -> dict:
+        """Returns the JSON serialisable fields of the number plate, without the copies made by `dataclasses.asdict`."""
+        return {
+            "det_box": self.det_box,
+            "det_conf": self.det_conf,
+            "rec_poly": self.rec_poly,
+            "rec_text": self.rec_text,
+            "rec_conf": self.rec_conf,
+            "track_id": self.track_id,
+            "timings": self.timings,
+        }
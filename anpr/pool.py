@@ -0,0 +1,266 @@
+import os
+import asyncio
+import logging
+import multiprocessing
+import numpy as np
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ThreadPoolExecutor
+from typing import Hashable, List, Optional, Sequence, Tuple, Union
+from .profiling import ProfileStats, merge_stats, profile_call
+from .timing import StageTimings, TimingHook
+
+# Environment variables read by the math libraries of torch, paddle and onnxruntime to size their thread pools
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """Runs `workers` independent FastANPR replicas in separate processes, each pinned to its own
+    `threads_per_worker` cores and limited to that many intra-op threads.
+
+    Frames are written to a shared memory buffer owned by each worker instead of being pickled; only their shapes go
+    through the worker's pipe, and only the number plates come back. `run` has the same signature as
+    `FastANPR.run`, so the pool can be used wherever a FastANPR instance is, e.g. behind a `BatchScheduler`.
+
+    A worker whose process dies is replaced by a new one, which loads its models again before taking frames.
+    """
+
+    def __init__(
+            self,
+            workers: Optional[int] = None,
+            threads_per_worker: int = 1,
+            pin_cores: bool = True,
+            buffer_bytes: int = 8 * 1920 * 1080 * 3,
+            timing_hook: Optional[TimingHook] = None,
+            **fast_anpr_kwargs
+    ):
+        cpu_count = os.cpu_count() or 1
+        self.workers = workers or max(1, cpu_count // threads_per_worker)
+        self.threads_per_worker = threads_per_worker
+        self.buffer_bytes = buffer_bytes
+        self.timing_hook = timing_hook
+        self._context = multiprocessing.get_context("spawn")
+        self._fast_anpr_kwargs = fast_anpr_kwargs
+
+        self._workers: List[_Worker] = []
+        for index in range(self.workers):
+            cores = None
+            if pin_cores and hasattr(os, "sched_setaffinity"):
+                cores = [(index * threads_per_worker + offset) % cpu_count for offset in range(threads_per_worker)]
+            self._workers.append(_Worker(self._context, buffer_bytes, threads_per_worker, cores, fast_anpr_kwargs))
+        try:
+            for worker in self._workers:
+                worker.wait_ready()
+        except RuntimeError:
+            for worker in self._workers:
+                worker.close()
+            raise
+
+        self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="fastanpr-pool")
+        self._idle: Optional[asyncio.Queue] = None
+        self._closed = False
+
+    async def run(
+            self,
+            images: Union[np.ndarray, List[np.ndarray]],
+            stream_ids: Optional[Sequence[Hashable]] = None
+    ) -> list:
+        """Runs ANPR on a list of images on the next idle worker and return a list of detected number plates."""
+        if stream_ids is not None:
+            raise ValueError("Tracking needs every frame of a stream in the same process, use a FastANPR instance.")
+        results, _ = await self._run(images, profile=False)
+        return results
+
+    async def run_profiled(self, images: Union[np.ndarray, List[np.ndarray]]) -> Tuple[list, ProfileStats]:
+        """`run` under cProfile in the worker process, as `FastANPR.run_profiled`."""
+        results, stats = await self._run(images, profile=True)
+        return results, merge_stats(stats)
+
+    async def _run(self, images: Union[np.ndarray, List[np.ndarray]], profile: bool) -> Tuple[list, List[ProfileStats]]:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for worker in self._workers:
+                self._idle.put_nowait(worker)
+
+        if isinstance(images, np.ndarray):
+            images = [images] if images.ndim == 3 else list(images)
+        worker = await self._idle.get()
+        future = asyncio.get_running_loop().run_in_executor(self._threads, worker.run, images, profile)
+        # The worker is only idle again once its round trips are over, even if the awaiting task is cancelled
+        future.add_done_callback(lambda _: self._release(worker))
+        results, timings, stats = await asyncio.shield(future)
+        if self.timing_hook is not None:
+            for chunk_timings in timings:
+                self.timing_hook(chunk_timings)
+        return results, stats
+
+    def _release(self, worker: "_Worker"):
+        if self._closed:
+            return
+        if worker.process.is_alive():
+            self._idle.put_nowait(worker)
+            return
+        replacement = asyncio.get_running_loop().run_in_executor(self._threads, self._replace, worker)
+        replacement.add_done_callback(lambda future: self._idle.put_nowait(future.result()))
+
+    def _replace(self, worker: "_Worker") -> "_Worker":
+        """Starts a new worker in place of a dead one. If it fails to start, the dead worker is returned so that the
+        next run fails fast and tries again."""
+        logger.warning("FastANPR worker %s exited with code %s, starting a new one",
+                       worker.process.pid, worker.process.exitcode)
+        replacement = None
+        try:
+            replacement = _Worker(
+                self._context, self.buffer_bytes, self.threads_per_worker, worker.cores, self._fast_anpr_kwargs
+            )
+            replacement.wait_ready()
+        except Exception:
+            logger.exception("Could not start a new FastANPR worker")
+            if replacement is not None:
+                replacement.close()
+            return worker
+        if self._closed:
+            replacement.close()
+            return worker
+        self._workers[self._workers.index(worker)] = replacement
+        worker.close()
+        return replacement
+
+    async def map(self, images: List[np.ndarray], batch_size: int = 8) -> list:
+        """Runs ANPR on many images, spreading batches of `batch_size` images over every worker."""
+        batches = [images[start:start + batch_size] for start in range(0, len(images), batch_size)]
+        results = await asyncio.gather(*(self.run(batch) for batch in batches))
+        return [image_results for batch_results in results for image_results in batch_results]
+
+    def close(self):
+        self._closed = True
+        for worker in self._workers:
+            worker.close()
+        self._workers = []
+        self._threads.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _Worker:
+    """Parent side of a worker process: its shared memory buffer and the pipe used to send it frame layouts."""
+
+    def __init__(self, context, buffer_bytes: int, threads: int, cores: Optional[List[int]], fast_anpr_kwargs: dict):
+        self.cores = cores
+        self.buffer = SharedMemory(create=True, size=buffer_bytes)
+        self.connection, worker_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(worker_connection, self.buffer.name, threads, cores, fast_anpr_kwargs),
+            daemon=True
+        )
+        self.process.start()
+        worker_connection.close()
+
+    def wait_ready(self):
+        try:
+            status, error = self.connection.recv()
+        except EOFError:
+            self.process.join(timeout=5)
+            status, error = "error", f"process exited with code {self.process.exitcode}"
+        if status != "ready":
+            raise RuntimeError(f"FastANPR worker failed to start: {error}")
+
+    def run(
+            self, images: List[np.ndarray], profile: bool = False
+    ) -> Tuple[list, List[StageTimings], List[ProfileStats]]:
+        """Copies the frames into shared memory, in as many round trips as the buffer size needs. Returns the number
+        plates of the frames, the timings of each round trip and, when profiling, the profile of each round trip."""
+        results, timings, stats = [], [], []
+        start = 0
+        while start < len(images):
+            layouts = []
+            offset = 0
+            for image in images[start:]:
+                if offset + image.nbytes > self.buffer.size:
+                    break
+                view = np.ndarray(image.shape, dtype=image.dtype, buffer=self.buffer.buf, offset=offset)
+                view[...] = image
+                layouts.append((offset, image.shape, image.dtype.str))
+                offset += image.nbytes
+            if not layouts:
+                raise ValueError(f"Image of {images[start].nbytes} bytes does not fit the {self.buffer.size} bytes "
+                                 f"worker buffer.")
+            try:
+                self.connection.send(("profile" if profile else "run", layouts))
+                status, payload = self.connection.recv()
+            except (EOFError, OSError) as e:
+                # Reap the process, so that the pool sees it dead and replaces it
+                self.process.join(timeout=1)
+                raise RuntimeError(f"FastANPR worker {self.process.pid} died.") from e
+            if status != "ok":
+                raise RuntimeError(f"FastANPR worker failed: {payload}")
+            results.extend(payload[0])
+            timings.append(payload[1])
+            if profile:
+                stats.append(payload[2])
+            start += len(layouts)
+        return results, timings, stats
+
+    def close(self):
+        try:
+            self.connection.send(("stop", None))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=10)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+        self.buffer.close()
+        self.buffer.unlink()
+
+
+def _worker_main(
+        connection: Connection, buffer_name: str, threads: int, cores: Optional[List[int]], fast_anpr_kwargs: dict
+):
+    # Limit threads and pin cores before the inference libraries create their thread pools
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    if cores:
+        os.sched_setaffinity(0, cores)
+
+    buffer = SharedMemory(name=buffer_name)
+    try:
+        from .fastanpr import FastANPR
+        fast_anpr = FastANPR(executor="inline", num_threads=threads, **fast_anpr_kwargs)
+        fast_anpr.warmup()
+    except Exception as e:
+        connection.send(("error", repr(e)))
+        buffer.close()
+        return
+    connection.send(("ready", None))
+
+    try:
+        while True:
+            command, layouts = connection.recv()
+            if command == "stop":
+                break
+            try:
+                images = [_view(buffer, layout) for layout in layouts]
+                if command == "profile":
+                    (results, timings), stats = profile_call(fast_anpr.run_timed, images)
+                else:
+                    (results, timings), stats = fast_anpr.run_timed(images), None
+                connection.send(("ok", (results, timings, stats)))
+            except Exception as e:
+                connection.send(("error", repr(e)))
+    except EOFError:
+        pass
+    finally:
+        buffer.close()
+
+
+def _view(buffer: SharedMemory, layout: Tuple[int, tuple, str]) -> np.ndarray:
+    offset, shape, dtype = layout
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer.buf, offset=offset)
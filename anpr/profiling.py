@@ -0,0 +1,27 @@
+import cProfile
+import pstats
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+# Raw cProfile statistics, {(file, line, function): (primitive calls, calls, total time, cumulative time, callers)}.
+# They are plain data: they can be sent back from worker processes and are saved as is by `marshal` in .prof files.
+ProfileStats = Dict[Tuple[str, int, str], tuple]
+
+
+def profile_call(func: Callable, *args, **kwargs) -> Tuple[Any, ProfileStats]:
+    """Calls `func` under cProfile, which only sees the calling thread, and returns its result and the statistics of
+    the call."""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+    profiler.create_stats()
+    return result, profiler.stats
+
+
+def merge_stats(stats: Iterable[ProfileStats]) -> ProfileStats:
+    """Statistics of several profiled calls, e.g. of the stages of a request run on different threads, as one."""
+    merged: ProfileStats = {}
+    for part in stats:
+        for function, function_stats in part.items():
+            merged[function] = (
+                pstats.add_func_stats(merged[function], function_stats) if function in merged else function_stats
+            )
+    return merged
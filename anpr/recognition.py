@@ -1,46 +1,155 @@
-from paddleocr import PaddleOCR
-from pydantic import BaseModel
-from typing import List, Tuple, Optional
+import copy
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass
+from typing import List, Tuple, Optional, Union
+from .model_cache import paddle_model_dirs
 
 
-class Recognition(BaseModel):
+@dataclass(frozen=True, slots=True)
+class Recognition:
     text: str
     poly: List[List[int]]
     conf: float
 
-    class Config:
-        frozen = True
+
+REC_MODES = ("det_rec", "rec")
 
 
 class Recogniser:
-    def __init__(self, device: str):
+    def __init__(
+            self,
+            device: str,
+            batch_size: int = 8,
+            mode: str = "det_rec",
+            multiline_aspect: float = 2.0,
+            num_threads: Optional[int] = None,
+            model_dir: Optional[Union[str, Path]] = None
+    ):
+        """`mode` selects how plate crops are read: "det_rec" detects the text lines of each crop before recognising
+        them, like `PaddleOCR.ocr`, while "rec" recognises the whole crop as a single line and only falls back to
+        line detection for crops narrower than `multiline_aspect` (width / height), which are likely multi-line
+        plates, or for crops in which no text could be recognised.
+
+        With a `model_dir` populated by `python -m anpr.model_cache`, PaddleOCR loads its models from there and never
+        downloads them."""
+        # PaddleOCR is imported when a recogniser is created, as importing it is slow
+        from paddleocr import PaddleOCR
+
+        if mode not in REC_MODES:
+            raise ValueError(f"Expected mode to be one of {REC_MODES}, but {mode} received.")
         self.device = device
+        self.batch_size = batch_size
+        self.mode = mode
+        self.multiline_aspect = multiline_aspect
         self.model = PaddleOCR(
-        lang="en",
-        use_angle_cls=True,
-        use_gpu=(device == "cuda")
-
-)
+            lang="en",
+            use_angle_cls=False,
+            use_gpu=(device == "cuda"),
+            rec_batch_num=batch_size,
+            cpu_threads=num_threads or 10,
+            show_log=False,
+            **(paddle_model_dirs(model_dir) if model_dir else {})
+        )
 
     def run(self, image) -> Optional[Recognition]:
+        if self.mode == "rec":
+            return self.run_batch([image])[0]
         predictions = self.model.ocr(image, cls=False)[0]
+        return _parse_predictions(predictions)
+
+    def run_batch(self, images: List[np.ndarray], batch_size: Optional[int] = None) -> List[Optional[Recognition]]:
+        """Runs OCR on a list of plate crops. The text lines of up to `batch_size` crops are sent through the
+        recognition model together, and the results are returned in the same order as the crops."""
+        batch_size = batch_size or self.batch_size
+        results = []
+        for start in range(0, len(images), batch_size):
+            results.extend(self._run_group(images[start:start + batch_size]))
+        return results
+
+    def _run_group(self, images: List[np.ndarray]) -> List[Optional[Recognition]]:
+        results: List[Optional[Recognition]] = [None] * len(images)
+        pending = list(range(len(images)))
+        if self.mode == "rec":
+            single_lines = [idx for idx in pending if _is_single_line(images[idx], self.multiline_aspect)]
+            for idx, recognition in zip(single_lines, self._recognise_crops([images[idx] for idx in single_lines])):
+                results[idx] = recognition
+            pending = [idx for idx in pending if results[idx] is None]
+        for idx, recognition in zip(pending, self._detect_and_recognise([images[idx] for idx in pending])):
+            results[idx] = recognition
+        return results
+
+    def _recognise_crops(self, images: List[np.ndarray]) -> List[Optional[Recognition]]:
+        """Recognises each crop as a single text line whose polygon is the whole crop."""
+        if not images:
+            return []
+        results = []
+        for image, (text, conf) in zip(images, self.model.text_recognizer(images)[0]):
+            text = _clean_text(text)
+            if text and conf >= self.model.drop_score:
+                height, width = image.shape[:2]
+                results.append(Recognition(text=text, poly=[[0, 0], [width, 0], [width, height], [0, height]],
+                                           conf=conf))
+            else:
+                results.append(None)
+        return results
+
+    def _detect_and_recognise(self, images: List[np.ndarray]) -> List[Optional[Recognition]]:
+        # Detect text lines on each crop, then recognise the lines of every crop in a single call
+        lines = [self._detect_lines(image) for image in images]
+        line_images = [line_image for _, line_images in lines for line_image in line_images]
+        line_results = iter(self.model.text_recognizer(line_images)[0] if line_images else [])
+
+        results = []
+        for boxes, _ in lines:
+            predictions = []
+            for box, (text, conf) in zip(boxes, line_results):
+                if conf >= self.model.drop_score:
+                    predictions.append([box.tolist(), (text, conf)])
+            results.append(_parse_predictions(predictions))
+        return results
+
+    def _detect_lines(self, image: np.ndarray) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Detects the text lines on a crop and returns their boxes and images, as `PaddleOCR.ocr` does."""
+        # Importable once paddleocr has put its `tools` package on the path
+        from tools.infer.predict_system import sorted_boxes
+        from tools.infer.utility import get_rotate_crop_image, get_minarea_rect_crop
+
+        boxes, _ = self.model.text_detector(image)
+        if boxes is None or len(boxes) == 0:
+            return [], []
+        boxes = sorted_boxes(boxes)
+        image = image.copy()
+        if getattr(self.model.args, "det_box_type", "quad") == "quad":
+            line_images = [get_rotate_crop_image(image, copy.deepcopy(box)) for box in boxes]
+        else:
+            line_images = [get_minarea_rect_crop(image, copy.deepcopy(box)) for box in boxes]
+        return boxes, line_images
 
-        if predictions:
-            polys = [[[int(point[0]), int(point[1])] for point in prediction[0]] for prediction in predictions]
-            texts = [prediction[1][0] for prediction in predictions]
-            confs = [prediction[1][1] for prediction in predictions]
 
-            if len(polys) > 1:
-                # merge ocrs if multiple recognised
-                clean_poly, clean_text, clean_conf = _clean_ocr(polys, texts, confs)
-            else:
-                # just clean the ocr text
-                clean_poly = polys[0]
-                clean_text = _clean_text(texts[0])
-                clean_conf = confs[0]
-            return Recognition(text=clean_text, poly=clean_poly, conf=clean_conf)
+def _is_single_line(image: np.ndarray, multiline_aspect: float) -> bool:
+    height, width = image.shape[:2]
+    return height > 0 and width / height >= multiline_aspect
+
+
+def _parse_predictions(predictions) -> Optional[Recognition]:
+    """Converts raw PaddleOCR predictions for a single crop into a cleaned recognition."""
+    if predictions:
+        polys = [[[int(point[0]), int(point[1])] for point in prediction[0]] for prediction in predictions]
+        texts = [prediction[1][0] for prediction in predictions]
+        confs = [prediction[1][1] for prediction in predictions]
+
+        if len(polys) > 1:
+            # merge ocrs if multiple recognised
+            clean_poly, clean_text, clean_conf = _clean_ocr(polys, texts, confs)
         else:
-            return None
+            # just clean the ocr text
+            clean_poly = polys[0]
+            clean_text = _clean_text(texts[0])
+            clean_conf = confs[0]
+        return Recognition(text=clean_text, poly=clean_poly, conf=clean_conf)
+    else:
+        return None
 
 
 def _clean_ocr(
@@ -0,0 +1,95 @@
+import cv2
+import logging
+import numpy as np
+from dataclasses import replace
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from .numberplate import NumberPlate
+
+logger = logging.getLogger(__name__)
+
+# A rectangle [x0, y0, x1, y1] (x1 and y1 excluded, as detection boxes) or a polygon [[x, y], ...], in frame pixels
+Shape = Union[List[int], List[List[int]]]
+
+
+class RegionOfInterest:
+    """The part of a camera's frames where plates can appear, as the union of rectangles and polygons.
+
+    `crop` cuts frames down to the bounding box of the shapes before detection and, unless the region is a single
+    rectangle, blacks out the pixels outside of every shape. `to_frame` maps the number plates found on the crop back
+    to frame coordinates.
+    """
+
+    def __init__(self, shapes: Sequence[Shape]):
+        if not shapes:
+            raise ValueError("Expected at least one rectangle or polygon.")
+        self.polygons = [_polygon(shape) for shape in shapes]
+        points = np.concatenate(self.polygons)
+        # Bounding box of the shapes, x1 and y1 excluded
+        self.box = [max(0, int(points[:, 0].min())), max(0, int(points[:, 1].min())),
+                    int(points[:, 0].max()) + 1, int(points[:, 1].max()) + 1]
+        self.needs_mask = len(shapes) > 1 or len(shapes[0]) != 4 or not np.isscalar(shapes[0][0])
+        # Masks of the crop per frame size
+        self._masks: Dict[Tuple[int, int], np.ndarray] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Optional[dict]) -> Optional["RegionOfInterest"]:
+        """Region of interest of a camera from the "roi" key of its `camera_settings`: a rectangle, a polygon or a
+        list of both. Returns None for cameras without one."""
+        shapes = (settings or {}).get("roi")
+        if not shapes:
+            return None
+        # A single rectangle or polygon, rather than a list of them
+        if np.isscalar(shapes[0]) or (len(shapes[0]) == 2 and np.isscalar(shapes[0][0])):
+            shapes = [shapes]
+        return cls(shapes)
+
+    def crop(self, image: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Returns the region of a frame to run detection on, and the offset of its top left corner in the frame.
+        Frames the region does not intersect are returned whole."""
+        height, width = image.shape[:2]
+        x0, y0, x1, y1 = self.box[0], self.box[1], min(self.box[2], width), min(self.box[3], height)
+        if x0 >= x1 or y0 >= y1:
+            logger.warning("Region of interest %s outside of a %sx%s frame, the whole frame is used.", self.box,
+                           width, height)
+            return image, (0, 0)
+        crop = image[y0:y1, x0:x1]
+        if not self.needs_mask:
+            return crop, (x0, y0)
+        mask = self._masks.get((height, width))
+        if mask is None:
+            mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+            cv2.fillPoly(mask, [polygon - (x0, y0) for polygon in self.polygons], 255)
+            self._masks[(height, width)] = mask
+        return cv2.bitwise_and(crop, crop, mask=mask), (x0, y0)
+
+    @staticmethod
+    def to_frame(number_plates: List[NumberPlate], offset: Tuple[int, int]) -> List[NumberPlate]:
+        """Offsets the boxes and polygons of number plates found on a crop by the position of the crop, as
+        `FastANPR._offset_recognition_poly` offsets OCR polygons by their detection box."""
+        x, y = offset
+        if not x and not y:
+            return number_plates
+        return [
+            replace(
+                number_plate,
+                det_box=[number_plate.det_box[0] + x, number_plate.det_box[1] + y,
+                         number_plate.det_box[2] + x, number_plate.det_box[3] + y],
+                rec_poly=[[point[0] + x, point[1] + y] for point in number_plate.rec_poly]
+                if number_plate.rec_poly is not None else None
+            )
+            for number_plate in number_plates
+        ]
+
+
+def _polygon(shape: Shape) -> np.ndarray:
+    """Corners of a rectangle or points of a polygon as an (N, 2) int32 array, as `cv2.fillPoly` takes them."""
+    if len(shape) == 4 and all(np.isscalar(value) for value in shape):
+        x0, y0, x1, y1 = (int(value) for value in shape)
+        if x1 <= x0 or y1 <= y0:
+            raise ValueError(f"Expected a rectangle [x0, y0, x1, y1] with x0 < x1 and y0 < y1, but {shape} received.")
+        return np.array([[x0, y0], [x1 - 1, y0], [x1 - 1, y1 - 1], [x0, y1 - 1]], dtype=np.int32)
+    polygon = np.asarray(shape, dtype=np.int32)
+    if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+        raise ValueError(f"Expected a rectangle [x0, y0, x1, y1] or a polygon of at least 3 [x, y] points, but "
+                         f"{shape} received.")
+    return polygon
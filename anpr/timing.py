@@ -0,0 +1,28 @@
+from dataclasses import dataclass, field
+from typing import Callable, List
+
+STAGES = ("detect", "ocr", "merge")
+
+
+@dataclass(slots=True)
+class StageTimings:
+    """Durations in seconds of the stages of one `FastANPR.run_sync` call: plate detection, OCR of the crops and
+    construction of the number plates. `plates` holds the number of plates of each frame."""
+    frames: int
+    plates: List[int] = field(default_factory=list)
+    crops: int = 0
+    detect: float = 0.0
+    ocr: float = 0.0
+    merge: float = 0.0
+
+    def plate_timings(self) -> dict:
+        """Share of the call of a single plate in milliseconds, its frame's share of detection and its crop's share of
+        OCR, which is what `NumberPlate.timings` holds."""
+        return {
+            "detect": 1000 * self.detect / self.frames if self.frames else 0.0,
+            "ocr": 1000 * self.ocr / self.crops if self.crops else 0.0,
+        }
+
+
+# Called with the timings of every batch, e.g. to export them as metrics
+TimingHook = Callable[[StageTimings], None]
@@ -0,0 +1,158 @@
+import cv2
+import itertools
+import numpy as np
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Tuple
+from .detection import Detection
+from .recognition import Recognition
+
+
+class Track:
+    """A number plate followed across consecutive frames of a stream, holding the merged read of its OCR results."""
+
+    def __init__(self, track_id: int, box: List[int]):
+        self.track_id = track_id
+        self.box = box
+        self.missed = 0
+        self.best_area = 0
+        self.best_sharpness = 0.0
+        self.votes: Dict[str, float] = defaultdict(float)
+        self.best_reads: Dict[str, Tuple[List[List[float]], float]] = {}
+        # Batch in which a crop of the plate was sent to OCR and its read not recorded yet
+        self.pending_batch: Optional[int] = None
+
+    def add_read(self, recognition: Optional[Recognition], crop: np.ndarray, sharpness: float):
+        """Records an OCR result of the plate. Text votes are weighted by confidence and the polygon is stored
+        relative to the crop size, so it can be placed on the plate's box in later frames."""
+        self.pending_batch = None
+        height, width = crop.shape[:2]
+        self.best_area = max(self.best_area, width * height)
+        self.best_sharpness = max(self.best_sharpness, sharpness)
+        if recognition is None or not recognition.text:
+            return
+        self.votes[recognition.text] += recognition.conf
+        best = self.best_reads.get(recognition.text)
+        if best is None or recognition.conf > best[1]:
+            poly = [[point[0] / width, point[1] / height] for point in recognition.poly]
+            self.best_reads[recognition.text] = (poly, recognition.conf)
+
+    def read(self, crop: np.ndarray) -> Optional[Recognition]:
+        """Returns the merged read of the track, the text with the most confidence-weighted votes, with its polygon
+        placed on `crop`."""
+        if not self.votes:
+            return None
+        text = max(self.votes.items(), key=lambda vote: vote[1])[0]
+        poly, conf = self.best_reads[text]
+        height, width = crop.shape[:2]
+        return Recognition(
+            text=text, poly=[[int(point[0] * width), int(point[1] * height)] for point in poly], conf=conf
+        )
+
+
+class PlateTracker:
+    """Associates the number plates detected on consecutive frames of each stream to tracks by IoU of their
+    detection boxes, so a plate is only OCR'd when it first appears or when its crop gets noticeably larger or
+    sharper than any crop read so far. Call `start_batch` before associating the frames of a batch whose OCR results
+    are recorded after every frame was associated: a plate appearing on several of its frames is only read once."""
+
+    def __init__(
+            self,
+            iou_threshold: float = 0.3,
+            max_missed: int = 10,
+            area_gain: float = 1.5,
+            sharpness_gain: float = 1.5
+    ):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.area_gain = area_gain
+        self.sharpness_gain = sharpness_gain
+        self.ocr_calls = 0
+        self.ocr_skipped = 0
+        self._tracks: Dict[Hashable, List[Track]] = defaultdict(list)
+        self._track_ids = itertools.count(1)
+        self._batch = 0
+
+    def start_batch(self):
+        """Starts a new batch of frames. Reads still pending from earlier batches are no longer waited for."""
+        self._batch += 1
+
+    def associate(self, stream_id: Hashable, detections: List[Detection]) -> List[Tuple[Track, bool, float]]:
+        """Matches the detections of a frame to the tracks of its stream, creating tracks for new plates. Returns,
+        for each detection, its track, whether it needs OCR and the sharpness of its crop."""
+        tracks = self._tracks[stream_id]
+        pairs = sorted(
+            (
+                (iou, track_idx, detection_idx)
+                for track_idx, track in enumerate(tracks)
+                for detection_idx, detection in enumerate(detections)
+                for iou in (_iou(track.box, detection.box),)
+                if iou >= self.iou_threshold
+            ),
+            reverse=True
+        )
+
+        # Greedy association, highest IoU first
+        matches: Dict[int, Track] = {}
+        matched_tracks = set()
+        for _, track_idx, detection_idx in pairs:
+            if track_idx not in matched_tracks and detection_idx not in matches:
+                matches[detection_idx] = tracks[track_idx]
+                matched_tracks.add(track_idx)
+
+        # Age out tracks not seen for too many frames
+        for track_idx, track in enumerate(tracks):
+            track.missed = 0 if track_idx in matched_tracks else track.missed + 1
+        tracks[:] = [track for track in tracks if track.missed <= self.max_missed]
+
+        results = []
+        for detection_idx, detection in enumerate(detections):
+            sharpness = _sharpness(detection.image)
+            track = matches.get(detection_idx)
+            if track is None:
+                track = Track(next(self._track_ids), detection.box)
+                tracks.append(track)
+                needs_ocr = True
+            elif track.pending_batch == self._batch:
+                # Already sent to OCR on an earlier frame of this batch, its read comes with the batch
+                track.box = detection.box
+                needs_ocr = False
+            else:
+                track.box = detection.box
+                height, width = detection.image.shape[:2]
+                needs_ocr = (
+                    not track.votes or
+                    width * height >= track.best_area * self.area_gain or
+                    sharpness >= track.best_sharpness * self.sharpness_gain
+                )
+            if needs_ocr:
+                track.pending_batch = self._batch
+                self.ocr_calls += 1
+            else:
+                self.ocr_skipped += 1
+            results.append((track, needs_ocr, sharpness))
+        return results
+
+    def reset(self, stream_id: Optional[Hashable] = None):
+        """Forgets the tracks of a stream, or of every stream."""
+        if stream_id is None:
+            self._tracks.clear()
+        else:
+            self._tracks.pop(stream_id, None)
+
+
+def _iou(box_a: List[int], box_b: List[int]) -> float:
+    x_min, y_min = max(box_a[0], box_b[0]), max(box_a[1], box_b[1])
+    x_max, y_max = min(box_a[2], box_b[2]), min(box_a[3], box_b[3])
+    intersection = max(0, x_max - x_min) * max(0, y_max - y_min)
+    if intersection == 0:
+        return 0.0
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    return intersection / (area_a + area_b - intersection)
+
+
+def _sharpness(crop: np.ndarray) -> float:
+    """Variance of the Laplacian of the crop, higher for sharper images."""
+    if crop.size == 0:
+        return 0.0
+    return float(cv2.Laplacian(cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY), cv2.CV_64F).var())
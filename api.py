@@ -1,18 +1,36 @@
 import io
+import json
+import hmac
 import base64
+import asyncio
+import cv2
 import uvicorn
 import sys
 import os
+import logging
 
 # Ajouter le dossier courant au path Python
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from anpr import fastanpr
+from anpr.batching import BatchScheduler
+from anpr.cache import ResultCache
+from anpr.motion import MotionGate
+from anpr.pool import WorkerPool
 from anpr.version import __version__
+from database import get_db
+from services.history import DetectionFilters, detection_to_dict, iter_detections, search_detections
+from services.image_store import MEDIA_TYPES, create_image_store
+from services.metrics import observe_batch, observe_timings, render, stage_timer
+from services.profiling import PROFILE_ID_HEADER, RequestProfile, create_profiler
 import numpy as np
 
 from PIL import Image
-from fastapi import FastAPI
+from datetime import datetime, timezone
+from typing import Callable, Optional
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Query, Request, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 app = FastAPI(
@@ -20,30 +38,522 @@ app = FastAPI(
     description="A web server for FastANPR hosted using FastAPI",
     version=__version__
 )
-fast_anpr = fastanpr.FastANPR()
+logger = logging.getLogger(__name__)
+# Models are loaded and warmed up in the background at startup, /health/ready reports when they can serve requests
+fast_anpr = None
+scheduler: Optional[BatchScheduler] = None
+loading: Optional[asyncio.Task] = None
+
+
+def create_result_cache() -> Optional[ResultCache]:
+    max_entries = int(os.getenv("ANPR_CACHE_SIZE", "1024"))
+    if max_entries <= 0:
+        return None
+    max_distance = os.getenv("ANPR_CACHE_MAX_DISTANCE")
+    return ResultCache(
+        max_entries=max_entries,
+        ttl=float(os.getenv("ANPR_CACHE_TTL", "60")),
+        max_distance=int(max_distance) if max_distance else None
+    )
+
+
+def create_motion_gate() -> Optional[MotionGate]:
+    if os.getenv("ANPR_MOTION_GATE", "false").lower() != "true":
+        return None
+    return MotionGate(
+        threshold=int(os.getenv("ANPR_MOTION_THRESHOLD", "25")),
+        min_area=float(os.getenv("ANPR_MOTION_MIN_AREA", "0.005")),
+        refresh_interval=float(os.getenv("ANPR_MOTION_REFRESH_INTERVAL", "10"))
+    )
+
+
+# Results of recent frames, per camera, so repeated snapshots of fixed cameras skip inference
+result_cache = create_result_cache()
+# Frames of a camera where nothing moved since its last inferred frame get the number plates of that frame
+motion_gate = create_motion_gate()
+# Background writer of the detections, started when ANPR_SAVE_DETECTIONS is set
+detection_writer = None
+# Alerts raised by the saved detections, created with the detection writer
+alert_engine = None
+# Plate crops of the saved detections, served by /images
+image_store = create_image_store()
+# Regions of interest of the cameras, loaded from their settings when ANPR_CAMERA_ROI is set
+camera_regions = None
+# Profiles of the requests asked for with X-ANPR-Profile or ?profile=1, or sampled, served by /admin/profiles
+profiler = create_profiler()
+
+
+def create_detection_writer():
+    global alert_engine
+    from database import SessionLocal
+    from services.alerts import AlertEngine, low_confidence_rule, stolen_vehicle_rule
+    from services.detection_writer import DetectionWriter
+    from services.vehicles import VehicleResolver
+    from services.watchlist import Watchlist, start_refresh
+
+    watchlist = Watchlist()
+    start_refresh(watchlist, SessionLocal, float(os.getenv("WATCHLIST_REFRESH_INTERVAL", "30")))
+    rules = [stolen_vehicle_rule(watchlist)]
+    if os.getenv("ALERT_LOW_CONFIDENCE"):
+        rules.append(low_confidence_rule(float(os.getenv("ALERT_LOW_CONFIDENCE"))))
+    alert_engine = AlertEngine(rules, window=float(os.getenv("ALERT_DEDUP_WINDOW", "300")))
+    writer = DetectionWriter(
+        SessionLocal,
+        batch_size=int(os.getenv("DETECTION_BATCH_SIZE", "500")),
+        flush_interval=float(os.getenv("DETECTION_FLUSH_INTERVAL", "1")),
+        max_queue=int(os.getenv("DETECTION_MAX_QUEUE", "10000")),
+        spill_dir=os.getenv("DETECTION_SPILL_DIR", "spill"),
+        hooks=[alert_engine.hook()],
+        vehicle_resolver=VehicleResolver(
+            max_entries=int(os.getenv("VEHICLE_CACHE_SIZE", "100000")),
+            create_unknown=os.getenv("VEHICLE_CREATE_UNKNOWN", "1") == "1",
+            min_confidence=float(os.getenv("VEHICLE_MIN_CONFIDENCE", "0.9")),
+            refresh_interval=float(os.getenv("VEHICLE_REFRESH_INTERVAL", "30"))
+        )
+    )
+    writer.start()
+    return writer
+
+
+def create_camera_regions():
+    from database import SessionLocal
+    from services.cameras import CameraRegions, start_refresh
+
+    regions = CameraRegions()
+    start_refresh(regions, SessionLocal, float(os.getenv("CAMERA_SETTINGS_REFRESH_INTERVAL", "60")))
+    return regions
+
+
+def save_number_plates(image: np.ndarray, number_plates: list, camera_id: Optional[str]):
+    """Saves the plate crops of a frame to the image store and queues their detections, without waiting for the
+    database. Runs in a worker thread, off the event loop, as it encodes images."""
+    from services.detections import detection_rows
+
+    save_images = os.getenv("ANPR_SAVE_IMAGES", "crops")
+    camera = int(camera_id) if camera_id and camera_id.isdigit() else None
+    detection_writer.submit(detection_rows(
+        image, number_plates, camera, datetime.now(timezone.utc),
+        image_store=image_store if save_images in ("crops", "frames") else None,
+        save_frame=save_images == "frames"
+    ))
+
+
+def log_save_errors(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Could not save detections", exc_info=future.exception())
+
+
+def log_load_errors(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Could not load the models", exc_info=task.exception())
+
+
+def create_fast_anpr():
+    model_dir = os.getenv("ANPR_MODEL_DIR") or None
+    if os.getenv("ANPR_EXECUTOR") == "pool":
+        # Workers warm up before the pool is returned
+        return WorkerPool(
+            workers=int(os.getenv("ANPR_WORKERS", "1")),
+            threads_per_worker=int(os.getenv("ANPR_THREADS_PER_WORKER", "1")),
+            rec_mode=os.getenv("ANPR_REC_MODE", "det_rec"),
+            model_dir=model_dir,
+            timing_hook=observe_timings
+        )
+    anpr = fastanpr.FastANPR(
+        rec_mode=os.getenv("ANPR_REC_MODE", "det_rec"),
+        model_dir=model_dir,
+        executor=os.getenv("ANPR_EXECUTOR", "thread"),
+        workers=int(os.getenv("ANPR_WORKERS", "1")),
+        timing_hook=observe_timings
+    )
+    anpr.warmup()
+    return anpr
+
+
+async def load_models():
+    global fast_anpr, scheduler
+    fast_anpr = await asyncio.to_thread(create_fast_anpr)
+    scheduler = BatchScheduler(
+        fast_anpr,
+        max_batch_size=int(os.getenv("ANPR_MAX_BATCH_SIZE", "8")),
+        max_wait_ms=float(os.getenv("ANPR_MAX_BATCH_WAIT_MS", "10")),
+        max_in_flight=int(os.getenv("ANPR_WORKERS", "1")),
+        on_batch=observe_batch
+    )
+    scheduler.start()
+
+
+def ready_scheduler() -> BatchScheduler:
+    if scheduler is None:
+        raise HTTPException(status_code=503, detail="Models are still loading.")
+    return scheduler
+
+
+# Images of a /recognise/batch request, all read and decoded before any backpressure applies
+MAX_UPLOAD_IMAGES = int(os.getenv("ANPR_MAX_UPLOAD_IMAGES", "32"))
 
 
 class FastANPRRequest(BaseModel):
     image: str
+    camera_id: Optional[str] = None
+
+
+class NumberPlateModel(BaseModel):
+    det_box: list[int]
+    det_conf: float
+    rec_poly: Optional[list[list[int]]] = None
+    rec_text: Optional[str] = None
+    rec_conf: Optional[float] = None
+    track_id: Optional[int] = None
+    timings: Optional[dict[str, float]] = None
 
 
 class FastANPRResponse(BaseModel):
-    number_plates: list[fastanpr.NumberPlate] = None
+    number_plates: list[NumberPlateModel] = None
+
+
+class FastANPRBatchResponse(BaseModel):
+    results: list[FastANPRResponse]
 
 
 def base64_image_to_ndarray(base64_image_str: str) -> np.ndarray:
-    image_data = base64.b64decode(base64_image_str)
-    image = Image.open(io.BytesIO(image_data))
-    return np.array(image, dtype=np.uint8)
+    with stage_timer("decode"):
+        image_data = base64.b64decode(base64_image_str)
+        image = Image.open(io.BytesIO(image_data))
+        return np.array(image, dtype=np.uint8)
+
+
+def bytes_to_ndarray(image_data: bytes) -> np.ndarray:
+    """Decodes encoded image bytes straight into an RGB ndarray: the bytes are wrapped without copying, decoded once
+    and converted to RGB in place."""
+    with stage_timer("decode"):
+        image = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise HTTPException(status_code=400, detail="Could not decode the image.")
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+
+
+async def recognise_frame(
+        image: np.ndarray, camera_id: Optional[str] = None, profile: Optional[RequestProfile] = None
+) -> list:
+    """Returns the cached number plates of a frame already seen from the same camera, or runs ANPR on it. Only the
+    region of interest of the camera goes through the motion gate, the cache and detection, so changes outside of it
+    are ignored. Profiled frames skip all three, their profile only covers their own inference."""
+    batch_scheduler = ready_scheduler()
+    region = camera_regions.get(camera_id) if camera_regions is not None else None
+    detected_image, offset = region.crop(image) if region is not None else (image, None)
+    gated = motion_gate is not None and camera_id is not None and profile is None
+    motion = motion_gate.check(camera_id, detected_image) if gated else None
+    if gated and motion is None:
+        return motion_gate.last(camera_id)
+    if profile is not None:
+        number_plates = (await profile.run(fast_anpr, [detected_image]))[0]
+    else:
+        if result_cache is not None:
+            number_plates = result_cache.get(detected_image, scope=camera_id)
+            if number_plates is not None:
+                if motion is not None:
+                    motion_gate.remember(motion, number_plates)
+                return number_plates
+        number_plates = await batch_scheduler.submit(detected_image)
+    if offset is not None:
+        number_plates = region.to_frame(number_plates, offset)
+    # Only a frame whose inference succeeded becomes the reference of its camera
+    if motion is not None:
+        motion_gate.remember(motion, number_plates)
+    if profile is None and result_cache is not None:
+        result_cache.put(detected_image, number_plates, scope=camera_id)
+    # Static frames and frames answered from the cache are repeats and are not saved again
+    if detection_writer is not None and number_plates:
+        asyncio.get_running_loop().run_in_executor(
+            None, save_number_plates, image, number_plates, camera_id
+        ).add_done_callback(log_save_errors)
+    return number_plates
+
+
+def number_plates_content(number_plates: list) -> dict:
+    return {"number_plates": [number_plate.to_dict() for number_plate in number_plates]}
+
+
+def to_response(number_plates: list) -> JSONResponse:
+    """Serialises number plates straight to JSON. The response models only document the API schema, returning a
+    response directly skips their validation."""
+    with stage_timer("serialize"):
+        return JSONResponse(content=number_plates_content(number_plates))
+
+
+def to_batch_response(results: list) -> JSONResponse:
+    with stage_timer("serialize"):
+        return JSONResponse(content={"results": [number_plates_content(number_plates) for number_plates in results]})
+
+
+async def recognise_request(
+        request: Request, decode: Callable[..., np.ndarray], data, camera_id: Optional[str]
+) -> JSONResponse:
+    """Decodes a frame, recognises its number plates and serialises them, profiling the whole path when the request
+    asks for it or is sampled."""
+    profile = profiler.start(request) if profiler is not None else None
+    if profile is None:
+        return to_response(await recognise_frame(decode(data), camera_id))
+
+    try:
+        image = profile.call(decode, data)
+        number_plates = await recognise_frame(image, camera_id, profile)
+        response = profile.call(to_response, number_plates)
+    finally:
+        profile_id = profiler.finish(profile, endpoint=request.url.path, camera_id=camera_id)
+    if profile_id is not None:
+        response.headers[PROFILE_ID_HEADER] = profile_id
+    return response
 
 
 @app.post("/recognise", response_model=FastANPRResponse)
-async def recognise(request: FastANPRRequest):
-    image = base64_image_to_ndarray(request.image)
-    number_plates = (await fast_anpr.run(image))[0]
-    return FastANPRResponse(
-        number_plates=[fastanpr.NumberPlate.parse_obj(number_plate.__dict__) for number_plate in number_plates]
-    )
+async def recognise(request: FastANPRRequest, http_request: Request):
+    return await recognise_request(http_request, base64_image_to_ndarray, request.image, request.camera_id)
+
+
+@app.post(
+    "/recognise/image",
+    response_model=FastANPRResponse,
+    openapi_extra={"requestBody": {"content": {"image/*": {"schema": {"type": "string", "format": "binary"}}}}}
+)
+async def recognise_image(request: Request, camera_id: Optional[str] = None):
+    """Recognises number plates in an encoded image (JPEG, PNG...) sent as the raw request body."""
+    if not request.headers.get("content-type", "").startswith("image/"):
+        raise HTTPException(status_code=415, detail="Expected an image/* request body.")
+    return await recognise_request(request, bytes_to_ndarray, await request.body(), camera_id)
+
+
+@app.post("/recognise/upload", response_model=FastANPRResponse)
+async def recognise_upload(request: Request, image: UploadFile = File(...), camera_id: Optional[str] = None):
+    """Recognises number plates in an image uploaded as multipart/form-data."""
+    return await recognise_request(request, bytes_to_ndarray, await image.read(), camera_id)
+
+
+@app.post("/recognise/batch", response_model=FastANPRBatchResponse)
+async def recognise_batch(request: Request, images: list[UploadFile] = File(...), camera_id: Optional[str] = None):
+    """Recognises number plates in N images uploaded as multipart/form-data, returning N results in order. N is at most
+    ANPR_MAX_UPLOAD_IMAGES."""
+    if len(images) > MAX_UPLOAD_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_UPLOAD_IMAGES} images per request.")
+    contents = [await image.read() for image in images]
+    profile = profiler.start(request) if profiler is not None else None
+    if profile is None:
+        results = await asyncio.gather(*(recognise_frame(bytes_to_ndarray(data), camera_id) for data in contents))
+        return to_batch_response(results)
+
+    try:
+        decoded = [profile.call(bytes_to_ndarray, data) for data in contents]
+        results = await asyncio.gather(*(recognise_frame(image, camera_id, profile) for image in decoded))
+        response = profile.call(to_batch_response, results)
+    finally:
+        profile_id = profiler.finish(profile, endpoint=request.url.path, camera_id=camera_id, frames=len(contents))
+    if profile_id is not None:
+        response.headers[PROFILE_ID_HEADER] = profile_id
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    """Stage durations, batch sizes and plates per frame in the Prometheus text format."""
+    content, media_type = render()
+    return Response(content=content, media_type=media_type)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Admin endpoints need ANPR_ADMIN_TOKEN in the X-Admin-Token header, and are hidden when it is not set
+    unless ANPR_ADMIN_OPEN=true opens them to anyone."""
+    token = os.getenv("ANPR_ADMIN_TOKEN")
+    if not token:
+        if os.getenv("ANPR_ADMIN_OPEN", "false").lower() != "true":
+            raise HTTPException(status_code=404, detail="Not Found")
+        return
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    """The stored request profiles, newest first."""
+    if profiler is None:
+        return {"enabled": False}
+    return {"enabled": True, **profiler.stats(), "profiles": profiler.store.list()}
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def get_profile(
+        profile_id: str,
+        format: str = Query("prof", pattern="^(prof|text)$"),
+        sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls|ncalls)$"),
+        limit: int = Query(50, ge=1, le=1000)
+):
+    """Downloads a profile as a .prof file, to open with `python -m pstats` or snakeviz, or with `format=text` its
+    `limit` heaviest functions as printed by pstats."""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    try:
+        if format == "text":
+            return PlainTextResponse(await asyncio.to_thread(profiler.store.report, profile_id, sort, limit))
+        path = profiler.store.path(profile_id)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    """Ready once the models are loaded and warmed up."""
+    if scheduler is not None:
+        return {"status": "ready"}
+    if loading is not None and loading.done():
+        if loading.cancelled():
+            return JSONResponse(status_code=503, content={"status": "failed", "detail": "Model loading was cancelled."})
+        if loading.exception() is not None:
+            return JSONResponse(status_code=503, content={"status": "failed", "detail": repr(loading.exception())})
+    return JSONResponse(status_code=503, content={"status": "loading"})
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit and miss counters of the result cache."""
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+
+@app.get("/motion/stats")
+async def motion_stats():
+    """Frames skipped by the motion gate because nothing moved, e.g. to size inference for busy periods."""
+    if motion_gate is None:
+        return {"enabled": False}
+    return {"enabled": True, **motion_gate.stats()}
+
+
+@app.get("/images/{image_path:path}")
+async def get_image(image_path: str, request: Request):
+    """Serves a stored image. Images are content-addressed and never change, so their digest is a strong ETag and
+    clients may cache them indefinitely."""
+    try:
+        path = image_store.path(image_path)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Image not found.")
+    etag = f'"{path.stem}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Image not found.")
+    return FileResponse(path, media_type=MEDIA_TYPES[path.suffix], headers=headers)
+
+
+def get_session_factory():
+    """Sessions of streamed responses outlive the request dependencies, so they are opened by the stream itself."""
+    from database import SessionLocal
+    return SessionLocal
+
+
+def detections_page(db: Session, filters: DetectionFilters, cursor: Optional[str], limit: int) -> dict:
+    try:
+        detections, next_cursor = search_detections(db, filters, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": [detection_to_dict(detection) for detection in detections], "next_cursor": next_cursor}
+
+
+@app.get("/plates/{plate_number}/history")
+def plate_history(
+        plate_number: str,
+        camera_id: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=500),
+        db: Session = Depends(get_db)
+):
+    """Where and when a plate was seen, newest first. Pass `next_cursor` back as `cursor` to get the next page."""
+    filters = DetectionFilters(plate_number=plate_number, camera_id=camera_id, since=since, until=until)
+    return detections_page(db, filters, cursor, limit)
+
+
+@app.get("/detections")
+def list_detections(
+        camera_id: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(50, ge=1, le=500),
+        db: Session = Depends(get_db)
+):
+    """Detections matching the filters, e.g. every read of a camera over the last hour, newest first."""
+    filters = DetectionFilters(plate_number=plate_number, camera_id=camera_id, since=since, until=until)
+    return detections_page(db, filters, cursor, limit)
+
+
+@app.get("/detections/export")
+def export_detections(
+        camera_id: Optional[int] = None,
+        plate_number: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        session_factory=Depends(get_session_factory)
+):
+    """Streams every detection matching the filters as newline-delimited JSON, newest first."""
+    filters = DetectionFilters(plate_number=plate_number, camera_id=camera_id, since=since, until=until)
+
+    def lines():
+        db = session_factory()
+        try:
+            for detection in iter_detections(db, filters):
+                yield json.dumps(detection_to_dict(detection)) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/writer/stats")
+async def writer_stats():
+    """Queue depth and flush latency of the detection writer."""
+    if detection_writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **detection_writer.stats()}
+
+
+@app.get("/alerts/stats")
+async def alert_stats():
+    """Alerts emitted and suppressed as duplicates since startup."""
+    if alert_engine is None:
+        return {"enabled": False}
+    return {"enabled": True, **alert_engine.stats()}
+
+
+@app.on_event("startup")
+async def startup():
+    global loading, detection_writer, camera_regions
+    loading = asyncio.create_task(load_models())
+    loading.add_done_callback(log_load_errors)
+    if os.getenv("ANPR_CAMERA_ROI", "false").lower() == "true":
+        camera_regions = create_camera_regions()
+    if os.getenv("ANPR_SAVE_DETECTIONS", "false").lower() == "true":
+        detection_writer = create_detection_writer()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if loading is not None and not loading.done():
+        loading.cancel()
+    if scheduler is not None:
+        await scheduler.stop()
+    if fast_anpr is not None:
+        fast_anpr.close()
+    if detection_writer is not None:
+        await asyncio.to_thread(detection_writer.stop)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,40 @@
+"""Compares frames per second of the per-crop and batched OCR paths against the number of plates per frame.
+
+Usage: python -m benchmarks.batched_ocr [--frames 8] [--batch-size 8] [--device cpu]
+"""
+import argparse
+import statistics
+from itertools import cycle, islice
+
+from anpr import FastANPR
+from .common import load_test_images, time_call
+
+
+def main(frames: int, batch_size: int, device: str, repeats: int):
+    fast_anpr = FastANPR(device=device, rec_batch_size=batch_size)
+    images = load_test_images()
+
+    # Real plate crops from the test images, reused to build frames holding any number of plates
+    crops = [detection.image for detections in fast_anpr.detector.run(images) for detection in detections]
+    detect_time = statistics.median(time_call(lambda: fast_anpr.detector.run(images), repeats)) / len(images)
+
+    print(f"{'plates/frame':>12} {'per-crop fps':>14} {'batched fps':>12} {'speedup':>8}")
+    for plates_per_frame in (1, 2, 4, 6, 8, 10):
+        frame_crops = list(islice(cycle(crops), plates_per_frame * frames))
+        per_crop_time = statistics.median(
+            time_call(lambda: [fast_anpr.recogniser.run(crop) for crop in frame_crops], repeats)
+        )
+        batched_time = statistics.median(time_call(lambda: fast_anpr.recogniser.run_batch(frame_crops), repeats))
+        per_crop_fps = frames / (detect_time * frames + per_crop_time)
+        batched_fps = frames / (detect_time * frames + batched_time)
+        print(f"{plates_per_frame:>12} {per_crop_fps:>14.2f} {batched_fps:>12.2f} {batched_fps / per_crop_fps:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    main(args.frames, args.batch_size, args.device, args.repeats)
@@ -0,0 +1,77 @@
+import time
+import cv2
+import numpy as np
+from pathlib import Path
+from typing import Callable, List
+
+IMAGES_DIR = Path(__file__).parent.parent / 'tests/images'
+
+# Plates visible on each test image, as in tests/test_fastanpr.py
+EXPECTED_PLATES = {
+    'image001.jpg': ['BVH826'],
+    'image002.jpg': ['XJIIMES', 'FEIIDEK'],
+    'image003.jpg': ['CLS7145', '319ZBA'],
+    'image004.jpg': ['560ZPC'],
+    'image005.jpg': ['ERS73W'],
+    'image006.jpg': ['BPN325'],
+}
+
+
+def load_test_images(images_dir: Path = IMAGES_DIR) -> List[np.ndarray]:
+    """Loads the test images as RGB ndarrays, the layout expected by `FastANPR.run`."""
+    return [cv2.cvtColor(cv2.imread(str(file)), cv2.COLOR_BGR2RGB) for file in sorted(images_dir.glob('*.jpg'))]
+
+
+def time_call(function: Callable, repeats: int = 5, warmup: int = 1) -> List[float]:
+    """Calls `function` `warmup` times untimed, then `repeats` times, and returns the duration of each timed call in
+    seconds."""
+    for _ in range(warmup):
+        function()
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def synthetic_frame(width: int, height: int, plates: int, seed: int = 0) -> np.ndarray:
+    """An RGB frame of the given size made of a test image background with `plates` black on white plates drawn
+    side by side across its lower half."""
+    rng = np.random.default_rng(seed)
+    backgrounds = sorted(IMAGES_DIR.glob('*.jpg'))
+    background = cv2.imread(str(backgrounds[int(rng.integers(len(backgrounds)))]))
+    frame = cv2.cvtColor(cv2.resize(background, (width, height), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2RGB)
+    plate_width = min(width // max(plates, 1) - 8, width // 10)
+    plate_height = max(plate_width // 4, 8)
+    for index in range(plates):
+        x = 4 + index * (width // plates)
+        y = height // 2 + int(rng.integers(max(height // 2 - plate_height, 1)))
+        text = "".join(rng.choice(list("ABCDEFGHJKLMNPRSTUVWXYZ0123456789"), 6))
+        cv2.rectangle(frame, (x, y), (x + plate_width, y + plate_height), (255, 255, 255), -1)
+        cv2.rectangle(frame, (x, y), (x + plate_width, y + plate_height), (0, 0, 0), max(plate_height // 16, 1))
+        cv2.putText(frame, text, (x + plate_width // 16, y + plate_height * 3 // 4), cv2.FONT_HERSHEY_SIMPLEX,
+                    plate_height / 40, (0, 0, 0), max(plate_height // 12, 1))
+    return frame
+
+
+def latency_stats(durations: List[float], items: int = 1) -> dict:
+    """p50/p95/p99 and mean latencies in milliseconds of timed calls, each processing `items` items, and the
+    throughput in items per second."""
+    durations = sorted(durations)
+
+    def percentile(fraction: float) -> float:
+        position = fraction * (len(durations) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(durations) - 1)
+        return durations[lower] + (durations[upper] - durations[lower]) * (position - lower)
+
+    mean = sum(durations) / len(durations)
+    return {
+        "calls": len(durations),
+        "p50_ms": 1000 * percentile(0.50),
+        "p95_ms": 1000 * percentile(0.95),
+        "p99_ms": 1000 * percentile(0.99),
+        "mean_ms": 1000 * mean,
+        "throughput": items / mean,
+    }
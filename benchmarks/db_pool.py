@@ -0,0 +1,76 @@
+"""Measures how database query throughput scales with concurrency, for a single shared connection (the former
+StaticPool), the sync QueuePool and the asyncpg engine.
+
+Every query holds its connection for --query-ms (pg_sleep), like a typical indexed lookup plus the network round trip.
+
+Usage: python -m benchmarks.db_pool [--concurrency 1 2 4 8 16 32] [--queries 400] [--query-ms 5]
+"""
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from database import DATABASE_URL, async_database_url, pool_options
+
+
+def run_sync(engine, concurrency: int, queries: int, query: str) -> float:
+    def execute(_):
+        with engine.connect() as connection:
+            connection.execute(text(query))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(execute, range(concurrency)))  # open the connections
+        start = time.perf_counter()
+        list(executor.map(execute, range(queries)))
+        return queries / (time.perf_counter() - start)
+
+
+async def run_async(concurrency: int, queries: int, query: str) -> float:
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    # Created in the event loop of the run, which its asyncpg connections belong to
+    engine = create_async_engine(async_database_url(DATABASE_URL), pool_size=concurrency, max_overflow=0)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def execute():
+        async with semaphore:
+            async with engine.connect() as connection:
+                await connection.execute(text(query))
+
+    await asyncio.gather(*(execute() for _ in range(concurrency)))
+    start = time.perf_counter()
+    await asyncio.gather(*(execute() for _ in range(queries)))
+    qps = queries / (time.perf_counter() - start)
+    await engine.dispose()
+    return qps
+
+
+def main(concurrency: list, queries: int, query_ms: float, skip_async: bool):
+    query = f"SELECT pg_sleep({query_ms / 1000})"
+    options = pool_options(DATABASE_URL)
+    static = create_engine(DATABASE_URL, poolclass=StaticPool)
+    print(f"{'concurrency':>11} {'static q/s':>11} {'queue q/s':>10} {'async q/s':>10}")
+    for count in concurrency:
+        options.update(pool_size=count, max_overflow=0)
+        pooled = create_engine(DATABASE_URL, **options)
+        static_qps = run_sync(static, count, queries, query)
+        pooled_qps = run_sync(pooled, count, queries, query)
+        pooled.dispose()
+        async_qps = float("nan")
+        if not skip_async:
+            async_qps = asyncio.run(run_async(count, queries, query))
+        print(f"{count:>11} {static_qps:>11.1f} {pooled_qps:>10.1f} {async_qps:>10.1f}")
+    static.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument('--queries', type=int, default=400)
+    parser.add_argument('--query-ms', type=float, default=5.0)
+    parser.add_argument('--skip-async', action='store_true', help="Skips the asyncpg engine")
+    args = parser.parse_args()
+    main(args.concurrency, args.queries, args.query_ms, args.skip_async)
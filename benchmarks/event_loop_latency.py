@@ -0,0 +1,59 @@
+"""Measures the event loop latency seen by concurrent coroutines while FastANPR runs inference, for each executor.
+
+Usage: python -m benchmarks.event_loop_latency [--requests 8] [--workers 2] [--device cpu]
+"""
+import time
+import asyncio
+import argparse
+import statistics
+from itertools import cycle, islice
+
+from anpr import FastANPR
+from .common import load_test_images
+
+TICK_INTERVAL = 0.005
+
+
+async def _measure_loop_lag(stop: asyncio.Event) -> list:
+    """Sleeps for `TICK_INTERVAL` repeatedly, recording how late the loop wakes the coroutine up."""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_INTERVAL)
+        lags.append(time.perf_counter() - start - TICK_INTERVAL)
+    return lags
+
+
+async def _benchmark(fast_anpr: FastANPR, images: list, requests: int):
+    await fast_anpr.run(images[0])  # warmup
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(_measure_loop_lag(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(fast_anpr.run(image) for image in islice(cycle(images), requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lags = sorted(await ticker)
+    return elapsed, lags
+
+
+def main(requests: int, workers: int, device: str):
+    images = load_test_images()
+    print(f"{'executor':>8} {'requests/s':>11} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for executor in ("inline", "thread", "process"):
+        fast_anpr = FastANPR(device=device, executor=executor, workers=workers if executor == "process" else 1)
+        elapsed, lags = asyncio.run(_benchmark(fast_anpr, images, requests))
+        fast_anpr.close()
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+        print(
+            f"{executor:>8} {requests / elapsed:>11.2f} {statistics.median(lags or [0.0]) * 1000:>11.2f} "
+            f"{p99 * 1000:>11.2f} {max(lags or [0.0]) * 1000:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--device', type=str, default='cpu')
+    args = parser.parse_args()
+    main(args.requests, args.workers, args.device)
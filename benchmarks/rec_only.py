@@ -0,0 +1,54 @@
+"""Compares the latency and accuracy of the "det_rec" and "rec" recognition modes on the plates of tests/images.
+
+A plate counts as read when its text is within a Levenshtein distance of `--max-distance` of an expected plate.
+
+Usage: python -m benchmarks.rec_only [--repeats 5] [--device cpu]
+"""
+import argparse
+import statistics
+import Levenshtein
+from pathlib import Path
+
+from anpr import fastanpr
+from anpr.detection import Detector
+from anpr.recognition import Recogniser
+from .common import IMAGES_DIR, EXPECTED_PLATES, load_test_images, time_call
+
+
+def main(repeats: int, device: str, max_distance: int):
+    images = load_test_images()
+    expected = [EXPECTED_PLATES[file.name] for file in sorted(IMAGES_DIR.glob('*.jpg'))]
+    detector = Detector(detection_model=Path(fastanpr.__file__).parent / 'best.pt', device=device)
+    detections = detector.run(images)
+    crops = [detection.image for image_detections in detections for detection in image_detections]
+
+    print(f"{'mode':>8} {'ms/crop':>8} {'ms/crop batched':>16} {'plates read':>12} {'exact':>6}")
+    for mode in ("det_rec", "rec"):
+        recogniser = Recogniser(device=device, mode=mode)
+        per_crop = statistics.median(time_call(lambda: [recogniser.run(crop) for crop in crops], repeats))
+        batched = statistics.median(time_call(lambda: recogniser.run_batch(crops), repeats))
+
+        recognitions = iter(recogniser.run_batch(crops))
+        read, exact, total = 0, 0, 0
+        for image_detections, image_expected in zip(detections, expected):
+            total += len(image_expected)
+            for _ in image_detections:
+                recognition = next(recognitions)
+                if recognition is None:
+                    continue
+                distance = min(Levenshtein.distance(recognition.text, plate) for plate in image_expected)
+                read += distance <= max_distance
+                exact += distance == 0
+        print(
+            f"{mode:>8} {per_crop / len(crops) * 1000:>8.2f} {batched / len(crops) * 1000:>16.2f} "
+            f"{f'{read}/{total}':>12} {exact:>6}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--max-distance', type=int, default=1)
+    args = parser.parse_args()
+    main(args.repeats, args.device, args.max_distance)
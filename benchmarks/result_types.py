@@ -0,0 +1,104 @@
+"""Measures the per-plate overhead of the pipeline result types, from detection to the serialised API response.
+
+"pydantic" reproduces the former path: pydantic Detection, Recognition and NumberPlate models, the NumberPlate rebuilt
+with `parse_obj` in `api.py` and the response validated again by FastAPI before serialisation. "dataclass" is the
+current path: slotted dataclasses serialised once with `NumberPlate.to_dict`.
+
+Usage: python -m benchmarks.result_types [--plates 8] [--number 20000]
+"""
+import json
+import timeit
+import argparse
+import numpy as np
+from typing import List
+from pydantic import BaseModel
+
+from anpr.detection import Detection
+from anpr.recognition import Recognition
+from anpr.numberplate import NumberPlate
+
+
+class PydanticDetection(BaseModel):
+    image: np.ndarray
+    box: List[int]
+    conf: float
+
+    class Config:
+        frozen = True
+        arbitrary_types_allowed = True
+
+
+class PydanticRecognition(BaseModel):
+    text: str
+    poly: List[List[int]]
+    conf: float
+
+    class Config:
+        frozen = True
+
+
+class PydanticNumberPlate(BaseModel):
+    det_box: List[int]
+    det_conf: float
+    rec_poly: List[List[int]] = None
+    rec_text: str = None
+    rec_conf: float = None
+
+    class Config:
+        frozen = True
+
+
+class PydanticResponse(BaseModel):
+    number_plates: List[PydanticNumberPlate] = None
+
+
+CROP = np.zeros((40, 120, 3), dtype=np.uint8)
+BOX = [100, 200, 220, 240]
+POLY = [[4, 6], [116, 6], [116, 34], [4, 34]]
+
+
+def pydantic_path(plates: int) -> str:
+    number_plates = []
+    for _ in range(plates):
+        detection = PydanticDetection(image=CROP, box=BOX, conf=0.91)
+        recognition = PydanticRecognition(text="AB1234", poly=POLY, conf=0.87)
+        number_plates.append(PydanticNumberPlate(
+            det_box=detection.box, det_conf=detection.conf,
+            rec_poly=[[x + detection.box[0], y + detection.box[1]] for x, y in recognition.poly],
+            rec_text=recognition.text, rec_conf=recognition.conf
+        ))
+    response = PydanticResponse(
+        number_plates=[PydanticNumberPlate.parse_obj(number_plate.__dict__) for number_plate in number_plates]
+    )
+    return json.dumps(PydanticResponse.model_validate(response.model_dump()).model_dump())
+
+
+def dataclass_path(plates: int) -> str:
+    number_plates = []
+    for _ in range(plates):
+        detection = Detection(image=CROP, box=BOX, conf=0.91)
+        recognition = Recognition(text="AB1234", poly=POLY, conf=0.87)
+        number_plates.append(NumberPlate(
+            det_box=detection.box, det_conf=detection.conf,
+            rec_poly=[[x + detection.box[0], y + detection.box[1]] for x, y in recognition.poly],
+            rec_text=recognition.text, rec_conf=recognition.conf
+        ))
+    return json.dumps({"number_plates": [number_plate.to_dict() for number_plate in number_plates]})
+
+
+def main(plates: int, number: int):
+    print(f"{'path':>10} {'us/plate':>9}")
+    timings = {}
+    for name, path in (("pydantic", pydantic_path), ("dataclass", dataclass_path)):
+        seconds = min(timeit.repeat(lambda: path(plates), number=number, repeat=3))
+        timings[name] = seconds / number / plates * 1e6
+        print(f"{name:>10} {timings[name]:>9.2f}")
+    print(f"speedup: {timings['pydantic'] / timings['dataclass']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plates', type=int, default=8)
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+    main(args.plates, args.number)
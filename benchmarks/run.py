@@ -0,0 +1,295 @@
+"""Per-stage latency benchmark suite of the ANPR pipeline, with regression checks against a stored baseline.
+
+Stages:
+    detect        Detector.run on batches of frames, per batch size and resolution
+    recognise     Recogniser.run on single plate crops, and Recogniser.run_batch per batch size
+    clean_ocr     _clean_ocr merging the OCR boxes of multi-line plates
+    number_plate  NumberPlate construction and serialisation, per plates per frame
+    http          POST /recognise end to end, per resolution and plates per frame
+
+Frames are the test images plus synthetic frames (see `synthetic_frame`). Every case reports p50/p95/p99 latency and
+throughput (frames, crops or plates per second). `--output` saves the results as JSON; `--baseline` compares them to
+saved results and exits with status 1 when a case got slower than `--threshold` allows.
+
+Usage:
+    python -m benchmarks.run [--stages detect recognise ...] [--output results.json]
+    python -m benchmarks.run --baseline baseline.json [--threshold 0.10]
+    python -m benchmarks.run --compare results.json baseline.json
+"""
+import sys
+import json
+import time
+import base64
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+from itertools import cycle, islice
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from .common import load_test_images, latency_stats, synthetic_frame, time_call
+
+STAGES = ("detect", "recognise", "clean_ocr", "number_plate", "http")
+RESOLUTIONS = ("640x480", "1280x720", "1920x1080")
+# Latency statistics compared to the baseline
+COMPARED = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def case(stage: str, params: dict, durations: List[float], items: int, unit: str) -> dict:
+    return {"stage": stage, "params": params, "unit": unit, **latency_stats(durations, items)}
+
+
+def case_key(result: dict) -> str:
+    params = ",".join(f"{name}={value}" for name, value in sorted(result["params"].items()))
+    return f"{result['stage']}[{params}]"
+
+
+def parse_resolution(resolution: str) -> Tuple[int, int]:
+    width, height = resolution.lower().split("x")
+    return int(width), int(height)
+
+
+def frames_of(resolution: str, count: int, plates: int) -> List[np.ndarray]:
+    width, height = parse_resolution(resolution)
+    return [synthetic_frame(width, height, plates, seed) for seed in range(count)]
+
+
+def bench_detect(fast_anpr, args) -> List[dict]:
+    results = []
+    test_images = load_test_images()
+    for batch_size in args.batch_sizes:
+        batch = list(islice(cycle(test_images), batch_size))
+        durations = time_call(lambda: fast_anpr.detector.run(batch), args.repeats, args.warmup)
+        results.append(case("detect", {"batch_size": batch_size, "frames": "tests/images"}, durations, batch_size,
+                            "frames/s"))
+        for resolution in args.resolutions:
+            batch = frames_of(resolution, batch_size, plates=2)
+            durations = time_call(lambda: fast_anpr.detector.run(batch), args.repeats, args.warmup)
+            results.append(case("detect", {"batch_size": batch_size, "resolution": resolution}, durations,
+                                batch_size, "frames/s"))
+    return results
+
+
+def bench_recognise(fast_anpr, args) -> List[dict]:
+    crops = [detection.image for detections in fast_anpr.detector.run(load_test_images()) for detection in detections]
+    if not crops:
+        raise RuntimeError("No plate detected on the test images, the recogniser cannot be benchmarked.")
+    results = [case("recognise", {"batch_size": 1, "api": "run"},
+                    time_call(lambda: fast_anpr.recogniser.run(crops[0]), args.repeats, args.warmup), 1, "crops/s")]
+    for batch_size in args.batch_sizes:
+        batch = list(islice(cycle(crops), batch_size))
+        durations = time_call(lambda: fast_anpr.recogniser.run_batch(batch), args.repeats, args.warmup)
+        results.append(case("recognise", {"batch_size": batch_size, "api": "run_batch"}, durations, batch_size,
+                            "crops/s"))
+    return results
+
+
+def ocr_boxes(lines: int) -> Tuple[List[List[List[int]]], List[str], List[float]]:
+    """OCR output of a plate read as `lines` boxes, the last one a small noisy box."""
+    polys, texts, confs = [], [], []
+    for line in range(lines):
+        top = 4 + 30 * line
+        height = 10 if line == lines - 1 and lines > 1 else 24
+        polys.append([[4, top], [116, top], [116, top + height], [4, top + height]])
+        texts.append(f"AB-{line}23 ·")
+        confs.append(0.9 - 0.05 * line)
+    return polys, texts, confs
+
+
+def bench_clean_ocr(args) -> List[dict]:
+    from anpr.recognition import _clean_ocr
+
+    results = []
+    number = args.number
+    for lines in (2, 3, 4):
+        polys, texts, confs = ocr_boxes(lines)
+        durations = time_call(
+            lambda: [_clean_ocr(polys, texts, confs) for _ in range(number)], args.repeats, args.warmup
+        )
+        results.append(case("clean_ocr", {"boxes": lines}, [duration / number for duration in durations], 1,
+                            "calls/s"))
+    return results
+
+
+def bench_number_plate(args) -> List[dict]:
+    from anpr import FastANPR
+    from anpr.detection import Detection
+    from anpr.recognition import Recognition
+    from anpr.numberplate import NumberPlate
+
+    crop = np.zeros((40, 120, 3), dtype=np.uint8)
+    results = []
+    number = args.number
+    for plates in args.plates:
+        pairs = [
+            (Detection(image=crop, box=[100 + index, 200, 220 + index, 240], conf=0.9),
+             Recognition(text="AB1234", poly=[[4, 6], [116, 6], [116, 34], [4, 34]], conf=0.8))
+            for index in range(plates)
+        ]
+
+        def build():
+            # As FastANPR._number_plate, then as the API response
+            number_plates = [
+                NumberPlate(
+                    det_box=detection.box, det_conf=detection.conf,
+                    rec_poly=FastANPR._offset_recognition_poly(detection.box, recognition.poly),
+                    rec_text=recognition.text, rec_conf=recognition.conf
+                )
+                for detection, recognition in pairs
+            ]
+            return json.dumps({"number_plates": [number_plate.to_dict() for number_plate in number_plates]})
+
+        durations = time_call(lambda: [build() for _ in range(number)], args.repeats, args.warmup)
+        results.append(case("number_plate", {"plates": plates}, [duration / number for duration in durations],
+                            plates, "plates/s"))
+    return results
+
+
+def bench_http(args) -> List[dict]:
+    from fastapi.testclient import TestClient
+    import api
+
+    results = []
+    with TestClient(api.app) as client:
+        deadline = time.monotonic() + 600
+        while client.get("/health/ready").status_code != 200:
+            if time.monotonic() > deadline:
+                raise RuntimeError("The models were not loaded within 10 minutes.")
+            time.sleep(0.5)
+        # Every request must run the pipeline
+        api.result_cache = None
+        api.detection_writer = None
+
+        for resolution in args.resolutions:
+            for plates in args.plates:
+                bodies = cycle([
+                    {"image": base64.b64encode(cv2.imencode(".jpg", frame[..., ::-1])[1].tobytes()).decode()}
+                    for frame in frames_of(resolution, 4, plates)
+                ])
+
+                def post():
+                    response = client.post("/recognise", json=next(bodies))
+                    response.raise_for_status()
+
+                durations = time_call(post, args.repeats, args.warmup)
+                results.append(case("http", {"resolution": resolution, "plates": plates}, durations, 1,
+                                    "requests/s"))
+    return results
+
+
+def run(args) -> dict:
+    fast_anpr = None
+    if any(stage in ("detect", "recognise") for stage in args.stages):
+        from anpr import FastANPR
+
+        fast_anpr = FastANPR(device=args.device, rec_batch_size=max(args.batch_sizes), executor="inline")
+        fast_anpr.warmup()
+
+    runners: Dict[str, Callable[[], List[dict]]] = {
+        "detect": lambda: bench_detect(fast_anpr, args),
+        "recognise": lambda: bench_recognise(fast_anpr, args),
+        "clean_ocr": lambda: bench_clean_ocr(args),
+        "number_plate": lambda: bench_number_plate(args),
+        "http": lambda: bench_http(args),
+    }
+    results = []
+    for stage in args.stages:
+        stage_results = runners[stage]()
+        for result in stage_results:
+            print_result(result)
+        results.extend(stage_results)
+    return {"meta": metadata(args), "results": results}
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "device": args.device,
+        "repeats": args.repeats,
+    }
+
+
+def print_result(result: dict):
+    print(f"{case_key(result):<48} p50 {result['p50_ms']:>9.3f} ms  p95 {result['p95_ms']:>9.3f} ms  "
+          f"p99 {result['p99_ms']:>9.3f} ms  {result['throughput']:>10.1f} {result['unit']}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """Prints the change of each case against the baseline and returns the keys of the cases whose p50, p95 or p99
+    latency grew by more than `threshold` (a fraction)."""
+    baseline_cases = {case_key(result): result for result in baseline["results"]}
+    regressions = []
+    print(f"{'case':<48} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for result in results["results"]:
+        key = case_key(result)
+        reference = baseline_cases.get(key)
+        if reference is None:
+            print(f"{key:<48} {'new':>9}")
+            continue
+        changes = {
+            statistic: result[statistic] / reference[statistic] - 1 if reference[statistic] else 0.0
+            for statistic in COMPARED
+        }
+        regressed = [statistic for statistic, change in changes.items() if change > threshold]
+        if regressed:
+            regressions.append(key)
+        print(f"{key:<48} " + " ".join(f"{changes[statistic]:>+8.1%}" for statistic in COMPARED)
+              + ("  REGRESSION (" + ", ".join(regressed) + ")" if regressed else ""))
+    return regressions
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 4, 8])
+    parser.add_argument('--resolutions', nargs='+', default=list(RESOLUTIONS))
+    parser.add_argument('--plates', nargs='+', type=int, default=[1, 2, 4, 8])
+    parser.add_argument('--repeats', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--number', type=int, default=1000, help="Calls per timed repeat of the pure stages")
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--output', type=str, help="Saves the results to this JSON file")
+    parser.add_argument('--baseline', type=str, help="Compares the results to this JSON file")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Allowed latency increase, as a fraction")
+    parser.add_argument('--compare', nargs=2, metavar=("RESULTS", "BASELINE"),
+                        help="Compares two saved JSON files without running the benchmarks")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        results, baseline = load(args.compare[0]), load(args.compare[1])
+    else:
+        results = run(args)
+        baseline = load(args.baseline) if args.baseline else None
+        if args.output:
+            Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+            print(f"Results saved to {args.output}")
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Measures import and startup times of the server, failing when they exceed the given budgets.
+
+Imports are timed in fresh interpreters. Startup is the time to build FastANPR and warm it up, and the first request
+latency is measured right after warmup.
+
+Usage: python -m benchmarks.startup_time [--max-import 1.0] [--max-startup 30] [--importtime]
+"""
+import sys
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+
+
+def time_import(module: str, importtime: bool = False) -> float:
+    """Imports `module` in a fresh interpreter and returns the import time in seconds."""
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", code]
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True)
+    if importtime:
+        _print_slowest_imports(completed.stderr)
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+def _print_slowest_imports(report: str, count: int = 10):
+    rows = []
+    for line in report.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        rows.append((int(cumulative.strip()), name.rstrip()))
+    for cumulative, name in sorted(rows, reverse=True)[:count]:
+        print(f"    {cumulative / 1e6:>7.3f}s {name}")
+
+
+def main(max_import: float, max_startup: float, importtime: bool, device: str):
+    failures = []
+    for module in ("anpr", "api"):
+        seconds = time_import(module, importtime)
+        print(f"import {module}: {seconds:.3f}s")
+        if seconds > max_import:
+            failures.append(f"import {module} took {seconds:.3f}s, budget {max_import}s")
+
+    sys.path.insert(0, str(ROOT))
+    from anpr import FastANPR
+    from .common import load_test_images
+
+    start = time.perf_counter()
+    fast_anpr = FastANPR(device=device, executor="inline")
+    loaded = time.perf_counter()
+    fast_anpr.warmup()
+    warmed = time.perf_counter()
+    fast_anpr.run_sync(load_test_images()[:1])
+    first_request = time.perf_counter() - warmed
+    print(f"model loading: {loaded - start:.3f}s, warmup: {warmed - loaded:.3f}s, "
+          f"first request: {first_request * 1000:.1f}ms")
+    if warmed - start > max_startup:
+        failures.append(f"startup took {warmed - start:.3f}s, budget {max_startup}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-import', type=float, default=1.0, help="Import budget of each module, in seconds")
+    parser.add_argument('--max-startup', type=float, default=30.0, help="Loading and warmup budget, in seconds")
+    parser.add_argument('--importtime', action='store_true', help="Print the slowest imports of each module")
+    parser.add_argument('--device', type=str, default='cpu')
+    args = parser.parse_args()
+    main(args.max_import, args.max_startup, args.importtime, args.device)
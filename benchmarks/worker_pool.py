@@ -0,0 +1,35 @@
+"""Measures how WorkerPool throughput scales with the number of worker processes.
+
+Usage: python -m benchmarks.worker_pool [--workers 1 2 4 8] [--threads-per-worker 1] [--frames 128]
+"""
+import time
+import asyncio
+import argparse
+from itertools import cycle, islice
+
+from anpr.pool import WorkerPool
+from .common import load_test_images
+
+
+def main(workers: list, threads_per_worker: int, frames: int, batch_size: int):
+    images = list(islice(cycle(load_test_images()), frames))
+    print(f"{'workers':>7} {'frames/s':>9} {'speedup':>8} {'efficiency':>11}")
+    baseline = None
+    for count in workers:
+        with WorkerPool(workers=count, threads_per_worker=threads_per_worker) as pool:
+            asyncio.run(pool.map(images[:count * batch_size], batch_size=batch_size))  # warmup every worker
+            start = time.perf_counter()
+            asyncio.run(pool.map(images, batch_size=batch_size))
+            fps = frames / (time.perf_counter() - start)
+        baseline = baseline or fps / count
+        print(f"{count:>7} {fps:>9.2f} {fps / baseline:>7.2f}x {fps / baseline / count:>10.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--threads-per-worker', type=int, default=1)
+    parser.add_argument('--frames', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=4)
+    args = parser.parse_args()
+    main(args.workers, args.threads_per_worker, args.frames, args.batch_size)
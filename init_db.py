@@ -22,7 +22,17 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 def create_tables():
     """Créé toutes les tables de la base de données"""
     print("🔧 Création des tables...")
-    Base.metadata.create_all(bind=engine)
+    if engine.dialect.name == "postgresql":
+        # Le schéma PostgreSQL (table detections partitionnée, fonctions de partitionnement) est celui des migrations
+        from alembic import command
+        from alembic.config import Config
+
+        root = Path(__file__).parent
+        config = Config(str(root / "alembic.ini"))
+        config.set_main_option("script_location", str(root / "alembic"))
+        command.upgrade(config, "head")
+    else:
+        Base.metadata.create_all(bind=engine)
     print("✅ Tables créées avec succès!")
 
 def create_admin_user():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, ForeignKey, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -26,6 +26,9 @@ class AlertStatus(enum.Enum):
 
 class Alert(Base):
     __tablename__ = "alerts"
+    __table_args__ = (
+        Index("ix_alerts_status_created_at", "status", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     type = Column(Enum(AlertType), nullable=False)
@@ -40,7 +43,8 @@ class Alert(Base):
     resolved_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     
     # Foreign Keys
-    detection_id = Column(Integer, ForeignKey("detections.id"), nullable=True)
+    # No foreign key constraint, the partitioned detections table has no unique key on id alone
+    detection_id = Column(Integer, nullable=True, index=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=True)
     camera_id = Column(Integer, ForeignKey("cameras.id"), nullable=True)
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -50,7 +54,9 @@ class Alert(Base):
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     # Relations
-    detection = relationship("Detection", back_populates="alerts")
+    detection = relationship(
+        "Detection", primaryjoin="foreign(Alert.detection_id) == Detection.id", back_populates="alerts"
+    )
     vehicle = relationship("Vehicle")
     camera = relationship("Camera")
     created_by = relationship("User", foreign_keys=[created_by_id], back_populates="alerts_created")
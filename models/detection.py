@@ -1,13 +1,23 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, JSON, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, JSON, ForeignKey, Boolean, Index, Sequence, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.schema import PrimaryKeyConstraint
 from database import Base
 
 class Detection(Base):
     __tablename__ = "detections"
+    # Indexes of the main queries: reads of a camera over a time range, history of a plate and triggered alerts.
+    # On PostgreSQL the table is partitioned by month on detected_at (see the alembic migrations), so its primary key
+    # is (id, detected_at); id stays unique through its sequence.
+    __table_args__ = (
+        Index("ix_detections_camera_id_detected_at", "camera_id", "detected_at"),
+        Index("ix_detections_plate_number_detected_at", "plate_number", "detected_at"),
+        Index("ix_detections_alert_triggered_detected_at", "detected_at", postgresql_where=text("is_alert_triggered")),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    plate_number = Column(String, nullable=False, index=True)
+    id = Column(Integer, Sequence("detections_id_seq"), primary_key=True)
+    plate_number = Column(String, nullable=False)
     confidence = Column(Float, nullable=False)
     detection_confidence = Column(Float, nullable=True)  # YOLO confidence
     recognition_confidence = Column(Float, nullable=True)  # OCR confidence
@@ -30,7 +40,7 @@ class Detection(Base):
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     
     # Timestamps
-    detected_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    detected_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
@@ -38,7 +48,17 @@ class Detection(Base):
     vehicle = relationship("Vehicle", back_populates="detections")
     camera = relationship("Camera", back_populates="detections")
     created_by = relationship("User", back_populates="detections")
-    alerts = relationship("Alert", back_populates="detection")
+    alerts = relationship(
+        "Alert", primaryjoin="Detection.id == foreign(Alert.detection_id)", back_populates="detection"
+    )
 
     def __repr__(self):
-        return f"<Detection(id={self.id}, plate='{self.plate_number}', confidence={self.confidence:.2f})>" 
\ No newline at end of file
+        return f"<Detection(id={self.id}, plate='{self.plate_number}', confidence={self.confidence:.2f})>"
+
+
+@compiles(PrimaryKeyConstraint, "sqlite")
+def _sqlite_primary_key(constraint, compiler, **kw):
+    # SQLite only generates the ids of a single INTEGER PRIMARY KEY, so detections keep id alone as their key there
+    if constraint.table is Detection.__table__:
+        return "PRIMARY KEY (id)"
+    return compiler.visit_primary_key_constraint(constraint, **kw)
@@ -0,0 +1,205 @@
+"""
+Génération des alertes des détections.
+
+Chaque détection écrite par le `DetectionWriter` (une lecture `NumberPlate` de FastANPR) est évaluée par une liste de
+règles, qui peuvent chacune lever une `Alert`. Une même alerte n'est levée qu'une fois par fenêtre de temps pour un
+couple plaque, caméra : un véhicule volé arrêté deux minutes devant une caméra est lu des centaines de fois mais ne
+donne qu'une alerte. Les alertes d'un lot et le marquage `is_alert_triggered` de leurs détections sont écrits en
+une requête chacun, dans la transaction du lot.
+"""
+import heapq
+import time
+import itertools
+import threading
+from collections import Counter
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, insert, update
+from sqlalchemy.orm import Session
+
+from models import Alert, Detection
+from models.alert import AlertSeverity, AlertType
+from .detection_writer import FlushHook
+from .watchlist import Watchlist, canonical_plate, stolen_vehicle_alert
+
+# Evaluated on the `Detection` row of each plate read, returns the alert it raises if any
+AlertRule = Callable[[dict], Optional[Alert]]
+
+# Session.info key of the deduplication windows opened by a transaction, closed again if it rolls back
+_OPENED = "alert_engine_opened"
+
+
+def stolen_vehicle_rule(watchlist: Watchlist) -> AlertRule:
+    """Raises a `STOLEN_VEHICLE` alert for reads matching the watchlist."""
+
+    def evaluate(row: dict) -> Optional[Alert]:
+        match = watchlist.match(row.get("plate_number"))
+        return None if match is None else stolen_vehicle_alert(match, camera_id=row.get("camera_id"))
+
+    return evaluate
+
+
+def low_confidence_rule(min_confidence: float) -> AlertRule:
+    """Raises a `LOW_CONFIDENCE` alert for reads below `min_confidence`, e.g. a dirty lens or a badly aimed camera."""
+
+    def evaluate(row: dict) -> Optional[Alert]:
+        confidence = row.get("confidence")
+        if confidence is None or confidence >= min_confidence:
+            return None
+        return Alert(
+            type=AlertType.LOW_CONFIDENCE,
+            severity=AlertSeverity.LOW,
+            title=f"Lecture peu fiable : {row['plate_number']}",
+            message=f"La plaque « {row['plate_number']} » a été lue avec une confiance de {confidence:.2f}.",
+            details={"confidence": confidence, "read_text": row["plate_number"]},
+            camera_id=row.get("camera_id"),
+            vehicle_id=row.get("vehicle_id"),
+        )
+
+    return evaluate
+
+
+class AlertEngine:
+    """Evaluates alert rules on detections and suppresses duplicates.
+
+    An alert is keyed by its type, camera and plate, the canonical plate (see `canonical_plate`) of the watched
+    plate for watchlist alerts so that slightly different reads of the same car count as one. Once raised, the same
+    key is suppressed for `window` seconds, or the window of its type in `windows`. Open windows are kept in a dict
+    and expire through a heap of their deadlines, at most `max_windows` of them. Windows opened by a batch whose
+    transaction rolls back are closed again, and its alerts no longer count as emitted, so that retrying the batch
+    raises its alerts.
+    """
+
+    def __init__(
+            self,
+            rules: Sequence[AlertRule],
+            window: float = 300.0,
+            windows: Optional[Dict[AlertType, float]] = None,
+            max_windows: int = 100_000,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        self.rules = list(rules)
+        self.window = window
+        self.windows = dict(windows or {})
+        self.max_windows = max_windows
+        self.clock = clock
+        self.emitted: "Counter[str]" = Counter()
+        self.suppressed: "Counter[str]" = Counter()
+        self._deadlines: Dict[Hashable, float] = {}
+        # (deadline, sequence, key), the sequence keeping keys of equal deadlines from being compared
+        self._expiries: List[Tuple[float, int, Hashable]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def evaluate(self, rows: Sequence[dict], ids: Sequence[Optional[int]]) -> List[Alert]:
+        """Alerts raised by the detections `rows` of ids `ids`, duplicates excluded."""
+        return [alert for alert, _ in self._raise(rows, ids)]
+
+    def write(self, db: Session, alerts: List[Alert]):
+        """Inserts the alerts with one multi-row INSERT and flags their detections with one UPDATE."""
+        if not alerts:
+            return
+        db.execute(insert(Alert), [_alert_values(alert) for alert in alerts])
+        detection_ids = {alert.detection_id for alert in alerts if alert.detection_id is not None}
+        if detection_ids:
+            db.execute(
+                update(Detection).where(Detection.id.in_(detection_ids)).values(is_alert_triggered=True)
+            )
+
+    def hook(self) -> FlushHook:
+        """Flush hook of a `DetectionWriter` raising the alerts of each batch in its transaction."""
+
+        def raise_alerts(db: Session, rows: List[dict], ids: List[int]):
+            raised = self._raise(rows, ids)
+            if raised:
+                db.info.setdefault(_OPENED, []).append((self, [window for _, window in raised]))
+                self.write(db, [alert for alert, _ in raised])
+
+        return raise_alerts
+
+    def reset(self):
+        with self._lock:
+            self._deadlines.clear()
+            self._expiries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "emitted": sum(self.emitted.values()),
+            "suppressed": sum(self.suppressed.values()),
+            "open_windows": len(self._deadlines),
+            "emitted_by_type": dict(self.emitted),
+            "suppressed_by_type": dict(self.suppressed),
+        }
+
+    def _raise(
+            self, rows: Sequence[dict], ids: Sequence[Optional[int]]
+    ) -> List[Tuple[Alert, Tuple[Hashable, float]]]:
+        """Alerts raised by the detections with the deduplication windows they opened."""
+        candidates = []
+        for row, detection_id in zip(rows, ids):
+            for rule in self.rules:
+                alert = rule(row)
+                if alert is not None:
+                    alert.detection_id = detection_id
+                    candidates.append((self._key(alert, row), alert))
+        if not candidates:
+            return []
+
+        raised = []
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            for key, alert in candidates:
+                if self._deadlines.get(key, now) > now:
+                    self.suppressed[alert.type.value] += 1
+                    continue
+                deadline = now + self.windows.get(alert.type, self.window)
+                self._deadlines[key] = deadline
+                heapq.heappush(self._expiries, (deadline, next(self._sequence), key))
+                self.emitted[alert.type.value] += 1
+                raised.append((alert, (key, deadline)))
+            while len(self._deadlines) > self.max_windows:
+                deadline, _, key = heapq.heappop(self._expiries)
+                if self._deadlines.get(key) == deadline:
+                    del self._deadlines[key]
+        return raised
+
+    @staticmethod
+    def _key(alert: Alert, row: dict) -> Hashable:
+        plate_number = (alert.details or {}).get("watchlist_plate") or row.get("plate_number") or ""
+        return alert.type, alert.camera_id, canonical_plate(plate_number)
+
+    def _expire(self, now: float):
+        while self._expiries and self._expiries[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._expiries)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+
+    def _close(self, windows: List[Tuple[Hashable, float]]):
+        """Closes the windows of rolled back alerts, which were never stored."""
+        with self._lock:
+            for key, deadline in windows:
+                if self._deadlines.get(key) == deadline:
+                    del self._deadlines[key]
+                # Keys start with the alert type, see `_key`
+                alert_type = key[0].value
+                self.emitted[alert_type] -= 1
+                if self.emitted[alert_type] <= 0:
+                    del self.emitted[alert_type]
+
+
+def _alert_values(alert: Alert) -> dict:
+    """Column values of a transient alert, the unset ones being left to the column defaults."""
+    values = {column.key: getattr(alert, column.key) for column in Alert.__table__.columns}
+    return {key: value for key, value in values.items() if value is not None}
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_opened_windows(session: Session):
+    session.info.pop(_OPENED, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _close_rolled_back_windows(session: Session):
+    for engine, windows in session.info.pop(_OPENED, ()):
+        engine._close(windows)
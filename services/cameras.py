@@ -0,0 +1,74 @@
+"""
+Régions d'intérêt des caméras.
+
+La région d'intérêt d'une caméra (`camera_settings["roi"]`, voir `anpr.roi.RegionOfInterest`) limite la détection
+à la partie de ses images où des plaques peuvent apparaître. Les régions des caméras actives sont gardées en mémoire
+et rechargées périodiquement, pour être appliquées à chaque image sans interroger la base.
+"""
+import logging
+import threading
+from typing import Dict, Hashable, Optional
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from anpr.roi import RegionOfInterest
+from models import Camera
+
+logger = logging.getLogger(__name__)
+
+
+def camera_region(camera: Camera) -> Optional[RegionOfInterest]:
+    """Region of interest of a camera, None if it has none or if its settings are invalid."""
+    try:
+        return RegionOfInterest.from_settings(camera.camera_settings)
+    except (TypeError, ValueError) as e:
+        logger.warning("Région d'intérêt invalide pour la caméra %s, image entière utilisée : %s", camera.id, e)
+        return None
+
+
+class CameraRegions:
+    """Regions of interest of the active cameras, by camera id."""
+
+    def __init__(self):
+        self._regions: Dict[int, RegionOfInterest] = {}
+
+    def __len__(self) -> int:
+        return len(self._regions)
+
+    def get(self, camera_id: Optional[Hashable]) -> Optional[RegionOfInterest]:
+        """Region of interest of a camera, whose id may be given as a string as in API requests."""
+        if isinstance(camera_id, str):
+            camera_id = int(camera_id) if camera_id.isdigit() else None
+        return self._regions.get(camera_id)
+
+    def refresh(self, db: Session) -> int:
+        """Reloads the regions of the active cameras and returns how many cameras have one."""
+        regions = {}
+        for camera in db.query(Camera).filter(Camera.is_active.is_(True)):
+            region = camera_region(camera)
+            if region is not None:
+                regions[camera.id] = region
+        # Swapped at once, readers never see a partial reload
+        self._regions = regions
+        return len(regions)
+
+
+def start_refresh(regions: CameraRegions, session_factory: sessionmaker, interval: float = 60.0) -> threading.Event:
+    """Reloads the regions now and then every `interval` seconds in a daemon thread, until the returned event is
+    set."""
+    stop = threading.Event()
+
+    def refresh_loop():
+        while True:
+            db = session_factory()
+            try:
+                regions.refresh(db)
+            except Exception:
+                logger.exception("Échec du rechargement des régions d'intérêt des caméras")
+            finally:
+                db.close()
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=refresh_loop, name="camera-regions-refresh", daemon=True).start()
+    return stop
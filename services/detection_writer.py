@@ -0,0 +1,267 @@
+"""
+Écriture des détections en arrière-plan.
+
+Les lignes `Detection` produites par FastANPR sont placées dans une file bornée et insérées par lots par un thread
+dédié, dès qu'un lot est plein ou que l'intervalle de vidage est écoulé, si bien que la latence de la base ne s'ajoute
+jamais à celle de la reconnaissance. Un lot qui échoue est retenté, puis écrit sur disque (JSONL) et rejoué quand la
+base redevient disponible.
+"""
+import io
+import csv
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Sequence, Union
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import Detection
+from .vehicles import VehicleResolver
+
+logger = logging.getLogger(__name__)
+
+# Called with the session, the rows and their ids in the transaction of each flush, e.g. to raise alerts
+FlushHook = Callable[[Session, List[dict], List[int]], None]
+
+JSON_COLUMNS = ("bounding_box", "recognition_polygon", "detection_metadata")
+DATETIME_COLUMNS = ("detected_at", "created_at", "updated_at")
+
+
+class DetectionWriter:
+    """Persists `Detection` rows in batches from a background thread.
+
+    `submit` never blocks: rows that do not fit in the `max_queue` rows queue are spilled to disk. Batches are
+    inserted with a single multi-row INSERT ... RETURNING, or with PostgreSQL COPY when `use_copy` is set and no
+    hook needs the ids. With a `vehicle_resolver`, the rows are linked to the vehicles of their plates before being
+    inserted. A batch failing `max_retries` times is spilled to `spill_dir` and replayed once the database
+    accepts writes again.
+    """
+
+    def __init__(
+            self,
+            session_factory: sessionmaker,
+            batch_size: int = 500,
+            flush_interval: float = 1.0,
+            max_queue: int = 10_000,
+            max_retries: int = 3,
+            retry_backoff: float = 0.5,
+            spill_dir: Union[str, Path] = "spill",
+            use_copy: bool = False,
+            hooks: Sequence[FlushHook] = (),
+            vehicle_resolver: Optional[VehicleResolver] = None
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spill_dir = Path(spill_dir)
+        self.use_copy = use_copy
+        self.hooks = list(hooks)
+        self.vehicle_resolver = vehicle_resolver
+        self.written_rows = 0
+        self.failed_flushes = 0
+        self.spilled_rows = 0
+        self.replayed_rows = 0
+        self._flush_latencies = deque(maxlen=256)
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._next_replay = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        if self._thread is None:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="detection-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Writes the queued rows and stops the writer thread."""
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, rows: Iterable[dict]) -> int:
+        """Queues rows for the next batch and returns how many were queued, the others are spilled to disk."""
+        overflow = []
+        queued = 0
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+                queued += 1
+            except queue.Full:
+                overflow.append(row)
+        if overflow:
+            logger.warning("File d'écriture pleine, %s détections écrites sur disque", len(overflow))
+            self._spill(overflow)
+        return queued
+
+    def stats(self) -> dict:
+        latencies = list(self._flush_latencies)
+        stats = {
+            "queue_depth": self.queue_depth,
+            "written_rows": self.written_rows,
+            "failed_flushes": self.failed_flushes,
+            "spilled_rows": self.spilled_rows,
+            "replayed_rows": self.replayed_rows,
+            "flush_latency_ms_mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "flush_latency_ms_max": 1000 * max(latencies) if latencies else 0.0,
+        }
+        if self.vehicle_resolver is not None:
+            stats["vehicles"] = self.vehicle_resolver.stats()
+        return stats
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._collect()
+            flushed = self._flush(batch) if batch else not self._stopping.is_set()
+            if flushed and time.monotonic() >= self._next_replay and self._spill_files():
+                self._replay()
+
+    def _collect(self) -> List[dict]:
+        deadline = time.monotonic() + self.flush_interval
+        batch = []
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or (self._stopping.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _flush(self, rows: List[dict]) -> bool:
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            try:
+                self._write(rows)
+            except Exception as e:
+                # Any failure, including a bug in a hook, is retried then spilled so that the writer thread survives
+                self.failed_flushes += 1
+                logger.warning("Échec de l'écriture de %s détections (tentative %s) : %s", len(rows), attempt + 1, e,
+                               exc_info=not isinstance(e, (SQLAlchemyError, OSError)))
+                if isinstance(e, IntegrityError) and self.vehicle_resolver is not None:
+                    # e.g. a cached vehicle deleted by another process
+                    self.vehicle_resolver.clear()
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+                continue
+            self._flush_latencies.append(time.perf_counter() - start)
+            self.written_rows += len(rows)
+            return True
+        self._spill(rows)
+        return False
+
+    def _write(self, rows: List[dict]):
+        db = self.session_factory()
+        try:
+            if self.vehicle_resolver is not None:
+                rows = self.vehicle_resolver.assign(db, rows)
+            if self.use_copy and not self.hooks and db.get_bind().dialect.name == "postgresql":
+                _copy_rows(db, rows)
+            else:
+                ids = db.execute(
+                    insert(Detection).returning(Detection.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+                for hook in self.hooks:
+                    hook(db, rows, ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _spill(self, rows: List[dict]):
+        with self._spill_lock:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            path = self.spill_dir / f"detections-{time.time_ns()}.jsonl"
+            with open(path, "w", encoding="utf-8") as file:
+                for row in rows:
+                    file.write(json.dumps(row, default=_to_json) + "\n")
+            self.spilled_rows += len(rows)
+
+    def _spill_files(self) -> List[Path]:
+        return sorted(self.spill_dir.glob("detections-*.jsonl")) if self.spill_dir.is_dir() else []
+
+    def _replay(self):
+        """Writes the spilled rows back to the database, oldest file first, stopping at the first failure and keeping
+        the rows that were not written."""
+        for path in self._spill_files():
+            with self._spill_lock:
+                with open(path, encoding="utf-8") as file:
+                    rows = [_from_json(json.loads(line)) for line in file if line.strip()]
+            for start in range(0, len(rows), self.batch_size):
+                try:
+                    self._write(rows[start:start + self.batch_size])
+                except Exception as e:
+                    logger.warning("Échec du rejeu de %s : %s", path.name, e,
+                                   exc_info=not isinstance(e, (SQLAlchemyError, OSError)))
+                    with self._spill_lock:
+                        temporary = path.with_suffix(".tmp")
+                        with open(temporary, "w", encoding="utf-8") as file:
+                            for row in rows[start:]:
+                                file.write(json.dumps(row, default=_to_json) + "\n")
+                        temporary.replace(path)
+                    self._next_replay = time.monotonic() + self.retry_backoff * 2 ** self.max_retries
+                    return
+                self.replayed_rows += len(rows[start:start + self.batch_size])
+            path.unlink()
+            logger.info("%s détections rejouées depuis %s", len(rows), path.name)
+
+
+def _copy_rows(db: Session, rows: List[dict]):
+    """Streams the rows to PostgreSQL with COPY FROM STDIN in CSV format."""
+    columns = list(rows[0])
+    if "is_alert_triggered" not in columns:
+        columns.append("is_alert_triggered")
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(column, row.get(column, False if column == "is_alert_triggered" else None))
+                         for column in columns])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {Detection.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _copy_value(column: str, value):
+    if value is None:
+        return None
+    if column in JSON_COLUMNS:
+        return json.dumps(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _from_json(row: dict) -> dict:
+    for column in DATETIME_COLUMNS:
+        if isinstance(row.get(column), str):
+            row[column] = datetime.fromisoformat(row[column])
+    return row
@@ -0,0 +1,58 @@
+import numpy as np
+from datetime import datetime
+from typing import List, Optional
+
+from .image_store import ImageStore
+
+
+def detection_row(
+        number_plate,
+        camera_id: Optional[int],
+        detected_at: datetime,
+        image_path: Optional[str] = None,
+        frame_path: Optional[str] = None
+) -> Optional[dict]:
+    """Maps a number plate read by FastANPR to the column values of a `Detection` row, or None if no text was read.
+    `image_path` and `frame_path` are the image store paths of the plate crop and of the full frame."""
+    if not number_plate.rec_text:
+        return None
+    x_min, y_min, x_max, y_max = number_plate.det_box
+    return {
+        "plate_number": number_plate.rec_text,
+        "ocr_text": number_plate.rec_text,
+        "confidence": number_plate.det_conf * number_plate.rec_conf,
+        "detection_confidence": number_plate.det_conf,
+        "recognition_confidence": number_plate.rec_conf,
+        "bounding_box": {"x": x_min, "y": y_min, "width": x_max - x_min, "height": y_max - y_min},
+        "recognition_polygon": number_plate.rec_poly,
+        "processing_time": number_plate.processing_time,
+        "image_path": image_path,
+        "detection_metadata": {"frame_path": frame_path} if frame_path else None,
+        "camera_id": camera_id,
+        "detected_at": detected_at,
+    }
+
+
+def detection_rows(
+        image: np.ndarray,
+        number_plates: list,
+        camera_id: Optional[int],
+        detected_at: datetime,
+        image_store: Optional[ImageStore] = None,
+        save_frame: bool = False
+) -> List[dict]:
+    """Maps the number plates read on a frame to `Detection` rows, saving their crops, and the frame if
+    `save_frame` is set, to the image store."""
+    number_plates = [number_plate for number_plate in number_plates if number_plate.rec_text]
+    if not number_plates:
+        return []
+    image_paths = [None] * len(number_plates)
+    frame_path = None
+    if image_store is not None:
+        image_paths = image_store.save_crops(image, [number_plate.det_box for number_plate in number_plates])
+        frame_path = image_store.save(image) if save_frame else None
+    return [
+        detection_row(number_plate, camera_id, detected_at, image_path, frame_path)
+        for number_plate, image_path in zip(number_plates, image_paths)
+    ]
+
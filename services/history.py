@@ -0,0 +1,134 @@
+"""
+Consultation de l'historique des détections.
+
+Les résultats sont paginés par clé (`detected_at`, `id`) et non par OFFSET : chaque page reprend après la dernière
+ligne de la précédente grâce à un curseur opaque, si bien que son coût ne dépend pas de sa profondeur. Seules les
+colonnes utiles sont lues (jamais `image_data`) et les caméras et véhicules des lignes d'une page sont chargés en une
+requête chacun.
+"""
+import json
+import base64
+import binascii
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session, load_only, selectinload
+
+from models import Camera, Detection, Vehicle
+
+MAX_PAGE_SIZE = 500
+
+DETECTION_COLUMNS = (
+    Detection.id, Detection.plate_number, Detection.confidence, Detection.detection_confidence,
+    Detection.recognition_confidence, Detection.bounding_box, Detection.image_path, Detection.is_alert_triggered,
+    Detection.camera_id, Detection.vehicle_id, Detection.detected_at,
+)
+
+
+@dataclass
+class DetectionFilters:
+    plate_number: Optional[str] = None
+    camera_id: Optional[int] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+
+def normalize_plate(plate_number: str) -> str:
+    """Plates are stored as read by FastANPR: upper case without separators."""
+    return "".join(character for character in plate_number.upper() if character.isalnum())
+
+
+def encode_cursor(detected_at: datetime, detection_id: int) -> str:
+    payload = json.dumps([detected_at.isoformat(), detection_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Position of a page after which the next page starts, raising ValueError for a malformed cursor."""
+    try:
+        detected_at, detection_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(detected_at), int(detection_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}.") from e
+
+
+def detections_query(filters: DetectionFilters, after: Optional[Tuple[datetime, int]] = None):
+    """Newest first detections matching the filters, after the `after` position if given."""
+    query = (
+        select(Detection)
+        .options(
+            load_only(*DETECTION_COLUMNS),
+            selectinload(Detection.camera).load_only(Camera.id, Camera.name, Camera.location_name),
+            selectinload(Detection.vehicle).load_only(
+                Vehicle.id, Vehicle.plate_number, Vehicle.brand, Vehicle.model, Vehicle.color, Vehicle.is_stolen
+            ),
+        )
+        .order_by(Detection.detected_at.desc(), Detection.id.desc())
+    )
+    if filters.plate_number:
+        query = query.where(Detection.plate_number == normalize_plate(filters.plate_number))
+    if filters.camera_id is not None:
+        query = query.where(Detection.camera_id == filters.camera_id)
+    if filters.since is not None:
+        query = query.where(Detection.detected_at >= filters.since)
+    if filters.until is not None:
+        query = query.where(Detection.detected_at < filters.until)
+    if after is not None:
+        detected_at, detection_id = after
+        # Written so that the first term is a range condition of the (…, detected_at) indexes
+        query = query.where(
+            Detection.detected_at <= detected_at,
+            or_(Detection.detected_at < detected_at, and_(Detection.detected_at == detected_at,
+                                                          Detection.id < detection_id))
+        )
+    return query
+
+
+def search_detections(
+        db: Session, filters: DetectionFilters, cursor: Optional[str] = None, limit: int = 50
+) -> Tuple[List[Detection], Optional[str]]:
+    """Returns a page of detections and the cursor of the next page, None on the last page."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    detections = db.execute(detections_query(filters, after).limit(limit + 1)).scalars().all()
+    if len(detections) <= limit:
+        return list(detections), None
+    detections = detections[:limit]
+    return list(detections), encode_cursor(detections[-1].detected_at, detections[-1].id)
+
+
+def iter_detections(db: Session, filters: DetectionFilters, batch_size: int = 1000) -> Iterator[Detection]:
+    """Every detection matching the filters, read page by page so that exports stay in constant memory."""
+    after = None
+    while True:
+        detections = db.execute(detections_query(filters, after).limit(batch_size)).scalars().all()
+        yield from detections
+        if len(detections) < batch_size:
+            return
+        after = (detections[-1].detected_at, detections[-1].id)
+        # Drop the page from the identity map before reading the next one
+        db.expunge_all()
+
+
+def detection_to_dict(detection: Detection) -> dict:
+    camera, vehicle = detection.camera, detection.vehicle
+    return {
+        "id": detection.id,
+        "plate_number": detection.plate_number,
+        "confidence": detection.confidence,
+        "detection_confidence": detection.detection_confidence,
+        "recognition_confidence": detection.recognition_confidence,
+        "bounding_box": detection.bounding_box,
+        "image_url": f"/images/{detection.image_path}" if detection.image_path else None,
+        "is_alert_triggered": detection.is_alert_triggered,
+        "detected_at": detection.detected_at.isoformat(),
+        "camera": None if camera is None else {
+            "id": camera.id, "name": camera.name, "location_name": camera.location_name
+        },
+        "vehicle": None if vehicle is None else {
+            "id": vehicle.id, "plate_number": vehicle.plate_number, "brand": vehicle.brand, "model": vehicle.model,
+            "color": vehicle.color, "is_stolen": vehicle.is_stolen
+        },
+    }
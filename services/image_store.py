@@ -0,0 +1,103 @@
+"""
+Stockage des images des détections.
+
+Les recadrages des plaques, et si besoin les images complètes, sont compressés (WebP ou JPEG) et écrits sur disque
+sous un nom dérivé de leur contenu, dans des sous-dossiers à deux niveaux (`ab/cd/abcd….webp`). La base ne garde que
+le chemin relatif (`Detection.image_path`) ; une image identique n'est écrite qu'une fois.
+"""
+import os
+import cv2
+import hashlib
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+FORMATS = {"webp": cv2.IMWRITE_WEBP_QUALITY, "jpeg": cv2.IMWRITE_JPEG_QUALITY}
+EXTENSIONS = {"webp": ".webp", "jpeg": ".jpg"}
+MEDIA_TYPES = {".webp": "image/webp", ".jpg": "image/jpeg", ".png": "image/png"}
+
+
+def image_format(data: bytes) -> Optional[str]:
+    """Extension of encoded image bytes from their magic number, None if not a JPEG, PNG or WebP image."""
+    if data[:3] == b"\xff\xd8\xff":
+        return ".jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return ".png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp"
+    return None
+
+
+class ImageStore:
+    """Content-addressed image files under `root`.
+
+    An image is named after the BLAKE2b digest of its encoded bytes, which also serves as its HTTP ETag, and written
+    to a temporary file renamed into place, so readers never see a partial file and concurrent writers of the same
+    image simply replace it with identical content.
+    """
+
+    def __init__(self, root: Union[str, Path], format: str = "webp", quality: int = 80):
+        if format not in FORMATS:
+            raise ValueError(f"Expected format in {list(FORMATS)}, but {format} received.")
+        self.root = Path(root)
+        self.format = format
+        self.quality = quality
+
+    def encode(self, image: np.ndarray) -> Tuple[bytes, str]:
+        """Compresses an RGB (or RGBA, or grey) image, returns its bytes and extension."""
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGBA2BGR if image.shape[2] == 4 else cv2.COLOR_RGB2BGR)
+        success, encoded = cv2.imencode(EXTENSIONS[self.format], image, [FORMATS[self.format], self.quality])
+        if not success:
+            raise ValueError(f"Could not encode a {image.shape} image as {self.format}.")
+        return encoded.tobytes(), EXTENSIONS[self.format]
+
+    def save(self, image: np.ndarray) -> str:
+        """Stores an RGB image and returns its path relative to the store root."""
+        return self.save_bytes(*self.encode(image))
+
+    def save_crops(self, image: np.ndarray, boxes: List[List[int]]) -> List[Optional[str]]:
+        """Stores the crops of `boxes` ([x_min, y_min, x_max, y_max]) of an RGB image, None for empty crops."""
+        crops = [image[max(y_min, 0):y_max, max(x_min, 0):x_max] for x_min, y_min, x_max, y_max in boxes]
+        return [self.save(crop) if crop.size else None for crop in crops]
+
+    def save_bytes(self, data: bytes, extension: str) -> str:
+        """Stores already encoded image bytes, skipping the write if the same image is already stored."""
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+        relative_path = f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+        path = self.root / relative_path
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(descriptor, "wb") as file:
+                    file.write(data)
+                os.replace(temporary, path)
+            except BaseException:
+                if os.path.exists(temporary):
+                    os.unlink(temporary)
+                raise
+        return relative_path
+
+    def path(self, relative_path: str) -> Path:
+        """Absolute path of a stored image, refusing paths that are not image names of the store."""
+        parts = relative_path.split("/")
+        name = parts[-1]
+        digest, extension = os.path.splitext(name)
+        if (len(parts) != 3 or extension not in MEDIA_TYPES or not all(c in "0123456789abcdef" for c in digest)
+                or parts[0] != digest[:2] or parts[1] != digest[2:4]):
+            raise ValueError(f"{relative_path} is not an image of the store.")
+        return self.root / relative_path
+
+    def read(self, relative_path: str) -> bytes:
+        return self.path(relative_path).read_bytes()
+
+
+def create_image_store() -> ImageStore:
+    """Image store configured by the IMAGE_STORE_* environment variables."""
+    return ImageStore(
+        os.getenv("IMAGE_STORE_DIR", "media"),
+        format=os.getenv("IMAGE_STORE_FORMAT", "webp"),
+        quality=int(os.getenv("IMAGE_STORE_QUALITY", "80"))
+    )
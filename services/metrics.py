@@ -0,0 +1,59 @@
+"""
+Métriques Prometheus du serveur ANPR.
+
+Les durées des étapes de la reconnaissance (décodage, attente dans la file du `BatchScheduler`, détection, OCR,
+assemblage des résultats, sérialisation) sont des histogrammes d'une même métrique, étiquetés par étape ; la taille
+des lots et le nombre de plaques par image ont leur propre histogramme. Une observation coûte quelques microsecondes.
+Les métriques sont exposées par `GET /metrics`.
+"""
+from typing import List, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+
+from anpr.timing import StageTimings
+
+STAGE_SECONDS = Histogram(
+    "anpr_stage_duration_seconds",
+    "Durée des étapes de la reconnaissance : decode, queue_wait et serialize par image, detect, ocr et merge par lot",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+BATCH_SIZE = Histogram(
+    "anpr_batch_size", "Nombre d'images des lots envoyés à l'inférence", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+PLATES_PER_FRAME = Histogram(
+    "anpr_plates_per_frame", "Nombre de plaques détectées par image", buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16)
+)
+
+# Children of the stage histogram, labelled once
+_DETECT = STAGE_SECONDS.labels("detect")
+_OCR = STAGE_SECONDS.labels("ocr")
+_MERGE = STAGE_SECONDS.labels("merge")
+_QUEUE_WAIT = STAGE_SECONDS.labels("queue_wait")
+
+
+def stage_timer(stage: str):
+    """Context manager timing a stage, e.g. `with stage_timer("decode"): ...`."""
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def observe_timings(timings: StageTimings):
+    """Timing hook of FastANPR (see `anpr.timing.TimingHook`)."""
+    _DETECT.observe(timings.detect)
+    if timings.crops:
+        _OCR.observe(timings.ocr)
+    _MERGE.observe(timings.merge)
+    for plates in timings.plates:
+        PLATES_PER_FRAME.observe(plates)
+
+
+def observe_batch(queue_waits: List[float]):
+    """`on_batch` callback of a `BatchScheduler`."""
+    BATCH_SIZE.observe(len(queue_waits))
+    for queue_wait in queue_waits:
+        _QUEUE_WAIT.observe(queue_wait)
+
+
+def render() -> Tuple[bytes, str]:
+    """The metrics of the process in the Prometheus text format, and its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
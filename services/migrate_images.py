@@ -0,0 +1,122 @@
+"""
+Migration des images base64 de `detections.image_data` vers le stockage d'images.
+
+Les détections sont traitées par lots dans l'ordre de leur identifiant, une transaction par lot : chaque image est
+décodée, écrite dans le stockage (les JPEG et WebP tels quels, les autres formats recompressés), puis la ligne reçoit
+son `image_path` et son `image_data` est vidé. Le script peut être interrompu et relancé, il reprend les lignes qui
+ont encore un `image_data`. Lancer ensuite un `VACUUM` pour rendre l'espace libéré.
+
+Usage:
+    python -m services.migrate_images [--chunk-size 500] [--limit N]
+"""
+import base64
+import binascii
+import logging
+import cv2
+import numpy as np
+from typing import Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import Detection
+from .image_store import ImageStore, create_image_store, image_format
+
+logger = logging.getLogger(__name__)
+
+
+def decode_image_data(image_data: str) -> Optional[bytes]:
+    """Decodes a base64 image, with or without a data URI prefix, None if it is not valid base64."""
+    if image_data.startswith("data:"):
+        image_data = image_data.split(",", 1)[-1]
+    try:
+        return base64.b64decode(image_data, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def store_image_data(image_store: ImageStore, image_data: str) -> Optional[str]:
+    """Stores a base64 image and returns its image store path, None if it cannot be decoded."""
+    data = decode_image_data(image_data)
+    if not data:
+        return None
+    extension = image_format(data)
+    if extension in (".jpg", ".webp"):
+        return image_store.save_bytes(data, extension)
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return None
+    return image_store.save(cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image))
+
+
+def migrate_chunk(db: Session, image_store: ImageStore, after_id: int, chunk_size: int) -> Tuple[int, int, int]:
+    """Migrates the next `chunk_size` detections with an `image_data` after `after_id`. Returns the last id read,
+    the number of images moved and the number of undecodable images left in place."""
+    rows = db.execute(
+        select(Detection.id, Detection.detected_at, Detection.image_data)
+        .where(Detection.image_data.is_not(None), Detection.id > after_id)
+        .order_by(Detection.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return after_id, 0, 0
+
+    updates, failed = [], 0
+    for detection_id, detected_at, image_data in rows:
+        image_path = store_image_data(image_store, image_data)
+        if image_path is None:
+            failed += 1
+            logger.warning("Image de la détection %s illisible, laissée en base", detection_id)
+            continue
+        updates.append({"b_id": detection_id, "b_detected_at": detected_at, "b_image_path": image_path})
+    if updates:
+        # detected_at lets PostgreSQL update the row in its partition only
+        table = Detection.__table__
+        db.execute(
+            update(table)
+            .where(table.c.id == bindparam("b_id"), table.c.detected_at == bindparam("b_detected_at"))
+            .values(image_path=bindparam("b_image_path"), image_data=None),
+            updates
+        )
+    db.commit()
+    return rows[-1][0], len(updates), failed
+
+
+def migrate_images(
+        session_factory: sessionmaker, image_store: ImageStore, chunk_size: int = 500, limit: Optional[int] = None
+) -> Tuple[int, int]:
+    """Moves the `image_data` of every detection to the image store, returns the number of images moved and of
+    undecodable images."""
+    moved = failed = 0
+    last_id = 0
+    while limit is None or moved + failed < limit:
+        db = session_factory()
+        try:
+            size = chunk_size if limit is None else min(chunk_size, limit - moved - failed)
+            last_id, chunk_moved, chunk_failed = migrate_chunk(db, image_store, last_id, size)
+        finally:
+            db.close()
+        if not chunk_moved and not chunk_failed:
+            break
+        moved += chunk_moved
+        failed += chunk_failed
+        logger.info("%s images migrées (jusqu'à la détection %s)", moved, last_id)
+    return moved, failed
+
+
+def main():
+    import argparse
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Migration des images base64 vers le stockage d'images")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Nombre de détections par transaction")
+    parser.add_argument("--limit", type=int, default=None, help="Nombre maximal de détections à migrer")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    moved, failed = migrate_images(SessionLocal, create_image_store(), args.chunk_size, args.limit)
+    print(f"{moved} images migrées, {failed} illisibles laissées en base")
+
+
+if __name__ == "__main__":
+    main()
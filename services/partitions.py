@@ -0,0 +1,52 @@
+"""
+Partitions mensuelles de la table `detections` (PostgreSQL).
+
+La migration 3f1c9a7d2b64 partitionne `detections` par mois sur `detected_at` et crée les fonctions
+`create_detections_partition` et `create_detections_partitions`. Ce module crée à l'avance les partitions des mois à
+venir, à lancer chaque jour (cron, systemd timer) ou au démarrage des services ; les lignes d'un mois sans partition
+tombent dans `detections_default` et sont déplacées à la création de sa partition.
+
+Usage:
+    python -m services.partitions                 # mois courant et 3 mois suivants
+    python -m services.partitions --months 6
+"""
+from typing import List, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+
+def ensure_detection_partitions(bind: Union[Engine, Connection, Session], months_ahead: int = 3) -> List[str]:
+    """Creates the missing partitions of the current month and of the `months_ahead` following months, returns the
+    names of the partitions of those months."""
+    query = text("SELECT create_detections_partitions(:months_ahead)")
+    if isinstance(bind, Engine):
+        with bind.begin() as connection:
+            return list(connection.execute(query, {"months_ahead": months_ahead}).scalars())
+    return list(bind.execute(query, {"months_ahead": months_ahead}).scalars())
+
+
+def detection_partitions(bind: Union[Engine, Connection, Session]) -> List[str]:
+    """Names of the partitions of `detections`, the default one included."""
+    query = text(
+        "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'detections'::regclass ORDER BY 1"
+    )
+    if isinstance(bind, Engine):
+        with bind.connect() as connection:
+            return list(connection.execute(query).scalars())
+    return list(bind.execute(query).scalars())
+
+
+def main():
+    import argparse
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Création des partitions mensuelles des détections")
+    parser.add_argument("--months", type=int, default=3, help="Nombre de mois créés à l'avance")
+    args = parser.parse_args()
+    print("\n".join(ensure_detection_partitions(engine, args.months)))
+
+
+if __name__ == "__main__":
+    main()
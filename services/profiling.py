@@ -0,0 +1,193 @@
+"""
+Profilage à la demande des requêtes de reconnaissance.
+
+Une requête est profilée quand elle porte l'en-tête `X-ANPR-Profile: 1` ou le paramètre `?profile=1` (profilage à
+la demande), ou quand elle est tirée au sort selon `sample_rate`. Son décodage et sa sérialisation sont profilés par
+cProfile dans la boucle d'événements, et l'inférence (`Detector.run` et `Recogniser.run`) là où elle s'exécute :
+thread d'inférence, processus de travail ou `WorkerPool`. Une requête profilée contourne le cache des résultats et
+le `BatchScheduler`, pour que son profil ne mesure que son propre chemin.
+
+Les profils sont des fichiers `.prof` (format de `pstats`, lisibles par `python -m pstats` ou snakeviz) conservés
+dans un tampon circulaire sur disque : au-delà de `max_profiles`, les plus anciens sont supprimés. Une seule requête
+est profilée à la fois, les autres sont servies normalement entre-temps. Sans profilage, une requête ne paie qu'un
+test `is None`.
+"""
+import io
+import os
+import json
+import time
+import uuid
+import random
+import marshal
+import pstats
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Union
+
+from anpr.profiling import ProfileStats, merge_stats, profile_call
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "x-anpr-profile"
+PROFILE_PARAM = "profile"
+# Response header giving the id of the saved profile
+PROFILE_ID_HEADER = "X-Profile-Id"
+ENABLED_VALUES = ("1", "true", "yes")
+SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls")
+
+
+class ProfileStore:
+    """Ring buffer of profiles in `directory`: `<id>.prof` (raw statistics, `marshal`) and `<id>.json` (description of
+    the request). Ids start with their date, so their order is their creation order."""
+
+    def __init__(self, directory: Union[str, Path], max_profiles: int = 50):
+        if max_profiles < 1:
+            raise ValueError(f"Expected max_profiles of at least 1, but {max_profiles} received.")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+
+    def save(self, stats: ProfileStats, info: dict) -> str:
+        """Saves a profile, dropping the oldest ones beyond `max_profiles`, and returns its id."""
+        created_at = datetime.now(timezone.utc)
+        profile_id = f"{created_at:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+        # Written under temporary names first, a listing never sees half written profiles
+        for suffix, content in (
+                (".prof", marshal.dumps(stats)),
+                (".json", json.dumps({"id": profile_id, "created_at": created_at.isoformat(), **info}).encode())
+        ):
+            temporary = self.directory / f".{profile_id}{suffix}"
+            temporary.write_bytes(content)
+            os.replace(temporary, self.directory / f"{profile_id}{suffix}")
+        with self._lock:
+            for old_id in self.ids()[:-self.max_profiles]:
+                for suffix in (".prof", ".json"):
+                    (self.directory / f"{old_id}{suffix}").unlink(missing_ok=True)
+        return profile_id
+
+    def ids(self) -> List[str]:
+        """Ids of the stored profiles, oldest first."""
+        return sorted(path.stem for path in self.directory.glob("*.prof") if not path.name.startswith("."))
+
+    def list(self) -> List[dict]:
+        """Descriptions of the stored profiles, newest first."""
+        profiles = []
+        for profile_id in reversed(self.ids()):
+            try:
+                profiles.append(json.loads((self.directory / f"{profile_id}.json").read_text()))
+            except (OSError, ValueError):
+                # Dropped by a concurrent save
+                continue
+        return profiles
+
+    def path(self, profile_id: str) -> Path:
+        """Path of the .prof file of a profile, refusing ids that are not ids of the store."""
+        if profile_id not in self.ids():
+            raise ValueError(f"{profile_id} is not a profile of the store.")
+        return self.directory / f"{profile_id}.prof"
+
+    def report(self, profile_id: str, sort: str = "cumulative", limit: int = 50) -> str:
+        """The `limit` heaviest functions of a profile as text, as printed by `pstats`."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Expected sort to be one of {SORT_KEYS}, but {sort} received.")
+        stream = io.StringIO()
+        pstats.Stats(str(self.path(profile_id)), stream=stream).sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+class RequestProfile:
+    """Statistics accumulated along a profiled request."""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.started_at = time.perf_counter()
+        self.stats: List[ProfileStats] = []
+
+    def call(self, func: Callable, *args):
+        """Calls `func` under cProfile in the calling thread."""
+        result, stats = profile_call(func, *args)
+        self.stats.append(stats)
+        return result
+
+    async def run(self, fast_anpr, images) -> list:
+        """Runs ANPR on images outside of any batch, profiling inference where it runs."""
+        results, stats = await fast_anpr.run_profiled(images)
+        self.stats.append(stats)
+        return results
+
+
+class RequestProfiler:
+    """Decides which requests are profiled and saves their profiles to a `ProfileStore`."""
+
+    def __init__(
+            self,
+            store: ProfileStore,
+            on_demand: bool = True,
+            sample_rate: float = 0.0,
+            rng: Callable[[], float] = random.random
+    ):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError(f"Expected a sample rate between 0 and 1, but {sample_rate} received.")
+        self.store = store
+        self.on_demand = on_demand
+        self.sample_rate = sample_rate
+        self.rng = rng
+        self._busy = threading.Lock()
+        self.profiled = 0
+        self.skipped = 0
+
+    def start(self, request) -> Optional[RequestProfile]:
+        """Profile of a request (anything with `headers` and `query_params`, e.g. a starlette request) if it must be
+        profiled, None otherwise or while another request is being profiled."""
+        if self.on_demand and (
+                request.headers.get(PROFILE_HEADER, "").lower() in ENABLED_VALUES
+                or request.query_params.get(PROFILE_PARAM, "").lower() in ENABLED_VALUES
+        ):
+            reason = "requested"
+        elif self.sample_rate and self.rng() < self.sample_rate:
+            reason = "sampled"
+        else:
+            return None
+        # cProfile cannot profile overlapping calls on the same thread, e.g. the event loop
+        if not self._busy.acquire(blocking=False):
+            self.skipped += 1
+            return None
+        return RequestProfile(reason)
+
+    def finish(self, profile: RequestProfile, **info) -> Optional[str]:
+        """Saves the profile of a request with a description of the request and returns its id."""
+        try:
+            duration = time.perf_counter() - profile.started_at
+            profile_id = self.store.save(
+                merge_stats(profile.stats), {"reason": profile.reason, "duration_ms": 1000 * duration, **info}
+            )
+        except OSError:
+            logger.exception("Impossible d'enregistrer le profil de la requête")
+            return None
+        finally:
+            self._busy.release()
+        self.profiled += 1
+        return profile_id
+
+    def stats(self) -> dict:
+        return {
+            "on_demand": self.on_demand,
+            "sample_rate": self.sample_rate,
+            "profiled": self.profiled,
+            "skipped_busy": self.skipped,
+            "stored": len(self.store.ids()),
+            "max_profiles": self.store.max_profiles,
+        }
+
+
+def create_profiler() -> Optional[RequestProfiler]:
+    """Profiler configured by the ANPR_PROFILE* environment variables, None when profiling is disabled."""
+    on_demand = os.getenv("ANPR_PROFILING", "false").lower() == "true"
+    sample_rate = float(os.getenv("ANPR_PROFILE_SAMPLE_RATE", "0"))
+    if not on_demand and not sample_rate:
+        return None
+    store = ProfileStore(os.getenv("ANPR_PROFILE_DIR", "profiles"), int(os.getenv("ANPR_PROFILE_MAX", "50")))
+    return RequestProfiler(store, on_demand=on_demand, sample_rate=sample_rate)
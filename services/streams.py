@@ -0,0 +1,389 @@
+"""
+Ingestion des flux vidéo des caméras.
+
+Un décodeur léger par caméra active (RTSP, HTTP ou fichier vidéo local) échantillonne les images à une cadence
+configurable dans une file bornée, consommée par lots par FastANPR. Les résultats sont renvoyés à un `sink` avec
+l'identifiant de la caméra.
+
+Usage:
+    python -m services.streams                             # caméras actives de la base
+    python -m services.streams --source 1=parking.mp4      # fichier vidéo local pour la caméra 1
+"""
+import time
+import queue
+import logging
+import threading
+import cv2
+import numpy as np
+from pathlib import Path
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from anpr.motion import MotionGate
+from anpr.roi import RegionOfInterest
+from models import Camera
+from .cameras import camera_region
+from .detections import detection_rows
+from .image_store import ImageStore, create_image_store
+from .alerts import AlertEngine, stolen_vehicle_rule
+from .detection_writer import DetectionWriter
+from .vehicles import VehicleResolver
+from .watchlist import Watchlist, start_refresh
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Frame:
+    camera_id: int
+    captured_at: datetime
+    image: np.ndarray
+
+
+FrameSink = Callable[[List[Frame], list], None]
+
+
+def parse_resolution(resolution: Union[str, List[int], None]) -> Optional[Tuple[int, int]]:
+    """Parses a camera resolution given as "1280x720" or [1280, 720] into a (width, height) tuple."""
+    if not resolution:
+        return None
+    if isinstance(resolution, str):
+        width, height = resolution.lower().split("x")
+        return int(width), int(height)
+    return int(resolution[0]), int(resolution[1])
+
+
+class FrameSource(threading.Thread):
+    """Decodes a stream or a local video file and samples its frames at `sample_fps` into a bounded queue.
+
+    Frames that are not sampled are only grabbed, not decoded. Live streams drop the oldest queued frame when the
+    queue is full so inference always sees recent frames, while video files block until there is room so that no
+    sampled frame is lost offline.
+    """
+
+    def __init__(
+            self,
+            camera_id: int,
+            url: str,
+            frames: "queue.Queue[Frame]",
+            sample_fps: float = 2.0,
+            resolution: Optional[Tuple[int, int]] = None,
+            reconnect_delay: float = 5.0
+    ):
+        super().__init__(name=f"camera-{camera_id}", daemon=True)
+        self.camera_id = camera_id
+        self.url = url
+        self.frames = frames
+        self.sample_fps = sample_fps
+        self.resolution = resolution
+        self.reconnect_delay = reconnect_delay
+        self.is_file = Path(url).is_file()
+        self.frames_sampled = 0
+        self.frames_dropped = 0
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        while not self._stopped.is_set():
+            capture = cv2.VideoCapture(self.url)
+            if not capture.isOpened():
+                logger.warning("Camera %s: cannot open %s, retrying in %ss", self.camera_id, self.url,
+                               self.reconnect_delay)
+                self._stopped.wait(self.reconnect_delay)
+                continue
+            try:
+                self._read(capture)
+            finally:
+                capture.release()
+            if self.is_file:
+                break
+            self._stopped.wait(self.reconnect_delay)
+
+    def _read(self, capture: cv2.VideoCapture):
+        interval = 1.0 / self.sample_fps
+        source_fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        started_at = datetime.now(timezone.utc)
+        next_sample = 0.0
+        frame_index = 0
+        while not self._stopped.is_set():
+            if not capture.grab():
+                if not self.is_file:
+                    logger.warning("Camera %s: stream interrupted", self.camera_id)
+                return
+
+            # Video files are sampled on their own timeline, live streams on the wall clock
+            timestamp = frame_index / source_fps if self.is_file else time.monotonic()
+            frame_index += 1
+            if timestamp < next_sample:
+                continue
+            next_sample = next_sample + interval if next_sample + interval > timestamp else timestamp + interval
+
+            ok, image = capture.retrieve()
+            if not ok:
+                continue
+            if self.resolution and (image.shape[1], image.shape[0]) != self.resolution:
+                image = cv2.resize(image, self.resolution, interpolation=cv2.INTER_AREA)
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+            captured_at = started_at + timedelta(seconds=timestamp) if self.is_file else datetime.now(timezone.utc)
+            self._put(Frame(camera_id=self.camera_id, captured_at=captured_at, image=image))
+
+    def _put(self, frame: Frame):
+        self.frames_sampled += 1
+        if self.is_file:
+            while not self._stopped.is_set():
+                try:
+                    self.frames.put(frame, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+            return
+        while True:
+            try:
+                self.frames.put_nowait(frame)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+
+class StreamIngestor:
+    """Runs one `FrameSource` per camera and feeds their frames to `FastANPR` in batches of up to `batch_size`
+    frames, passing each batch and its number plates to `sink`. Only the region of interest of cameras that have one
+    goes through detection, their number plates are in frame coordinates all the same. With a `motion_gate`, frames
+    where nothing moved in that region are dropped before inference and never reach the sink."""
+
+    def __init__(
+            self,
+            fast_anpr,
+            sink: FrameSink,
+            queue_size: int = 64,
+            batch_size: int = 8,
+            max_wait: float = 0.05,
+            sample_fps: float = 2.0,
+            motion_gate: Optional[MotionGate] = None
+    ):
+        self.fast_anpr = fast_anpr
+        self.motion_gate = motion_gate
+        self.sink = sink
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.sample_fps = sample_fps
+        self.frames: "queue.Queue[Frame]" = queue.Queue(maxsize=queue_size)
+        self.sources: Dict[int, FrameSource] = {}
+        self.regions: Dict[int, RegionOfInterest] = {}
+        self._stopped = threading.Event()
+
+    def add_source(
+            self,
+            camera_id: int,
+            url: str,
+            sample_fps: Optional[float] = None,
+            resolution: Optional[Tuple[int, int]] = None,
+            region: Optional[RegionOfInterest] = None
+    ) -> FrameSource:
+        source = FrameSource(camera_id, url, self.frames, sample_fps or self.sample_fps, resolution)
+        self.sources[camera_id] = source
+        if region is not None:
+            self.regions[camera_id] = region
+        return source
+
+    def add_cameras(self, db) -> int:
+        """Adds a source for every active camera with a stream URL, using the `sample_fps`, `resolution` and `roi` of
+        its `camera_settings`. Returns the number of cameras added."""
+        cameras = db.query(Camera).filter(Camera.is_active.is_(True)).all()
+        added = 0
+        for camera in cameras:
+            url = camera.rtsp_url or camera.stream_url
+            if not url:
+                continue
+            settings = camera.camera_settings or {}
+            self.add_source(
+                camera.id, url, sample_fps=settings.get("sample_fps"),
+                resolution=parse_resolution(settings.get("resolution")), region=camera_region(camera)
+            )
+            added += 1
+        return added
+
+    def run(self):
+        """Starts the sources and runs batched inference in the calling thread until stopped, or until every video
+        file source has been fully read."""
+        for source in self.sources.values():
+            source.start()
+        while not self._stopped.is_set():
+            batch = self._next_batch()
+            if batch:
+                frames, results = self._recognise(batch)
+                if not frames:
+                    continue
+                try:
+                    self.sink(frames, results)
+                except Exception:
+                    logger.exception("Failed to handle the results of %s frames", len(frames))
+            elif not any(source.is_alive() for source in self.sources.values()):
+                break
+
+    def _recognise(self, batch: List[Frame]) -> Tuple[List[Frame], list]:
+        """Runs inference on the frames of a batch the motion gate lets through, and returns them with their number
+        plates."""
+        frames, crops = [], []
+        for frame in batch:
+            region = self.regions.get(frame.camera_id)
+            image, offset = region.crop(frame.image) if region is not None else (frame.image, None)
+            if self.motion_gate is not None:
+                motion = self.motion_gate.check(frame.camera_id, image)
+                if motion is None:
+                    continue
+                # The next frames of the batch are compared to this one. A failed inference stops the ingestor, so
+                # the reference does not wait for it
+                self.motion_gate.remember(motion)
+            frames.append(frame)
+            crops.append((image, offset))
+        if not frames:
+            return [], []
+        results = self.fast_anpr.run_sync(
+            [image for image, _ in crops], stream_ids=[frame.camera_id for frame in frames]
+        )
+        return frames, [
+            RegionOfInterest.to_frame(number_plates, offset) if offset is not None else number_plates
+            for (_, offset), number_plates in zip(crops, results)
+        ]
+
+    def stop(self):
+        self._stopped.set()
+        for source in self.sources.values():
+            source.stop()
+
+    def _next_batch(self) -> List[Frame]:
+        try:
+            batch = [self.frames.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.frames.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+
+def database_sink(
+        frames: List[Frame],
+        results: list,
+        writer: DetectionWriter,
+        image_store: Optional[ImageStore] = None,
+        save_frame: bool = False
+):
+    """Queues the number plates read on each frame as `Detection` rows of its camera for the background writer,
+    with their crops saved to the image store if one is given."""
+    writer.submit([
+        row
+        for frame, number_plates in zip(frames, results)
+        for row in detection_rows(
+            frame.image, number_plates, frame.camera_id, frame.captured_at, image_store, save_frame
+        )
+    ])
+
+
+def print_sink(frames: List[Frame], results: list):
+    for frame, number_plates in zip(frames, results):
+        for number_plate in number_plates:
+            print(f"[camera {frame.camera_id}] {frame.captured_at.isoformat()} {number_plate.rec_text} "
+                  f"(det {number_plate.det_conf:.2f}, rec {number_plate.rec_conf or 0:.2f})")
+
+
+def main():
+    import argparse
+    import functools
+    from anpr import FastANPR
+    from anpr.tracking import PlateTracker
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Ingestion des flux vidéo des caméras")
+    parser.add_argument("--source", action="append", default=[], metavar="CAMERA_ID=URL",
+                        help="Flux ou fichier vidéo à lire pour une caméra (répétable)")
+    parser.add_argument("--sample-fps", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=64)
+    parser.add_argument("--device", type=str, default="cpu")
+    parser.add_argument("--no-tracking", action="store_true", help="Relit chaque plaque sur chaque image")
+    parser.add_argument("--dry-run", action="store_true", help="Affiche les résultats au lieu de les enregistrer")
+    parser.add_argument("--no-images", action="store_true", help="N'enregistre pas les images des plaques")
+    parser.add_argument("--save-frames", action="store_true", help="Enregistre aussi les images complètes")
+    parser.add_argument("--watchlist-refresh", type=float, default=30.0,
+                        help="Intervalle en secondes du rafraîchissement des véhicules volés")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="Ignore les images où rien n'a bougé depuis la dernière image analysée")
+    parser.add_argument("--motion-threshold", type=int, default=25,
+                        help="Écart de niveau de gris à partir duquel un pixel a changé")
+    parser.add_argument("--motion-min-area", type=float, default=0.005,
+                        help="Fraction des pixels qui doivent changer pour qu'une image soit analysée")
+    parser.add_argument("--motion-refresh", type=float, default=10.0,
+                        help="Intervalle maximal en secondes entre deux images analysées d'une caméra")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    sink = print_sink
+    writer = None
+    if not args.dry_run:
+        watchlist = Watchlist()
+        start_refresh(watchlist, SessionLocal, args.watchlist_refresh)
+        writer = DetectionWriter(
+            SessionLocal, hooks=[AlertEngine([stolen_vehicle_rule(watchlist)]).hook()],
+            vehicle_resolver=VehicleResolver()
+        )
+        writer.start()
+        sink = functools.partial(
+            database_sink, writer=writer, image_store=None if args.no_images else create_image_store(),
+            save_frame=args.save_frames
+        )
+
+    ingestor = StreamIngestor(
+        FastANPR(
+            device=args.device, rec_batch_size=args.batch_size, executor="inline",
+            tracker=None if args.no_tracking else PlateTracker()
+        ),
+        sink=sink,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        sample_fps=args.sample_fps,
+        motion_gate=MotionGate(
+            threshold=args.motion_threshold, min_area=args.motion_min_area, refresh_interval=args.motion_refresh
+        ) if args.motion_gate else None
+    )
+    if args.source:
+        for source in args.source:
+            camera_id, url = source.split("=", 1)
+            ingestor.add_source(int(camera_id), url)
+    else:
+        db = SessionLocal()
+        try:
+            logger.info("%s caméras actives ajoutées", ingestor.add_cameras(db))
+        finally:
+            db.close()
+
+    try:
+        ingestor.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingestor.stop()
+        if writer is not None:
+            writer.stop()
+        if ingestor.motion_gate is not None:
+            stats = ingestor.motion_gate.stats()
+            logger.info("%s images sur %s ignorées sans mouvement (%.1f %%)", stats["skipped"], stats["frames"],
+                        100 * stats["skipped_fraction"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Résolution des plaques lues en véhicules.
+
+Chaque détection enregistrée est reliée au `Vehicle` de sa plaque (`Detection.vehicle_id`). Un cache LRU borné
+plaque → identifiant, qui retient aussi les plaques sans véhicule, évite de lire la table `vehicles` à chaque lecture :
+seules les plaques absentes du cache sont cherchées, en une requête par lot, et les plaques inconnues sont créées par
+un seul `INSERT ... ON CONFLICT DO NOTHING`. Le cache est invalidé par les modifications des véhicules faites avec
+l'ORM dans le processus, et par une relecture périodique des véhicules modifiés par les autres processus.
+"""
+import time
+import weakref
+import threading
+from collections import OrderedDict
+from typing import Callable, Collection, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, func, inspect, insert, select
+from sqlalchemy.orm import Session, object_session
+
+from models import Vehicle
+
+# Session.info keys of the vehicles created and of the plates changed by a transaction, applied to the caches
+# once it commits
+_CREATED = "vehicle_resolver_created"
+_CHANGED = "vehicle_resolver_changed"
+_MISSING = object()
+
+_resolvers: "weakref.WeakSet[VehicleResolver]" = weakref.WeakSet()
+
+
+class VehicleResolver:
+    """Plate number → vehicle id cache of the ingest path.
+
+    `max_entries` bounds the cache, least recently used plates being evicted first; plates without vehicle are
+    cached as None. With `create_unknown`, the vehicles of the unknown plates of rows read with at least
+    `min_confidence` (the product of the detection and OCR confidences) are created, so that misreads do not become
+    vehicles; other unknown plates are left unlinked. Vehicles created or modified by other processes are read every
+    `refresh_interval` seconds from their `updated_at`; vehicles deleted by other processes are only noticed through
+    `clear`.
+    """
+
+    def __init__(
+            self,
+            max_entries: int = 100_000,
+            create_unknown: bool = True,
+            min_confidence: float = 0.9,
+            refresh_interval: Optional[float] = 30.0,
+            clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.create_unknown = create_unknown
+        self.min_confidence = min_confidence
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self.last_updated_at = None
+        self.hits = 0
+        self.misses = 0
+        self.lookups = 0
+        self.created = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Optional[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_refresh = 0.0
+        _resolvers.add(self)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def assign(self, db: Session, rows: List[dict]) -> List[dict]:
+        """Copies of `Detection` rows with the `vehicle_id` of their plate, None for plates left unlinked, rows with a
+        `vehicle_id` being kept as is. The rows themselves are left untouched, so that a rolled back batch is resolved
+        again."""
+        unlinked = [row for row in rows if row.get("vehicle_id") is None]
+        if not unlinked:
+            return list(rows)
+        creatable = set()
+        if self.create_unknown:
+            creatable = {
+                row["plate_number"] for row in unlinked if row.get("confidence", 0.0) >= self.min_confidence
+            }
+        vehicle_ids = self.resolve(db, {row["plate_number"] for row in unlinked}, create=creatable)
+        return [
+            row if row.get("vehicle_id") is not None else {**row, "vehicle_id": vehicle_ids[row["plate_number"]]}
+            for row in rows
+        ]
+
+    def resolve(
+            self, db: Session, plate_numbers: Iterable[str], create: Collection[str] = ()
+    ) -> Dict[str, Optional[int]]:
+        """Vehicle ids of plate numbers, None for unknown plates, the plates of `create` being created if unknown.
+        Plates found in the cache cost no query; the others cost one SELECT, plus one INSERT for the created ones."""
+        if self.refresh_interval is not None and self.clock() >= self._next_refresh:
+            self.refresh(db)
+        vehicle_ids, missing = {}, []
+        with self._lock:
+            for plate_number in set(plate_numbers):
+                vehicle_id = self._get(plate_number)
+                if vehicle_id is _MISSING or (vehicle_id is None and plate_number in create):
+                    missing.append(plate_number)
+                else:
+                    vehicle_ids[plate_number] = vehicle_id
+            self.hits += len(vehicle_ids)
+            self.misses += len(missing)
+        if not missing:
+            return vehicle_ids
+
+        self.lookups += 1
+        found = dict(db.execute(
+            select(Vehicle.plate_number, Vehicle.id).where(Vehicle.plate_number.in_(missing))
+        ).all())
+        created = self._create(db, [plate for plate in missing if plate not in found and plate in create])
+        with self._lock:
+            for plate_number in missing:
+                if plate_number in found or plate_number not in created:
+                    self._put(plate_number, found.get(plate_number))
+        if created:
+            # Rolled back vehicles must not be cached, they are once the transaction commits
+            db.info.setdefault(_CREATED, []).append((self, created))
+        for plate_number in missing:
+            vehicle_ids[plate_number] = found.get(plate_number, created.get(plate_number))
+        return vehicle_ids
+
+    def refresh(self, db: Session) -> int:
+        """Drops the cached plates of the vehicles created or modified since the last refresh, returns the number of
+        vehicles read. A first refresh with an empty cache only records the latest `updated_at`."""
+        if self.refresh_interval is not None:
+            self._next_refresh = self.clock() + self.refresh_interval
+        if self.last_updated_at is None and not self._entries:
+            self.last_updated_at = db.execute(select(func.max(Vehicle.updated_at))).scalar()
+            return 0
+        query = select(Vehicle.id, Vehicle.plate_number, Vehicle.updated_at)
+        if self.last_updated_at is not None:
+            # Vehicles sharing the last timestamp are read again, they are usually cached with the same id
+            query = query.where(Vehicle.updated_at >= self.last_updated_at)
+        vehicles = db.execute(query).all()
+        if not vehicles:
+            return 0
+
+        plates = {vehicle_id: plate_number for vehicle_id, plate_number, _ in vehicles}
+        with self._lock:
+            # Plates of renamed vehicles, and plates cached without vehicle or with another one
+            stale = {
+                plate_number for plate_number, vehicle_id in self._entries.items()
+                if vehicle_id in plates and plates[vehicle_id] != plate_number
+            }
+            stale.update(
+                plate_number for vehicle_id, plate_number in plates.items()
+                if self._entries.get(plate_number, _MISSING) not in (_MISSING, vehicle_id)
+            )
+            for plate_number in stale:
+                del self._entries[plate_number]
+            self.invalidations += len(stale)
+        self.last_updated_at = max(updated_at for _, _, updated_at in vehicles)
+        return len(vehicles)
+
+    def invalidate(self, plate_numbers: Iterable[str]):
+        with self._lock:
+            for plate_number in plate_numbers:
+                if self._entries.pop(plate_number, _MISSING) is not _MISSING:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "lookups": self.lookups,
+            "created": self.created,
+            "invalidations": self.invalidations,
+        }
+
+    def _create(self, db: Session, plate_numbers: List[str]) -> Dict[str, int]:
+        if not plate_numbers:
+            return {}
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        elif dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            upsert = None
+        statement = insert(Vehicle) if upsert is None else upsert(Vehicle).on_conflict_do_nothing(
+            index_elements=[Vehicle.plate_number]
+        )
+        created = dict(db.execute(
+            statement.returning(Vehicle.plate_number, Vehicle.id),
+            [{"plate_number": plate_number} for plate_number in plate_numbers]
+        ).all())
+        self.created += len(created)
+        # Plates created meanwhile by another transaction
+        conflicts = [plate_number for plate_number in plate_numbers if plate_number not in created]
+        if conflicts:
+            created.update(db.execute(
+                select(Vehicle.plate_number, Vehicle.id).where(Vehicle.plate_number.in_(conflicts))
+            ).all())
+        return created
+
+    def _get(self, plate_number: str):
+        vehicle_id = self._entries.get(plate_number, _MISSING)
+        if vehicle_id is not _MISSING:
+            self._entries.move_to_end(plate_number)
+        return vehicle_id
+
+    def _put(self, plate_number: str, vehicle_id: Optional[int]):
+        self._entries[plate_number] = vehicle_id
+        self._entries.move_to_end(plate_number)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+@event.listens_for(Vehicle, "after_insert")
+@event.listens_for(Vehicle, "after_update")
+@event.listens_for(Vehicle, "after_delete")
+def _vehicle_changed(mapper, connection, target: Vehicle):
+    plate_numbers = {target.plate_number, *inspect(target).attrs.plate_number.history.deleted}
+    for resolver in list(_resolvers):
+        resolver.invalidate(plate_numbers)
+    # Again after the commit, as other threads may cache the previous values until then
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED, set()).update(plate_numbers)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_changes(session: Session):
+    for resolver, created in session.info.pop(_CREATED, ()):
+        with resolver._lock:
+            for plate_number, vehicle_id in created.items():
+                resolver._put(plate_number, vehicle_id)
+    changed = session.info.pop(_CHANGED, None)
+    if changed:
+        for resolver in list(_resolvers):
+            resolver.invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_changes(session: Session):
+    session.info.pop(_CREATED, None)
+    session.info.pop(_CHANGED, None)
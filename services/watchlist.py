@@ -0,0 +1,231 @@
+"""
+Liste de surveillance des véhicules volés.
+
+Les plaques des `StolenVehicle` actifs sont gardées en mémoire et rafraîchies de façon incrémentale d'après
+`updated_at`, pour comparer chaque lecture de FastANPR sans interroger la base. Les plaques sont comparées sous une
+forme canonique qui confond les caractères que l'OCR inverse (0/O, 1/I, 8/B...), exactement puis à une distance
+d'édition près.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import combinations
+from typing import Dict, Optional, Set
+
+from sqlalchemy.orm import Session, sessionmaker
+
+from models import Alert, StolenVehicle
+from models.alert import AlertSeverity, AlertType
+
+logger = logging.getLogger(__name__)
+
+# Characters the OCR mistakes for one another, mapped to a single representative
+CONFUSABLES = str.maketrans({
+    "O": "0", "Q": "0", "D": "0",
+    "I": "1", "L": "1",
+    "Z": "2",
+    "S": "5",
+    "G": "6",
+    "B": "8",
+})
+
+
+def canonical_plate(text: str) -> str:
+    """Upper-cases a plate, drops separators and maps confusable characters to the same representative."""
+    return "".join(character for character in text.upper() if character.isalnum()).translate(CONFUSABLES)
+
+
+def edit_distance(first: str, second: str, max_distance: int) -> int:
+    """Levenshtein distance of two strings, stopping at `max_distance + 1` once it is certain to exceed it."""
+    if abs(len(first) - len(second)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(second) + 1))
+    for row, first_character in enumerate(first, 1):
+        current = [row]
+        for column, second_character in enumerate(second, 1):
+            current.append(min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (first_character != second_character)
+            ))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+@dataclass(frozen=True, slots=True)
+class WatchlistEntry:
+    stolen_vehicle_id: int
+    vehicle_id: int
+    plate_number: str
+
+
+@dataclass(frozen=True, slots=True)
+class WatchlistMatch:
+    entry: WatchlistEntry
+    read_text: str
+    distance: int
+
+
+class Watchlist:
+    """In-memory index of the plates of active `StolenVehicle` records.
+
+    Exact matches are a dictionary lookup of the canonical plate. Fuzzy matches use a deletion index (as SymSpell):
+    every variant of a canonical plate with up to `max_distance` characters deleted points to that plate, so the
+    candidates of a read are found by looking up its own deletion variants, and only those few candidates have their
+    edit distance computed. Lookups cost microseconds regardless of the size of the watchlist.
+    """
+
+    def __init__(self, max_distance: int = 1, min_fuzzy_length: int = 5):
+        self.max_distance = max_distance
+        self.min_fuzzy_length = min_fuzzy_length
+        self.last_updated_at: Optional[datetime] = None
+        self._entries: Dict[str, Dict[int, WatchlistEntry]] = {}
+        self._canonical_by_id: Dict[int, str] = {}
+        self._deletions: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._canonical_by_id)
+
+    def refresh(self, db: Session) -> int:
+        """Loads the `StolenVehicle` records updated since the last refresh, adding the active ones and removing the
+        recovered ones. Returns the number of records loaded."""
+        query = db.query(
+            StolenVehicle.id, StolenVehicle.vehicle_id, StolenVehicle.plate_number, StolenVehicle.is_active,
+            StolenVehicle.updated_at
+        )
+        if self.last_updated_at is not None:
+            # Records sharing the last timestamp are loaded again, updates are idempotent
+            query = query.filter(StolenVehicle.updated_at >= self.last_updated_at)
+        else:
+            query = query.filter(StolenVehicle.is_active.is_(True))
+        records = query.order_by(StolenVehicle.updated_at).all()
+
+        with self._lock:
+            for stolen_vehicle_id, vehicle_id, plate_number, is_active, updated_at in records:
+                self._remove(stolen_vehicle_id)
+                if is_active:
+                    self._add(WatchlistEntry(stolen_vehicle_id, vehicle_id, plate_number))
+                if self.last_updated_at is None or updated_at > self.last_updated_at:
+                    self.last_updated_at = updated_at
+        return len(records)
+
+    def add(self, entry: WatchlistEntry):
+        with self._lock:
+            self._remove(entry.stolen_vehicle_id)
+            self._add(entry)
+
+    def remove(self, stolen_vehicle_id: int):
+        with self._lock:
+            self._remove(stolen_vehicle_id)
+
+    def match(self, text: Optional[str]) -> Optional[WatchlistMatch]:
+        """Returns the closest watched plate of a read, if any is within `max_distance` edits."""
+        if not text:
+            return None
+        canonical = canonical_plate(text)
+        with self._lock:
+            entries = self._entries.get(canonical)
+            if entries:
+                return WatchlistMatch(next(iter(entries.values())), text, 0)
+            if self.max_distance < 1 or len(canonical) < self.min_fuzzy_length:
+                return None
+
+            best, best_distance = None, self.max_distance + 1
+            candidates = set()
+            for variant in _deletion_variants(canonical, self.max_distance):
+                candidates.update(self._deletions.get(variant, ()))
+            for candidate in candidates:
+                distance = edit_distance(canonical, candidate, self.max_distance)
+                if distance < best_distance:
+                    best, best_distance = candidate, distance
+            if best is None:
+                return None
+            return WatchlistMatch(next(iter(self._entries[best].values())), text, best_distance)
+
+    def _add(self, entry: WatchlistEntry):
+        canonical = canonical_plate(entry.plate_number)
+        if not canonical:
+            return
+        entries = self._entries.setdefault(canonical, {})
+        if not entries:
+            for variant in _deletion_variants(canonical, self.max_distance):
+                self._deletions.setdefault(variant, set()).add(canonical)
+        entries[entry.stolen_vehicle_id] = entry
+        self._canonical_by_id[entry.stolen_vehicle_id] = canonical
+
+    def _remove(self, stolen_vehicle_id: int):
+        canonical = self._canonical_by_id.pop(stolen_vehicle_id, None)
+        if canonical is None:
+            return
+        entries = self._entries[canonical]
+        del entries[stolen_vehicle_id]
+        if entries:
+            return
+        del self._entries[canonical]
+        for variant in _deletion_variants(canonical, self.max_distance):
+            plates = self._deletions.get(variant)
+            if plates is not None:
+                plates.discard(canonical)
+                if not plates:
+                    del self._deletions[variant]
+
+
+def start_refresh(watchlist: Watchlist, session_factory: sessionmaker, interval: float = 30.0) -> threading.Event:
+    """Refreshes the watchlist now and then every `interval` seconds in a daemon thread, until the returned event
+    is set."""
+    stop = threading.Event()
+
+    def refresh_loop():
+        while True:
+            db = session_factory()
+            try:
+                loaded = watchlist.refresh(db)
+                if loaded:
+                    logger.info("%s véhicules volés mis à jour, %s plaques surveillées", loaded, len(watchlist))
+            except Exception:
+                logger.exception("Échec du rafraîchissement de la liste de surveillance")
+            finally:
+                db.close()
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=refresh_loop, name="watchlist-refresh", daemon=True).start()
+    return stop
+
+
+def _deletion_variants(text: str, max_distance: int) -> Set[str]:
+    variants = {text}
+    for deleted in range(1, min(max_distance, len(text)) + 1):
+        for positions in combinations(range(len(text)), deleted):
+            variants.add("".join(character for index, character in enumerate(text) if index not in positions))
+    return variants
+
+
+def stolen_vehicle_alert(
+        match: WatchlistMatch, detection_id: Optional[int] = None, camera_id: Optional[int] = None
+) -> Alert:
+    """Builds the `STOLEN_VEHICLE` alert of a watchlist match, linked to the detection that triggered it."""
+    entry = match.entry
+    exact = match.distance == 0 and match.read_text.upper() == entry.plate_number.upper()
+    return Alert(
+        type=AlertType.STOLEN_VEHICLE,
+        severity=AlertSeverity.CRITICAL if exact else AlertSeverity.HIGH,
+        title=f"Véhicule volé détecté : {entry.plate_number}",
+        message=(
+            f"La plaque lue « {match.read_text} » correspond au véhicule volé {entry.plate_number}"
+            + ("." if exact else f" (correspondance approchée, distance {match.distance}).")
+        ),
+        details={
+            "stolen_vehicle_id": entry.stolen_vehicle_id,
+            "read_text": match.read_text,
+            "watchlist_plate": entry.plate_number,
+            "distance": match.distance,
+        },
+        detection_id=detection_id,
+        camera_id=camera_id,
+        vehicle_id=entry.vehicle_id,
+    )
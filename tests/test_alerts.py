@@ -0,0 +1,103 @@
+import pytest
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Alert, Detection
+from models.alert import AlertSeverity, AlertStatus, AlertType
+from services.alerts import AlertEngine, low_confidence_rule, stolen_vehicle_rule
+from services.detection_writer import DetectionWriter
+from services.watchlist import Watchlist, WatchlistEntry
+
+
+@pytest.fixture
+def watchlist() -> Watchlist:
+    watchlist = Watchlist()
+    watchlist.add(WatchlistEntry(1, 7, "AB1234CD"))
+    return watchlist
+
+
+@pytest.fixture
+def session_factory(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anpr.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def row(plate_number: str, camera_id: int = 1, confidence: float = 0.9) -> dict:
+    return {"plate_number": plate_number, "camera_id": camera_id, "confidence": confidence,
+            "detected_at": datetime(2024, 1, 1, tzinfo=timezone.utc)}
+
+
+def test_duplicates_are_suppressed_within_the_window(watchlist):
+    now = [0.0]
+    engine = AlertEngine(
+        [stolen_vehicle_rule(watchlist), low_confidence_rule(0.5)], window=120,
+        windows={AlertType.LOW_CONFIDENCE: 10}, clock=lambda: now[0]
+    )
+    # Exact and fuzzy reads of the same stolen car, on two cameras
+    alerts = engine.evaluate([row("AB1234CD"), row("A81234CD"), row("AB1234CD", camera_id=2)], [1, 2, 3])
+    assert [(alert.detection_id, alert.camera_id) for alert in alerts] == [(1, 1), (3, 2)]
+    assert alerts[0].severity == AlertSeverity.CRITICAL
+
+    now[0] = 60.0
+    assert engine.evaluate([row("AB1234CD"), row("XY9876ZT", confidence=0.1)], [4, 5])[0].type == \
+        AlertType.LOW_CONFIDENCE
+    now[0] = 75.0
+    assert [alert.detection_id for alert in engine.evaluate([row("XY9876ZT", confidence=0.2)], [6])] == [6]
+    now[0] = 121.0
+    assert [alert.detection_id for alert in engine.evaluate([row("AB1234CD")], [7])] == [7]
+
+    stats = engine.stats()
+    assert stats["emitted"] == 5 and stats["suppressed"] == 2
+    assert stats["suppressed_by_type"] == {"stolen_vehicle": 2}
+
+
+def test_windows_are_bounded():
+    engine = AlertEngine([low_confidence_rule(1.0)], max_windows=10)
+    engine.evaluate([row(f"P{index:04d}") for index in range(50)], list(range(50)))
+    assert engine.stats()["open_windows"] == 10 and engine.stats()["emitted"] == 50
+
+
+def test_alerts_are_written_in_one_insert_and_one_update(watchlist, session_factory):
+    engine = AlertEngine([stolen_vehicle_rule(watchlist)])
+    rows = [row("AB1234CD", camera_id=camera_id) for camera_id in range(5)] + [row("ZZ0000")]
+    with session_factory() as db:
+        ids = db.execute(insert(Detection).returning(Detection.id, sort_by_parameter_order=True), rows).scalars().all()
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute",
+                     lambda connection, cursor, statement, *args: statements.append(statement))
+        engine.hook()(db, rows, ids)
+        db.commit()
+
+        assert len(statements) == 2
+        alerts = db.query(Alert).order_by(Alert.id).all()
+        assert [alert.detection_id for alert in alerts] == ids[:5]
+        assert alerts[0].status == AlertStatus.NEW and alerts[0].vehicle_id == 7
+        assert [detection.is_alert_triggered for detection in db.query(Detection).order_by(Detection.id)] == \
+            [True] * 5 + [False]
+
+
+def test_rolled_back_batches_raise_their_alerts_again(watchlist, session_factory, tmp_path: Path):
+    engine = AlertEngine([stolen_vehicle_rule(watchlist)])
+    failures = [1]
+
+    def fail_once(db, rows, ids):
+        if failures:
+            failures.pop()
+            raise OSError("disk full")
+
+    writer = DetectionWriter(session_factory, batch_size=10, flush_interval=0.05, retry_backoff=0,
+                             spill_dir=tmp_path, hooks=[engine.hook(), fail_once])
+    writer.start()
+    writer.submit([row("AB1234CD"), row("AB1234CD")])
+    writer.stop()
+
+    with session_factory() as db:
+        assert db.query(Alert).count() == 1 and db.query(Detection).count() == 2
+    assert writer.failed_flushes == 1
+    # The alert of the rolled back attempt is not counted
+    assert engine.stats()["emitted"] == 1 and engine.stats()["emitted_by_type"] == {"stolen_vehicle": 1}
@@ -0,0 +1,90 @@
+import asyncio
+import io
+import cv2
+import pytest
+import numpy as np
+from fastapi.testclient import TestClient
+
+import api
+from anpr.numberplate import NumberPlate
+
+
+class ValueANPR:
+    """Stands in for FastANPR, reading the grey level of the first pixel of each frame as its plate."""
+
+    async def run(self, images):
+        return [
+            [NumberPlate(det_box=[0, 0, 8, 8], det_conf=0.9, rec_text=f"P{image[0, 0, 0]}", rec_conf=0.8)]
+            for image in images
+        ]
+
+
+class DirectScheduler:
+    """Sends every frame straight to inference, as a batch of one."""
+
+    def __init__(self, fast_anpr):
+        self.fast_anpr = fast_anpr
+
+    async def submit(self, image):
+        return (await self.fast_anpr.run([image]))[0]
+
+
+def png(value: int) -> bytes:
+    return cv2.imencode(".png", np.full((8, 8, 3), value, dtype=np.uint8))[1].tobytes()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api, "scheduler", DirectScheduler(ValueANPR()))
+    monkeypatch.setattr(api, "result_cache", None)
+    monkeypatch.setattr(api, "detection_writer", None)
+    monkeypatch.setattr(api, "motion_gate", None)
+    monkeypatch.setattr(api, "profiler", None)
+    return TestClient(api.app)
+
+
+def test_raw_image_body(client):
+    response = client.post("/recognise/image", content=png(42), headers={"content-type": "image/png"})
+    assert response.status_code == 200 and response.json()["number_plates"][0]["rec_text"] == "P42"
+
+    assert client.post("/recognise/image", content=png(42), headers={"content-type": "text/plain"}).status_code == 415
+    assert client.post("/recognise/image", content=b"not an image",
+                       headers={"content-type": "image/jpeg"}).status_code == 400
+
+
+def test_upload(client):
+    response = client.post("/recognise/upload", files={"image": ("frame.png", png(7), "image/png")})
+    assert response.status_code == 200 and response.json()["number_plates"][0]["rec_text"] == "P7"
+    assert client.post("/recognise/upload", files={"image": ("frame.png", b"garbage", "image/png")}).status_code == 400
+
+
+def test_batch_results_are_in_order(client, monkeypatch):
+    values = [5, 200, 17, 99]
+    response = client.post(
+        "/recognise/batch", files=[("images", (f"{index}.png", png(value), "image/png"))
+                                   for index, value in enumerate(values)]
+    )
+    assert response.status_code == 200
+    assert [result["number_plates"][0]["rec_text"] for result in response.json()["results"]] == \
+        [f"P{value}" for value in values]
+
+    monkeypatch.setattr(api, "MAX_UPLOAD_IMAGES", 3)
+    response = client.post("/recognise/batch", files=[("images", ("frame.png", io.BytesIO(png(1)), "image/png"))] * 4)
+    assert response.status_code == 413
+
+
+def test_readiness_reports_failed_and_cancelled_loads(client, monkeypatch):
+    monkeypatch.setattr(api, "scheduler", None)
+    loop = asyncio.new_event_loop()
+    failed, cancelled = loop.create_future(), loop.create_future()
+    failed.set_exception(RuntimeError("no model"))
+    cancelled.cancel()
+    loop.close()
+
+    monkeypatch.setattr(api, "loading", failed)
+    response = client.get("/health/ready")
+    assert response.status_code == 503 and response.json()["status"] == "failed" and "no model" in response.text
+
+    monkeypatch.setattr(api, "loading", cancelled)
+    response = client.get("/health/ready")
+    assert response.status_code == 503 and response.json()["status"] == "failed"
@@ -0,0 +1,90 @@
+import cv2
+import pytest
+import numpy as np
+from pathlib import Path
+from anpr.backends import ONNX_DIR, DETECTOR_ONNX, RECOGNISER_ONNX, create_detector, create_recogniser
+from anpr.backends.detection import _letterbox, _postprocess
+from anpr.backends.recognition import _ctc_decode
+
+IMAGES = sorted((Path(__file__).parent / 'images').glob('*.jpg'))
+DETECTION_MODEL = Path(__file__).parent.parent / 'anpr/best.pt'
+
+requires_onnx_models = pytest.mark.skipif(
+    not (ONNX_DIR / DETECTOR_ONNX).exists() or not (ONNX_DIR / RECOGNISER_ONNX).exists(),
+    reason="ONNX models not exported, run `python -m anpr.export`"
+)
+
+
+def test_letterbox_pads_to_square_input():
+    image = np.zeros((360, 640, 3), dtype=np.uint8)
+    letterboxed = _letterbox(image, 640)
+    assert letterboxed.shape == (3, 640, 640)
+    assert letterboxed.dtype == np.float32
+    assert letterboxed[:, 0, 0] == pytest.approx(114 / 255)
+
+
+def test_postprocess_rescales_boxes_and_suppresses_overlaps():
+    # Two overlapping candidates and one low confidence one, on a 640x360 image letterboxed to 640x640
+    output = np.array([
+        [320, 321, 100],
+        [320, 320, 100],
+        [100, 100, 20],
+        [40, 40, 20],
+        [0.9, 0.8, 0.1],
+    ], dtype=np.float32)
+    boxes, confs = _postprocess(output, (360, 640), 640, conf_threshold=0.25, iou_threshold=0.7, max_det=300)
+    assert boxes == [[270, 160, 370, 200]]
+    assert confs == [pytest.approx(0.9)]
+
+
+def test_ctc_decode_drops_blanks_and_repeats():
+    characters = ["blank", "A", "B", "1", " "]
+    steps = [1, 1, 0, 1, 2, 0, 3]
+    probs = np.full((1, len(steps), len(characters)), 0.01, dtype=np.float32)
+    for step, index in enumerate(steps):
+        probs[0, step, index] = 0.9
+    assert _ctc_decode(probs, characters) == [("AAB1", pytest.approx(0.9))]
+
+
+@pytest.mark.parametrize('backend', ['onnxruntime', 'openvino'])
+def test_onnx_recogniser_needs_rec_mode(backend: str):
+    with pytest.raises(ValueError, match="rec"):
+        create_recogniser(backend, "cpu", mode="det_rec")
+
+
+@requires_onnx_models
+@pytest.mark.parametrize('backend', ['onnxruntime', 'openvino'])
+def test_detector_matches_reference(backend: str):
+    pytest.importorskip(backend)
+    images = [cv2.cvtColor(cv2.imread(str(file)), cv2.COLOR_BGR2RGB) for file in IMAGES]
+    reference = create_detector("reference", DETECTION_MODEL, "cpu").run(images)
+    candidate = create_detector(backend, DETECTION_MODEL, "cpu", num_threads=2).run(images)
+
+    # The ONNX detector letterboxes to a fixed square while ultralytics pads to the stride, so the same plates are
+    # found from slightly different inputs: boxes agree within 4 pixels and confidences within 0.05
+    for reference_detections, candidate_detections in zip(reference, candidate):
+        assert len(candidate_detections) == len(reference_detections)
+        for expected, actual in zip(reference_detections, candidate_detections):
+            assert np.abs(np.array(actual.box) - np.array(expected.box)).max() <= 4
+            assert actual.conf == pytest.approx(expected.conf, abs=0.05)
+
+
+@requires_onnx_models
+@pytest.mark.parametrize('backend', ['onnxruntime', 'openvino'])
+def test_recogniser_matches_reference(backend: str):
+    pytest.importorskip(backend)
+    images = [cv2.cvtColor(cv2.imread(str(file)), cv2.COLOR_BGR2RGB) for file in IMAGES]
+    crops = [
+        detection.image for detections in create_detector("reference", DETECTION_MODEL, "cpu").run(images)
+        for detection in detections
+    ]
+    reference = create_recogniser("reference", "cpu", mode="rec")
+    candidate = create_recogniser(backend, "cpu", mode="rec", num_threads=2)
+
+    # Multi-line crops fall back to line detection in the reference, which the ONNX backends do not export
+    single_lines = [crop for crop in crops if crop.shape[1] / crop.shape[0] >= reference.multiline_aspect]
+    for expected, actual in zip(reference.run_batch(single_lines), candidate.run_batch(single_lines)):
+        assert (actual is None) == (expected is None)
+        if expected is not None:
+            assert actual.text == expected.text
+            assert actual.conf == pytest.approx(expected.conf, abs=0.01)
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+import numpy as np
+from anpr.batching import BatchScheduler
+
+
+class RecordingANPR:
+    """Stands in for FastANPR, returning the index of each image as its result."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batch_sizes = []
+
+    async def run(self, images):
+        self.batch_sizes.append(len(images))
+        await asyncio.sleep(self.delay)
+        return [[int(image[0, 0, 0])] for image in images]
+
+
+def make_image(index: int) -> np.ndarray:
+    return np.full((4, 4, 3), index, dtype=np.uint8)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_batched_and_routed_back():
+    anpr = RecordingANPR()
+    scheduler = BatchScheduler(anpr, max_batch_size=4, max_wait_ms=50)
+    scheduler.start()
+
+    results = await asyncio.gather(*(scheduler.submit(make_image(index)) for index in range(10)))
+    await scheduler.stop()
+
+    assert results == [[index] for index in range(10)]
+    assert anpr.batch_sizes == [4, 4, 2]
+
+
+@pytest.mark.asyncio
+async def test_single_request_waits_at_most_max_wait():
+    anpr = RecordingANPR()
+    scheduler = BatchScheduler(anpr, max_batch_size=8, max_wait_ms=10)
+    scheduler.start()
+
+    result = await asyncio.wait_for(scheduler.submit(make_image(3)), timeout=1)
+    await scheduler.stop()
+
+    assert result == [3]
+    assert anpr.batch_sizes == [1]
+
+
+@pytest.mark.asyncio
+async def test_inference_errors_are_raised_to_every_caller():
+    class FailingANPR:
+        async def run(self, images):
+            raise RuntimeError("inference failed")
+
+    scheduler = BatchScheduler(FailingANPR(), max_batch_size=2, max_wait_ms=10)
+    scheduler.start()
+
+    results = await asyncio.gather(*(scheduler.submit(make_image(index)) for index in range(2)), return_exceptions=True)
+    await scheduler.stop()
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_the_requests_of_the_batch_being_built():
+    # One request waits for its batch to fill, the other for an inference slot
+    filling = BatchScheduler(RecordingANPR(), max_batch_size=4, max_wait_ms=10_000)
+    waiting = BatchScheduler(RecordingANPR(delay=0.2), max_batch_size=1, max_wait_ms=0, max_in_flight=1)
+    for scheduler in (filling, waiting):
+        scheduler.start()
+    requests = [asyncio.ensure_future(filling.submit(make_image(0)))]
+    requests += [asyncio.ensure_future(waiting.submit(make_image(index))) for index in (1, 2)]
+    await asyncio.sleep(0.05)
+
+    await asyncio.wait_for(asyncio.gather(filling.stop(), waiting.stop()), timeout=1)
+    results = await asyncio.wait_for(asyncio.gather(*requests, return_exceptions=True), timeout=1)
+
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert results[1] == [1] and isinstance(results[2], asyncio.CancelledError)
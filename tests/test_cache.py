@@ -0,0 +1,76 @@
+import numpy as np
+from anpr.cache import ResultCache
+from anpr.numberplate import NumberPlate
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_frame(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+
+PLATES = [NumberPlate(det_box=[1, 2, 3, 4], det_conf=0.9, rec_poly=None, rec_text="AB123CD", rec_conf=0.8,
+                      timings={"detect": 12.0, "ocr": 3.0})]
+
+
+def test_identical_frames_hit_per_camera():
+    cache = ResultCache(max_entries=8)
+    frame = make_frame(0)
+    assert cache.get(frame, scope="cam-1") is None
+    cache.put(frame, PLATES, scope="cam-1")
+
+    # Hits are answered without inference, so without timings
+    hit = cache.get(frame.copy(), scope="cam-1")
+    assert hit == PLATES and hit[0].timings is None and PLATES[0].timings is not None
+    assert cache.get(frame, scope="cam-2") is None
+    assert cache.get(make_frame(1), scope="cam-1") is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResultCache(ttl=10, clock=clock)
+    frame = make_frame(0)
+    cache.put(frame, PLATES)
+
+    clock.now = 9
+    assert cache.get(frame) == PLATES
+    clock.now = 10
+    assert cache.get(frame) is None
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2)
+    frames = [make_frame(seed) for seed in range(3)]
+    cache.put(frames[0], [])
+    cache.put(frames[1], [])
+    cache.get(frames[0])
+    cache.put(frames[2], [])
+
+    assert cache.get(frames[0]) == []
+    assert cache.get(frames[1]) is None
+    assert cache.evictions == 1
+
+
+def test_near_duplicate_frames_hit_only_when_enabled():
+    frame = np.tile(np.linspace(0, 255, 160, dtype=np.uint8), (120, 1))[..., None].repeat(3, axis=2)
+    noisy = np.clip(frame.astype(int) + np.random.default_rng(0).integers(-2, 3, frame.shape), 0, 255).astype(np.uint8)
+    different = frame[:, ::-1].copy()
+
+    exact = ResultCache()
+    exact.put(frame, PLATES)
+    assert exact.get(noisy) is None
+
+    near = ResultCache(max_distance=8)
+    near.put(frame, PLATES)
+    assert near.get(noisy) == PLATES
+    assert near.get(different) is None
+    assert near.get(noisy, scope="other-camera") is None
+    assert near.stats()["near_hits"] == 1
@@ -0,0 +1,44 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
+
+import database
+
+
+def test_pool_options_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "4")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "2")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "60")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "5")
+    options = database.pool_options("postgresql://user:password@db:5432/anpr")
+    assert options == {"pool_size": 4, "max_overflow": 2, "pool_recycle": 60, "pool_timeout": 5.0,
+                       "pool_pre_ping": True}
+
+
+def test_sqlite_options():
+    assert database.pool_options("sqlite://")["poolclass"] is StaticPool
+    assert "poolclass" not in database.pool_options("sqlite:///anpr.db")
+
+
+def test_async_database_url(monkeypatch):
+    monkeypatch.delenv("ASYNC_DATABASE_URL", raising=False)
+    assert database.async_database_url("postgresql://user:secret@db:5432/anpr") == \
+        "postgresql+asyncpg://user:secret@db:5432/anpr"
+    assert database.async_database_url("postgresql+psycopg2://db/anpr") == "postgresql+asyncpg://db/anpr"
+    monkeypatch.setenv("ASYNC_DATABASE_URL", "sqlite+aiosqlite://")
+    assert database.async_database_url("postgresql://db/anpr") == "sqlite+aiosqlite://"
+
+
+@pytest.mark.asyncio
+async def test_get_async_db(monkeypatch):
+    pytest.importorskip("aiosqlite")
+    monkeypatch.setenv("ASYNC_DATABASE_URL", "sqlite+aiosqlite://")
+    database.get_async_engine.cache_clear()
+    database.get_async_sessionmaker.cache_clear()
+    try:
+        async for db in database.get_async_db():
+            assert (await db.execute(text("SELECT 1"))).scalar() == 1
+    finally:
+        await database.get_async_engine().dispose()
+        database.get_async_engine.cache_clear()
+        database.get_async_sessionmaker.cache_clear()
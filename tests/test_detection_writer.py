@@ -0,0 +1,129 @@
+import time
+import pytest
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Alert, Detection
+from services.detection_writer import DetectionWriter
+from services.alerts import AlertEngine, stolen_vehicle_rule
+from services.watchlist import Watchlist, WatchlistEntry
+
+
+def make_rows(count: int, plate: str = "AB1234CD") -> list:
+    detected_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {"plate_number": plate, "confidence": 0.9, "bounding_box": {"x": index, "y": 0, "width": 1, "height": 1},
+         "camera_id": None, "detected_at": detected_at}
+        for index in range(count)
+    ]
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def engine(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anpr.db'}")
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def count(engine, model) -> int:
+    with sessionmaker(bind=engine)() as db:
+        return db.query(model).count()
+
+
+def test_rows_are_flushed_by_size_and_by_time(engine, tmp_path: Path):
+    writer = DetectionWriter(sessionmaker(bind=engine), batch_size=10, flush_interval=0.2, spill_dir=tmp_path)
+    writer.start()
+    writer.submit(make_rows(25))
+    wait_for(lambda: count(engine, Detection) == 25)
+    writer.stop()
+
+    stats = writer.stats()
+    assert stats["written_rows"] == 25 and stats["queue_depth"] == 0
+    assert stats["flush_latency_ms_max"] > 0
+    with sessionmaker(bind=engine)() as db:
+        assert db.query(Detection).order_by(Detection.id).first().bounding_box["x"] == 0
+
+
+def test_stop_writes_the_queued_rows(engine, tmp_path: Path):
+    writer = DetectionWriter(sessionmaker(bind=engine), batch_size=1000, flush_interval=60, spill_dir=tmp_path)
+    writer.start()
+    writer.submit(make_rows(5))
+    writer.stop()
+    assert count(engine, Detection) == 5
+
+
+def test_failed_batches_are_spilled_and_replayed(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anpr.db'}")
+    spill_dir = tmp_path / "spill"
+    writer = DetectionWriter(
+        sessionmaker(bind=engine), batch_size=10, flush_interval=0.05, max_retries=1, retry_backoff=0.01,
+        spill_dir=spill_dir
+    )
+    writer.start()
+    # The table does not exist yet, so every write fails
+    writer.submit(make_rows(3))
+    wait_for(lambda: writer.spilled_rows == 3)
+    assert len(list(spill_dir.glob("*.jsonl"))) == 1
+
+    Base.metadata.create_all(engine)
+    writer.submit(make_rows(2))
+    wait_for(lambda: count(engine, Detection) == 5)
+    writer.stop()
+    assert writer.replayed_rows == 3
+    assert not list(spill_dir.glob("*.jsonl"))
+
+
+def test_unexpected_errors_are_spilled_and_the_writer_survives(engine, tmp_path: Path):
+    calls = []
+
+    def flaky_hook(db, rows, ids):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise ValueError("hook bug")
+
+    writer = DetectionWriter(
+        sessionmaker(bind=engine), batch_size=10, flush_interval=0.05, max_retries=0, spill_dir=tmp_path,
+        hooks=[flaky_hook]
+    )
+    writer.start()
+    writer.submit(make_rows(3))
+    wait_for(lambda: writer.spilled_rows == 3)
+
+    writer.submit(make_rows(2))
+    wait_for(lambda: count(engine, Detection) == 5)
+    writer.stop()
+    assert writer.replayed_rows == 3 and writer.failed_flushes == 1
+
+
+def test_full_queue_spills_instead_of_blocking(engine, tmp_path: Path):
+    writer = DetectionWriter(sessionmaker(bind=engine), max_queue=4, spill_dir=tmp_path)
+    assert writer.submit(make_rows(6)) == 4
+    assert writer.spilled_rows == 2 and writer.queue_depth == 4
+
+
+def test_hooks_receive_inserted_ids(engine, tmp_path: Path):
+    watchlist = Watchlist()
+    watchlist.add(WatchlistEntry(1, 7, "AB1234CD"))
+    writer = DetectionWriter(
+        sessionmaker(bind=engine), batch_size=4, flush_interval=0.05, spill_dir=tmp_path,
+        hooks=[AlertEngine([stolen_vehicle_rule(watchlist)]).hook()]
+    )
+    writer.start()
+    writer.submit(make_rows(1, "ZZ0000") + make_rows(1))
+    writer.stop()
+
+    with sessionmaker(bind=engine)() as db:
+        alert = db.query(Alert).one()
+        detection = alert.detection
+        assert detection.plate_number == "AB1234CD" and detection.is_alert_triggered
+        assert alert.vehicle_id == 7
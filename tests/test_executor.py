@@ -0,0 +1,59 @@
+import time
+import asyncio
+import threading
+import pytest
+import numpy as np
+
+from anpr import fastanpr
+
+
+class SlowDetector:
+    """Blocks its thread for `delay` seconds per call, finding no plate."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.calls = 0
+        self.started = threading.Event()
+
+    def run(self, images):
+        self.calls += 1
+        self.started.set()
+        time.sleep(self.delay)
+        return [[] for _ in images]
+
+
+class NoRecogniser:
+    def run_batch(self, crops):
+        return []
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_run_on_the_thread_executor_does_not_block_the_loop(monkeypatch):
+    detector = SlowDetector(delay=0.3)
+    monkeypatch.setattr(fastanpr, "create_detector", lambda *args: detector)
+    monkeypatch.setattr(fastanpr, "create_recogniser", lambda *args: NoRecogniser())
+    anpr = fastanpr.FastANPR(executor="thread")
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+
+    running = asyncio.create_task(anpr.run(image))
+    queued = asyncio.create_task(anpr.run(image))
+    await asyncio.to_thread(detector.started.wait, 1)
+
+    # The loop keeps ticking while inference blocks the executor thread
+    ticks, start = 0, time.perf_counter()
+    while time.perf_counter() - start < 0.1:
+        await asyncio.sleep(0.01)
+        ticks += 1
+    assert ticks >= 5
+
+    start = time.perf_counter()
+    running.cancel()
+    queued.cancel()
+    for task in (running, queued):
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert time.perf_counter() - start < 0.1
+
+    anpr.close()
+    # Work already running completes, queued work is dropped
+    assert detector.calls == 1
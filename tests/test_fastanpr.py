@@ -61,6 +61,24 @@ async def test_image_4d(file: str, expected_plates: List[str]):
     )
 
 
+@pytest.mark.parametrize('batch_size', [1, 3, 8])
+def test_batched_recognition_matches_per_crop(batch_size: int):
+    images = [image_path_to_ndarray(str(file)) for file in sorted((Path(__file__).parent / 'images').glob('*.jpg'))]
+    crops = [detection.image for detections in fastanpr.detector.run(images) for detection in detections]
+
+    per_crop = [fastanpr.recogniser.run(crop) for crop in crops]
+    batched = fastanpr.recogniser.run_batch(crops, batch_size=batch_size)
+
+    # Texts and polygons match exactly: line detection runs on each crop alone in both paths
+    assert [recognition and (recognition.text, recognition.poly) for recognition in batched] == \
+        [recognition and (recognition.text, recognition.poly) for recognition in per_crop]
+    # The recogniser pads every line to the widest line of its batch. Per crop, a batch holds the lines of one crop,
+    # batched it holds the lines of several, so the extra padding shifts the CTC probabilities slightly. Padding
+    # per crop would mean one recogniser call per crop, which is what batching avoids.
+    assert [recognition and recognition.conf for recognition in batched] == \
+        pytest.approx([recognition and recognition.conf for recognition in per_crop], abs=1e-3)
+
+
 def ocr_box_encapsulates_detected_box(ocr_box: List[int], det_box: List[int]) -> bool:
     return (ocr_box[0] >= det_box[0] and ocr_box[1] >= det_box[1] and
             ocr_box[2] <= det_box[2] and ocr_box[3] <= det_box[3])
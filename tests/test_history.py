@@ -0,0 +1,151 @@
+import os
+import json
+import pytest
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Camera, Detection, Vehicle
+from services.history import DetectionFilters, decode_cursor, iter_detections, search_detections
+
+START = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def session_factory(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anpr.db'}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        cameras = [Camera(name=f"Camera {index}", location_name="Cotonou") for index in range(2)]
+        vehicle = Vehicle(plate_number="AB1234CD", brand="Toyota")
+        db.add_all(cameras + [vehicle])
+        db.flush()
+        # Pairs of detections share a timestamp, so that pages have to break ties on the id
+        db.add_all([
+            Detection(plate_number="AB1234CD" if index % 3 == 0 else f"XY{index:04d}ZT", confidence=0.9,
+                      image_data="large base64 image", image_path=f"ab/cd/{index}.webp",
+                      camera_id=cameras[index % 2].id, vehicle_id=vehicle.id if index % 3 == 0 else None,
+                      detected_at=START + timedelta(minutes=index // 2))
+            for index in range(25)
+        ])
+        db.commit()
+    yield session_factory
+    engine.dispose()
+
+
+def all_pages(db, filters, limit):
+    pages, cursor = [], None
+    while True:
+        detections, cursor = search_detections(db, filters, cursor=cursor, limit=limit)
+        pages.append([detection.id for detection in detections])
+        if cursor is None:
+            return pages
+
+
+def test_keyset_pages_cover_every_detection_once(session_factory):
+    with session_factory() as db:
+        expected = [
+            detection.id for detection in
+            db.query(Detection).order_by(Detection.detected_at.desc(), Detection.id.desc()).all()
+        ]
+        pages = all_pages(db, DetectionFilters(), limit=4)
+        assert [len(page) for page in pages] == [4] * 6 + [1]
+        assert sum(pages, []) == expected
+
+        # Every third detection, the odd ids coming from camera 1
+        pages = all_pages(db, DetectionFilters(plate_number="ab-1234 cd", camera_id=1), limit=2)
+        assert sum(pages, []) == [25, 19, 13, 7, 1]
+
+        since, until = START + timedelta(minutes=2), START + timedelta(minutes=4)
+        detections, cursor = search_detections(db, DetectionFilters(since=since, until=until), limit=10)
+        assert [detection.id for detection in detections] == [8, 7, 6, 5] and cursor is None
+
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_pages_are_read_in_a_fixed_number_of_queries(session_factory):
+    with session_factory() as db:
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute",
+                     lambda connection, cursor, statement, *args: statements.append(statement))
+        detections, _ = search_detections(db, DetectionFilters(), limit=20)
+        for detection in detections:
+            assert detection.camera.name.startswith("Camera")
+            assert detection.vehicle is None or detection.vehicle.brand == "Toyota"
+
+    # The page, then its cameras and its vehicles
+    assert len(statements) == 3
+    assert "image_data" not in statements[0]
+
+
+def test_iter_detections_reads_in_batches(session_factory):
+    with session_factory() as db:
+        detections = list(iter_detections(db, DetectionFilters(camera_id=2), batch_size=5))
+    assert [detection.id for detection in detections] == list(range(24, 0, -2))
+
+
+def test_history_endpoints(session_factory):
+    from fastapi.testclient import TestClient
+    import api
+    from database import get_db
+
+    def get_test_db():
+        with session_factory() as db:
+            yield db
+
+    api.app.dependency_overrides[get_db] = get_test_db
+    api.app.dependency_overrides[api.get_session_factory] = lambda: session_factory
+    try:
+        client = TestClient(api.app)
+        response = client.get("/plates/AB1234CD/history", params={"limit": 3}).json()
+        assert [item["id"] for item in response["items"]] == [25, 22, 19]
+        assert response["items"][0]["vehicle"]["brand"] == "Toyota"
+        assert response["items"][0]["image_url"] == "/images/ab/cd/24.webp"
+        response = client.get("/plates/AB1234CD/history", params={"cursor": response["next_cursor"]}).json()
+        assert [item["id"] for item in response["items"]] == [16, 13, 10, 7, 4, 1]
+        assert response["next_cursor"] is None
+
+        assert client.get("/detections", params={"cursor": "invalid"}).status_code == 400
+        response = client.get("/detections", params={"camera_id": 1, "since": "2024-03-01T12:10:00"}).json()
+        assert [item["camera"]["id"] for item in response["items"]] == [1, 1, 1]
+
+        response = client.get("/detections/export", params={"camera_id": 2})
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["id"] for line in lines] == list(range(24, 0, -2))
+    finally:
+        api.app.dependency_overrides.clear()
+
+
+@pytest.mark.skipif(not os.getenv("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL is not set")
+def test_history_queries_use_the_detected_at_indexes(monkeypatch):
+    from alembic import command
+    from alembic.config import Config
+    from services.history import detections_query
+
+    monkeypatch.setenv("DATABASE_URL", os.environ["TEST_DATABASE_URL"])
+    config = Config(os.path.join(os.path.dirname(__file__), "..", "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(os.path.dirname(__file__), "..", "alembic"))
+    command.downgrade(config, "base")
+    command.upgrade(config, "head")
+    engine = create_engine(os.environ["TEST_DATABASE_URL"])
+    try:
+        after = (START, 1000)
+        with engine.connect() as connection:
+            connection.execute(text("SET enable_seqscan = off"))
+            for filters, index in (
+                    (DetectionFilters(plate_number="AB1234CD"), "plate_number_detected_at"),
+                    (DetectionFilters(camera_id=1, since=START - timedelta(days=1)), "camera_id_detected_at"),
+            ):
+                query = detections_query(filters, after).limit(50).compile(
+                    engine, compile_kwargs={"literal_binds": True}
+                )
+                plan = "\n".join(connection.execute(text(f"EXPLAIN {query}")).scalars())
+                assert index in plan
+    finally:
+        engine.dispose()
+        command.downgrade(config, "base")
@@ -0,0 +1,89 @@
+import base64
+import cv2
+import pytest
+import numpy as np
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Detection
+from services.image_store import ImageStore
+from services.migrate_images import migrate_images
+
+
+def make_image(seed: int = 0, size=(40, 120)) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, (*size, 3), dtype=np.uint8)
+
+
+def test_images_are_content_addressed_and_deduplicated(tmp_path: Path):
+    store = ImageStore(tmp_path, format="webp")
+    first = store.save(make_image(0))
+    assert store.save(make_image(0)) == first
+    assert store.save(make_image(1)) != first
+
+    directory, subdirectory, name = first.split("/")
+    assert name.startswith(directory + subdirectory) and name.endswith(".webp")
+    assert len(list(tmp_path.rglob("*.webp"))) == 2
+    assert not list(tmp_path.rglob(".tmp-*"))
+    assert cv2.imdecode(np.frombuffer(store.read(first), np.uint8), cv2.IMREAD_COLOR).shape == (40, 120, 3)
+
+
+def test_crops_and_invalid_paths(tmp_path: Path):
+    store = ImageStore(tmp_path, format="jpeg")
+    paths = store.save_crops(make_image(size=(100, 100)), [[10, 10, 50, 30], [5, 5, 5, 5]])
+    assert paths[0].endswith(".jpg") and paths[1] is None
+    for path in ("../secret.jpg", "ab/cd/../../x.jpg", "ab/cd/abcd.exe", paths[0].replace("/", "", 1)):
+        with pytest.raises(ValueError):
+            store.path(path)
+
+
+def test_image_data_is_moved_to_the_store_in_chunks(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anpr.db'}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    _, png = cv2.imencode(".png", make_image(2))
+    _, jpeg = cv2.imencode(".jpg", make_image(3))
+    images = [
+        base64.b64encode(png.tobytes()).decode(),
+        "data:image/jpeg;base64," + base64.b64encode(jpeg.tobytes()).decode(),
+        base64.b64encode(jpeg.tobytes()).decode(),
+        "not base64 !",
+    ]
+    with session_factory() as db:
+        db.add_all([
+            Detection(plate_number=f"P{index}", confidence=1.0, image_data=image_data,
+                      detected_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+            for index, image_data in enumerate(images)
+        ])
+        db.commit()
+
+    store = ImageStore(tmp_path / "media")
+    assert migrate_images(session_factory, store, chunk_size=3) == (3, 1)
+
+    with session_factory() as db:
+        detections = db.query(Detection).order_by(Detection.id).all()
+        assert [detection.image_data is None for detection in detections] == [True, True, True, False]
+        assert detections[0].image_path.endswith(".webp")
+        # The same JPEG is stored once, as is
+        assert detections[1].image_path == detections[2].image_path
+        assert store.read(detections[1].image_path) == jpeg.tobytes()
+
+
+def test_images_are_served_with_etag(tmp_path: Path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    store = ImageStore(tmp_path)
+    path = store.save(make_image())
+    monkeypatch.setattr(api, "image_store", store)
+    client = TestClient(api.app)
+
+    response = client.get(f"/images/{path}")
+    assert response.status_code == 200 and response.headers["content-type"] == "image/webp"
+    assert response.content == store.read(path)
+    etag = response.headers["etag"]
+    assert client.get(f"/images/{path}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/images/../api.py").status_code == 404
+    assert client.get("/images/" + path.replace(path[5], "0" if path[5] != "0" else "1", 1)).status_code == 404
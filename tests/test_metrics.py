@@ -0,0 +1,96 @@
+import time
+import asyncio
+import pytest
+import numpy as np
+from datetime import datetime, timezone
+
+from anpr import fastanpr
+from anpr.batching import BatchScheduler
+from anpr.detection import Detection
+from anpr.recognition import Recognition
+
+
+class FakeDetector:
+    """Finds one plate per 10 in the first pixel of each image."""
+
+    def run(self, images):
+        time.sleep(0.002)
+        crop = np.zeros((40, 120, 3), dtype=np.uint8)
+        return [
+            [Detection(image=crop, box=[10 * index, 0, 10 * index + 120, 40], conf=0.9)
+             for index in range(int(image[0, 0, 0]) // 10)]
+            for image in images
+        ]
+
+
+class FakeRecogniser:
+    def run_batch(self, crops):
+        time.sleep(0.001 * len(crops))
+        return [Recognition(text="AB1234", poly=[[0, 0], [120, 0], [120, 40], [0, 40]], conf=0.8) for _ in crops]
+
+
+@pytest.fixture
+def fast_anpr(monkeypatch):
+    monkeypatch.setattr(fastanpr, "create_detector", lambda *args: FakeDetector())
+    monkeypatch.setattr(fastanpr, "create_recogniser", lambda *args: FakeRecogniser())
+    timings = []
+    yield fastanpr.FastANPR(executor="inline", timing_hook=timings.append), timings
+
+
+def test_runs_are_timed_per_stage_and_per_plate(fast_anpr):
+    anpr, timings = fast_anpr
+    images = [np.full((8, 8, 3), value, dtype=np.uint8) for value in (20, 0, 10)]
+    results = anpr.run_sync(images)
+
+    assert len(timings) == 1
+    run_timings = timings[0]
+    assert run_timings.frames == 3 and run_timings.crops == 3 and run_timings.plates == [2, 0, 1]
+    assert run_timings.detect >= 0.002 and run_timings.ocr >= 0.003 and run_timings.merge > 0
+
+    number_plate = results[0][0]
+    assert number_plate.timings["detect"] == pytest.approx(1000 * run_timings.detect / 3)
+    assert number_plate.timings["ocr"] == pytest.approx(1000 * run_timings.ocr / 3)
+    assert number_plate.processing_time == pytest.approx(sum(number_plate.timings.values()))
+    assert number_plate.to_dict()["timings"] == number_plate.timings
+
+
+def test_detection_rows_record_the_processing_time(fast_anpr):
+    from services.detections import detection_row
+
+    anpr, _ = fast_anpr
+    number_plate = anpr.run_sync(np.full((8, 8, 3), 10, dtype=np.uint8))[0][0]
+    row = detection_row(number_plate, camera_id=1, detected_at=datetime.now(timezone.utc))
+    assert row["processing_time"] == number_plate.processing_time > 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_reports_batch_queue_waits():
+    class EchoANPR:
+        async def run(self, images):
+            return [[] for _ in images]
+
+    batches = []
+    scheduler = BatchScheduler(EchoANPR(), max_batch_size=4, max_wait_ms=20, on_batch=batches.append)
+    scheduler.start()
+    await asyncio.gather(*(scheduler.submit(np.zeros((4, 4, 3), dtype=np.uint8)) for _ in range(6)))
+    await scheduler.stop()
+
+    assert [len(waits) for waits in batches] == [4, 2]
+    # The second batch waited for max_wait to fill up
+    assert all(wait >= 0 for waits in batches for wait in waits) and max(batches[1]) >= 0.015
+
+
+def test_metrics_endpoint(fast_anpr):
+    from fastapi.testclient import TestClient
+    import api
+    from services.metrics import observe_batch
+
+    anpr, timings = fast_anpr
+    anpr.timing_hook = api.observe_timings
+    anpr.run_sync([np.full((8, 8, 3), 20, dtype=np.uint8)])
+    observe_batch([0.001, 0.002])
+
+    text = TestClient(api.app).get("/metrics").text
+    assert 'anpr_stage_duration_seconds_count{stage="detect"}' in text
+    assert 'anpr_stage_duration_seconds_bucket{le="0.005",stage="queue_wait"}' in text
+    assert "anpr_batch_size_count" in text and 'anpr_plates_per_frame_bucket{le="2.0"}' in text
@@ -0,0 +1,142 @@
+import base64
+import io
+import numpy as np
+from PIL import Image
+
+from anpr.motion import MotionGate
+from anpr.numberplate import NumberPlate
+from services.streams import Frame, StreamIngestor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def street(car_at: int = None, seed: int = 0) -> np.ndarray:
+    """A grey 640x360 street with sensor noise, and a dark car at x = `car_at`."""
+    noise = np.random.default_rng(seed).integers(-6, 7, (360, 640, 3))
+    image = np.clip(120 + noise, 0, 255).astype(np.uint8)
+    if car_at is not None:
+        image[200:300, car_at:car_at + 160] = 30
+    return image
+
+
+def inferred(gate: MotionGate, stream_id, image: np.ndarray) -> bool:
+    """Checks a frame, remembering it when it goes through inference."""
+    check = gate.check(stream_id, image)
+    if check is not None:
+        gate.remember(check, [])
+    return check is not None
+
+
+def test_static_frames_are_skipped_until_something_moves():
+    clock = FakeClock()
+    gate = MotionGate(refresh_interval=10, clock=clock)
+
+    assert inferred(gate, "cam-1", street(seed=0))
+    assert not inferred(gate, "cam-1", street(seed=1))
+    assert inferred(gate, "cam-2", street(seed=2))
+    clock.now = 1
+    assert inferred(gate, "cam-1", street(car_at=100, seed=3))
+    assert not inferred(gate, "cam-1", street(car_at=100, seed=4))
+    # Forced refresh of a static camera
+    clock.now = 11.5
+    assert inferred(gate, "cam-1", street(car_at=100, seed=5))
+
+    stats = gate.stats()
+    assert stats["frames"] == 6 and stats["skipped"] == 2 and stats["forced_refreshes"] == 1
+    assert stats["skipped_fraction"] == 2 / 6 and stats["streams"] == 2
+
+
+def test_sensitivity():
+    reference, small_change = street(seed=0), street(seed=1)
+    small_change[10:30, 10:30] = 200
+    insensitive, sensitive = MotionGate(min_area=0.01), MotionGate(min_area=0.0005)
+    for gate in (insensitive, sensitive):
+        inferred(gate, "cam", reference)
+    assert not inferred(insensitive, "cam", small_change)
+    assert inferred(sensitive, "cam", small_change)
+
+
+def test_frames_become_the_reference_once_remembered():
+    clock = FakeClock()
+    gate = MotionGate(clock=clock)
+    plates = [NumberPlate(det_box=[1, 2, 3, 4], det_conf=0.9, rec_text="AB1234", rec_conf=0.8)]
+    empty, car = street(seed=0), street(car_at=100, seed=1)
+    gate.remember(gate.check("cam", empty), [])
+
+    # While the frame with a car is being inferred, its static followers still go through inference
+    pending = gate.check("cam", car)
+    clock.now = 1
+    follower = gate.check("cam", street(car_at=100, seed=2))
+    assert pending is not None and follower is not None
+    gate.remember(follower, plates)
+    # The slower inference of the earlier frame does not replace the more recent reference
+    gate.remember(pending, [])
+    assert gate.check("cam", street(car_at=100, seed=3)) is None and gate.last("cam") == plates
+
+
+def test_ingestor_drops_static_frames():
+    class CountingANPR:
+        frames = 0
+
+        def run_sync(self, images, stream_ids=None):
+            self.frames += len(images)
+            return [[] for _ in images]
+
+    anpr = CountingANPR()
+    ingestor = StreamIngestor(anpr, sink=None, motion_gate=MotionGate())
+    batch = [Frame(1, None, street(seed=seed)) for seed in range(4)] + [Frame(1, None, street(car_at=300))]
+    frames, results = ingestor._recognise(batch)
+
+    assert frames == [batch[0], batch[4]] and len(results) == 2 and anpr.frames == 2
+    assert ingestor.motion_gate.stats()["skipped"] == 3
+
+
+def test_api_answers_static_frames_with_the_last_plates(monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    plates = [NumberPlate(det_box=[1, 2, 3, 4], det_conf=0.9, rec_text="AB1234", rec_conf=0.8, timings={"ocr": 3.0})]
+
+    class FakeScheduler:
+        submitted = 0
+        fail = False
+
+        async def submit(self, image):
+            self.submitted += 1
+            if self.fail:
+                raise RuntimeError("inference failed")
+            return plates
+
+    scheduler = FakeScheduler()
+    monkeypatch.setattr(api, "scheduler", scheduler)
+    monkeypatch.setattr(api, "result_cache", None)
+    monkeypatch.setattr(api, "detection_writer", None)
+    monkeypatch.setattr(api, "motion_gate", MotionGate())
+
+    def body(image: np.ndarray) -> dict:
+        buffer = io.BytesIO()
+        Image.fromarray(image).save(buffer, format="PNG")
+        return {"image": base64.b64encode(buffer.getvalue()).decode(), "camera_id": "3"}
+
+    client = TestClient(api.app, raise_server_exceptions=False)
+    responses = [client.post("/recognise", json=body(street(seed=seed))).json() for seed in range(3)]
+
+    assert scheduler.submitted == 1
+    assert all(response["number_plates"][0]["rec_text"] == "AB1234" for response in responses)
+    # Only the inferred frame reports timings
+    assert [response["number_plates"][0]["timings"] for response in responses] == [{"ocr": 3.0}, None, None]
+    assert client.get("/motion/stats").json()["skipped"] == 2
+
+    # A frame whose inference failed does not become the reference, the next static frame is inferred instead
+    scheduler.fail = True
+    car = street(car_at=100, seed=3)
+    assert client.post("/recognise", json=body(car)).status_code == 500
+    scheduler.fail = False
+    assert client.post("/recognise", json=body(car)).json()["number_plates"][0]["timings"] == {"ocr": 3.0}
+    assert scheduler.submitted == 3
@@ -0,0 +1,20 @@
+import json
+from dataclasses import asdict
+
+from anpr.numberplate import NumberPlate
+
+
+def test_to_dict_round_trips_through_json_and_the_response_model():
+    from api import FastANPRResponse, number_plates_content
+
+    number_plates = [
+        NumberPlate(det_box=[10, 20, 130, 60], det_conf=0.91, rec_poly=[[12, 24], [128, 24], [128, 56], [12, 56]],
+                    rec_text="AB1234", rec_conf=0.87, track_id=3, timings={"detect": 12.5, "ocr": 4.0}),
+        NumberPlate(det_box=[0, 0, 5, 5], det_conf=0.4),
+    ]
+    content = json.loads(json.dumps(number_plates_content(number_plates)))
+
+    assert content["number_plates"][0] == asdict(number_plates[0])
+    assert [NumberPlate(**fields) for fields in content["number_plates"]] == number_plates
+    # The payload validates against the documented response schema unchanged
+    assert FastANPRResponse(**content).model_dump() == content
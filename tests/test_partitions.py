@@ -0,0 +1,58 @@
+import os
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import create_engine, text
+
+# Runs the migrations on a scratch PostgreSQL database, e.g. TEST_DATABASE_URL=postgresql://localhost/anpr_test
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    from alembic import command
+    from alembic.config import Config
+
+    monkeypatch.setenv("DATABASE_URL", TEST_DATABASE_URL)
+    config = Config(os.path.join(os.path.dirname(__file__), "..", "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(os.path.dirname(__file__), "..", "alembic"))
+    command.downgrade(config, "base")
+    command.upgrade(config, "head")
+    engine = create_engine(TEST_DATABASE_URL)
+    yield engine
+    engine.dispose()
+    command.downgrade(config, "base")
+
+
+def test_rows_are_routed_to_monthly_partitions(engine):
+    from services.partitions import detection_partitions, ensure_detection_partitions
+
+    now = datetime.now(timezone.utc)
+    current = f"detections_{now:%Y_%m}"
+    assert current in ensure_detection_partitions(engine, months_ahead=1)
+    assert "detections_default" in detection_partitions(engine)
+
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO detections (plate_number, confidence, detected_at) VALUES ('AB1234CD', 0.9, now()), "
+            "('XY9876ZT', 0.9, '2999-01-15')"
+        ))
+        routed = dict(connection.execute(text("SELECT plate_number, tableoid::regclass::text FROM detections")).all())
+    assert routed == {"AB1234CD": current, "XY9876ZT": "detections_default"}
+
+    # Creating the partition of a month moves its rows out of the default partition
+    with engine.begin() as connection:
+        connection.execute(text("SELECT create_detections_partition('2999-01-01')"))
+        partition = connection.execute(
+            text("SELECT tableoid::regclass::text FROM detections WHERE plate_number = 'XY9876ZT'")
+        ).scalar()
+    assert partition == "detections_2999_01"
+
+
+def test_time_range_queries_use_the_composite_index(engine):
+    with engine.connect() as connection:
+        connection.execute(text("SET enable_seqscan = off"))
+        plan = "\n".join(connection.execute(text(
+            "EXPLAIN SELECT id FROM detections WHERE camera_id = 1 AND detected_at >= now() - interval '1 day'"
+        )).scalars())
+    assert "camera_id_detected_at" in plan
@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import multiprocessing
+import pytest
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+
+from anpr import fastanpr, pool
+from anpr.detection import Detection
+from anpr.recognition import Recognition
+from anpr.timing import StageTimings
+
+
+class PixelDetector:
+    """Finds one plate per image, the top left corner of the image."""
+
+    def run(self, images):
+        return [[Detection(image=image[:4, :4].copy(), box=[0, 0, 4, 4], conf=0.9)] for image in images]
+
+
+class PixelRecogniser:
+    """Reads the grey level of the first pixel of each crop as its plate."""
+
+    def run_batch(self, crops):
+        return [Recognition(text=f"P{crop[0, 0, 0]}", poly=[[0, 0], [4, 0], [4, 4], [0, 4]], conf=0.8)
+                for crop in crops]
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    # The worker loop runs in a thread of the test process, with stub models and a buffer of three 8x8 frames
+    for name in pool.THREAD_ENV_VARS:
+        monkeypatch.setenv(name, "")
+    monkeypatch.setattr(fastanpr, "create_detector", lambda *args: PixelDetector())
+    monkeypatch.setattr(fastanpr, "create_recogniser", lambda *args: PixelRecogniser())
+    worker = pool._Worker.__new__(pool._Worker)
+    worker.buffer = SharedMemory(create=True, size=3 * 8 * 8 * 3)
+    worker.connection, worker_connection = multiprocessing.Pipe()
+    thread = threading.Thread(
+        target=pool._worker_main, args=(worker_connection, worker.buffer.name, 1, None, {}), daemon=True
+    )
+    thread.start()
+    worker.wait_ready()
+    yield worker
+    worker.connection.send(("stop", None))
+    thread.join(timeout=5)
+    worker.connection.close()
+    worker.buffer.close()
+    worker.buffer.unlink()
+
+
+def test_frames_round_trip_through_shared_memory_in_chunks(worker):
+    values = [3, 250, 17, 0, 99, 128, 42]
+    images = [np.full((8, 8, 3), value, dtype=np.uint8) for value in values]
+
+    results, timings, stats = worker.run(images)
+
+    assert [image_results[0].rec_text for image_results in results] == [f"P{value}" for value in values]
+    # Three frames fit the buffer, so seven frames take three round trips
+    assert [chunk_timings.frames for chunk_timings in timings] == [3, 3, 1]
+    assert stats == []
+
+    with pytest.raises(ValueError, match="does not fit"):
+        worker.run([np.zeros((16, 16, 3), dtype=np.uint8)])
+    # The worker is still usable after a frame was refused
+    assert worker.run(images[:1])[0][0][0].rec_text == "P3"
+
+
+class FakeProcess:
+    def __init__(self):
+        self.pid, self.exitcode, self.alive = 1, None, True
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeWorker:
+    """Stands in for a worker process: runs block until `release` is set, and `die` makes the next run fail."""
+
+    instances = []
+    # Number of workers that can still be started, e.g. 0 when spawning processes fails
+    startable = None
+
+    def __init__(self, context, buffer_bytes, threads, cores, fast_anpr_kwargs):
+        if FakeWorker.startable is not None:
+            if FakeWorker.startable == 0:
+                raise OSError("Cannot allocate memory")
+            FakeWorker.startable -= 1
+        self.cores = cores
+        self.process = FakeProcess()
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.runs = 0
+        self.closed = False
+        self.die = False
+        FakeWorker.instances.append(self)
+
+    def wait_ready(self):
+        pass
+
+    def run(self, images, profile=False):
+        self.runs += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.die:
+            self.process.alive, self.process.exitcode = False, -9
+            raise RuntimeError("FastANPR worker 1 died.")
+        return [[] for _ in images], [StageTimings(frames=len(images))], []
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    FakeWorker.instances, FakeWorker.startable = [], None
+    monkeypatch.setattr(pool, "_Worker", FakeWorker)
+    worker_pool = pool.WorkerPool(workers=1, pin_cores=False)
+    yield worker_pool
+    for worker in FakeWorker.instances:
+        worker.release.set()
+    worker_pool.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_runs_keep_the_worker_busy_until_it_is_done(fake_pool):
+    worker = FakeWorker.instances[0]
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    cancelled = asyncio.create_task(fake_pool.run(image))
+    await asyncio.to_thread(worker.started.wait, 1)
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+
+    # The worker is still running the cancelled frames, so it is not idle and the next run waits for it
+    assert fake_pool._idle.empty()
+    queued = asyncio.create_task(fake_pool.run(image))
+    await asyncio.sleep(0.05)
+    assert worker.runs == 1 and not queued.done()
+
+    worker.release.set()
+    assert await asyncio.wait_for(queued, 1) == [[]]
+    assert worker.runs == 2
+
+
+@pytest.mark.asyncio
+async def test_dead_workers_are_replaced(fake_pool):
+    dead = FakeWorker.instances[0]
+    dead.die = True
+    dead.release.set()
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    with pytest.raises(RuntimeError, match="died"):
+        await fake_pool.run(image)
+
+    replacement_run = asyncio.create_task(fake_pool.run(image))
+    await asyncio.sleep(0.05)
+    assert len(FakeWorker.instances) == 2
+    replacement = FakeWorker.instances[1]
+    replacement.release.set()
+    assert await asyncio.wait_for(replacement_run, 1) == [[]]
+    assert dead.closed and dead.runs == 1 and replacement.runs == 1
+    assert fake_pool._workers == [replacement]
+
+
+async def until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_failed_replacements_are_retried(fake_pool):
+    dead = FakeWorker.instances[0]
+    dead.die = True
+    dead.release.set()
+    FakeWorker.startable = 0
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    with pytest.raises(RuntimeError, match="died"):
+        await fake_pool.run(image)
+
+    # The new worker could not be created, so the dead one is idle again and the next run fails fast
+    with pytest.raises(RuntimeError, match="died"):
+        await asyncio.wait_for(fake_pool.run(image), 1)
+    assert dead.runs == 2 and len(FakeWorker.instances) == 1
+
+    # Once workers can be started again, the dead worker is replaced after its next run
+    await asyncio.wait_for(until(lambda: fake_pool._idle.qsize() == 1), 1)
+    FakeWorker.startable = 1
+    with pytest.raises(RuntimeError, match="died"):
+        await asyncio.wait_for(fake_pool.run(image), 1)
+    replacement_run = asyncio.create_task(fake_pool.run(image))
+    await asyncio.wait_for(until(lambda: len(FakeWorker.instances) == 2), 1)
+    replacement = FakeWorker.instances[1]
+    replacement.release.set()
+    assert await asyncio.wait_for(replacement_run, 1) == [[]]
+    assert dead.runs == 3 and dead.closed and fake_pool._workers == [replacement]
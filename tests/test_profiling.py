@@ -0,0 +1,115 @@
+import io
+import base64
+import pstats
+import pytest
+import numpy as np
+from PIL import Image
+from pathlib import Path
+from types import SimpleNamespace
+
+from anpr import fastanpr
+from anpr.detection import Detection
+from anpr.recognition import Recognition
+from services.profiling import ProfileStore, RequestProfiler
+
+
+class FakeDetector:
+    def run(self, images):
+        crop = np.zeros((40, 120, 3), dtype=np.uint8)
+        return [[Detection(image=crop, box=[0, 0, 120, 40], conf=0.9)] for _ in images]
+
+
+class FakeRecogniser:
+    def run_batch(self, crops):
+        return [Recognition(text="AB1234", poly=[[0, 0], [120, 0], [120, 40], [0, 40]], conf=0.8) for _ in crops]
+
+
+def request(headers=None, query=None):
+    return SimpleNamespace(headers=headers or {}, query_params=query or {})
+
+
+def test_store_is_a_ring_buffer(tmp_path: Path):
+    store = ProfileStore(tmp_path, max_profiles=3)
+    ids = [store.save({("x.py", 1, "f"): (1, 1, 0.1, 0.1, {})}, {"endpoint": f"/{index}"}) for index in range(5)]
+
+    assert store.ids() == ids[2:]
+    assert [profile["endpoint"] for profile in store.list()] == ["/4", "/3", "/2"]
+    assert pstats.Stats(str(store.path(ids[4]))).total_calls == 1
+    with pytest.raises(ValueError):
+        store.path(ids[0])
+    with pytest.raises(ValueError):
+        store.path("../" + ids[4])
+
+
+def test_profiled_requests(tmp_path: Path):
+    draws = iter([0.5, 0.05])
+    profiler = RequestProfiler(ProfileStore(tmp_path), on_demand=True, sample_rate=0.1, rng=lambda: next(draws))
+
+    assert profiler.start(request()) is None
+    assert profiler.start(request()).reason == "sampled"
+    # A single request is profiled at a time
+    assert profiler.start(request(headers={"x-anpr-profile": "1"})) is None
+    assert profiler.skipped == 1
+
+    profiler._busy.release()
+    profile = profiler.start(request(query={"profile": "true"}))
+    assert profile.reason == "requested"
+    profile.call(sorted, [3, 1, 2])
+    profile_id = profiler.finish(profile, endpoint="/recognise")
+    assert profiler.store.list()[0]["id"] == profile_id and profiler.profiled == 1
+    assert profiler.start(request(query={"profile": "1"})) is not None
+
+
+def test_profile_endpoints(tmp_path: Path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(fastanpr, "create_detector", lambda *args: FakeDetector())
+    monkeypatch.setattr(fastanpr, "create_recogniser", lambda *args: FakeRecogniser())
+    anpr = fastanpr.FastANPR(executor="thread")
+    monkeypatch.setattr(api, "fast_anpr", anpr)
+    # Profiled requests do not go through the batch scheduler
+    monkeypatch.setattr(api, "scheduler", object())
+    monkeypatch.setattr(api, "detection_writer", None)
+    monkeypatch.setattr(api, "profiler", RequestProfiler(ProfileStore(tmp_path)))
+    monkeypatch.setenv("ANPR_ADMIN_TOKEN", "secret")
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48)).save(buffer, format="PNG")
+    client = TestClient(api.app)
+    response = client.post("/recognise", json={"image": base64.b64encode(buffer.getvalue()).decode()},
+                           headers={"X-ANPR-Profile": "1"})
+    anpr.close()
+    assert response.status_code == 200 and response.json()["number_plates"][0]["rec_text"] == "AB1234"
+    profile_id = response.headers["X-Profile-Id"]
+
+    assert client.get("/admin/profiles").status_code == 403
+    assert client.get("/admin/profiles", headers={"X-Admin-Token": "secrets"}).status_code == 403
+    admin = {"X-Admin-Token": "secret"}
+    listing = client.get("/admin/profiles", headers=admin).json()
+    assert listing["profiled"] == 1 and listing["profiles"][0]["id"] == profile_id
+    assert listing["profiles"][0]["endpoint"] == "/recognise"
+
+    download = client.get(f"/admin/profiles/{profile_id}", headers=admin)
+    (tmp_path / "download.prof").write_bytes(download.content)
+    functions = {function for _, _, function in pstats.Stats(str(tmp_path / "download.prof")).stats}
+    # Decoding on the event loop, detection and OCR on the inference thread
+    assert {"base64_image_to_ndarray", "run", "run_batch", "to_response"} <= functions
+    report = client.get(f"/admin/profiles/{profile_id}", params={"format": "text", "limit": 5}, headers=admin).text
+    assert "function calls" in report
+    assert client.get("/admin/profiles/missing", headers=admin).status_code == 404
+
+
+def test_admin_endpoints_are_closed_without_a_token(tmp_path: Path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+
+    monkeypatch.setattr(api, "profiler", RequestProfiler(ProfileStore(tmp_path)))
+    monkeypatch.delenv("ANPR_ADMIN_TOKEN", raising=False)
+    monkeypatch.delenv("ANPR_ADMIN_OPEN", raising=False)
+    client = TestClient(api.app)
+
+    assert client.get("/admin/profiles").status_code == 404
+    assert client.get("/admin/profiles", headers={"X-Admin-Token": ""}).status_code == 404
+    monkeypatch.setenv("ANPR_ADMIN_OPEN", "true")
+    assert client.get("/admin/profiles").json()["profiled"] == 0
@@ -0,0 +1,60 @@
+import numpy as np
+from types import SimpleNamespace
+
+from anpr.recognition import Recogniser
+
+
+class StubOCR:
+    """Stands in for PaddleOCR: lines are read as "AB123", except blank images which are read as nothing."""
+
+    drop_score = 0.5
+    args = SimpleNamespace(det_box_type="quad")
+
+    def __init__(self):
+        self.recognised = []
+
+    def text_recognizer(self, images):
+        self.recognised.append([image.shape for image in images])
+        return [("AB123", 0.9) if image.any() else ("", 0.0) for image in images], 0.0
+
+
+def make_recogniser(monkeypatch) -> Recogniser:
+    # PaddleOCR is not loaded, only the reading logic of "rec" mode is exercised
+    recogniser = Recogniser.__new__(Recogniser)
+    recogniser.mode, recogniser.batch_size, recogniser.multiline_aspect = "rec", 8, 2.0
+    recogniser.model = StubOCR()
+    recogniser.detected = []
+
+    def detect_lines(image):
+        recogniser.detected.append(image.shape)
+        height, width = image.shape[:2]
+        box = np.array([[0, 0], [width, 0], [width, height // 2], [0, height // 2]], dtype=np.float32)
+        return [box], [np.full((height // 2, width, 3), 255, dtype=np.uint8)]
+
+    monkeypatch.setattr(recogniser, "_detect_lines", detect_lines)
+    return recogniser
+
+
+def test_rec_mode_falls_back_to_line_detection(monkeypatch):
+    recogniser = make_recogniser(monkeypatch)
+    wide = np.full((40, 160, 3), 255, dtype=np.uint8)
+    narrow = np.full((80, 100, 3), 255, dtype=np.uint8)
+    blank = np.zeros((40, 160, 3), dtype=np.uint8)
+
+    results = recogniser.run_batch([wide, narrow, blank])
+
+    # The wide crop is read whole, the narrow (multi-line) and unreadable ones go through line detection
+    assert recogniser.detected == [narrow.shape, blank.shape]
+    assert recogniser.model.recognised[0] == [wide.shape, blank.shape]
+    assert results[0].text == "AB123" and results[0].poly == [[0, 0], [160, 0], [160, 40], [0, 40]]
+    assert results[1].text == "AB123" and results[1].poly == [[0, 0], [100, 0], [100, 40], [0, 40]]
+    assert results[2].text == "AB123"
+
+
+def test_empty_crops_are_not_read_as_single_lines(monkeypatch):
+    recogniser = make_recogniser(monkeypatch)
+    empty = np.zeros((0, 0, 3), dtype=np.uint8)
+    recogniser._detect_lines = lambda image: ([], [])
+
+    assert recogniser.run_batch([empty]) == [None]
+    assert recogniser.model.recognised == []
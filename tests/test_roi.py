@@ -0,0 +1,79 @@
+import pytest
+import numpy as np
+from pathlib import Path
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from anpr.numberplate import NumberPlate
+from anpr.roi import RegionOfInterest
+from database import Base
+from models import Camera
+from services.cameras import CameraRegions
+from services.streams import Frame, StreamIngestor
+
+
+def test_rectangles_are_cropped_and_plates_mapped_back():
+    region = RegionOfInterest.from_settings({"roi": [100, 200, 300, 260]})
+    image = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    crop, offset = region.crop(image)
+
+    assert offset == (100, 200) and crop.shape == (60, 200, 3)
+    assert np.array_equal(crop, image[200:260, 100:300])
+    number_plate = NumberPlate(det_box=[10, 5, 50, 25], det_conf=0.9, rec_poly=[[1, 2], [30, 2], [30, 12], [1, 12]],
+                               rec_text="AB1234", rec_conf=0.8)
+    mapped, = region.to_frame([number_plate], offset)
+    assert mapped.det_box == [110, 205, 150, 225] and mapped.rec_poly[0] == [101, 202]
+    assert mapped.rec_text == "AB1234"
+
+
+def test_polygons_mask_the_pixels_outside():
+    region = RegionOfInterest.from_settings({"roi": [[[0, 0], [99, 0], [0, 99]], [200, 0, 220, 10]]})
+    crop, offset = region.crop(np.full((120, 320, 3), 255, dtype=np.uint8))
+
+    assert offset == (0, 0) and crop.shape == (100, 220, 3)
+    assert crop[0, 0, 0] == 255 and crop[99, 99, 0] == 0 and crop[5, 210, 0] == 255 and crop[50, 150, 0] == 0
+
+
+def test_regions_outside_of_the_frame_and_invalid_settings():
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    crop, offset = RegionOfInterest([[100, 100, 200, 200]]).crop(image)
+    assert crop is image and offset == (0, 0)
+
+    assert RegionOfInterest.from_settings({"resolution": "1280x720"}) is None
+    with pytest.raises(ValueError):
+        RegionOfInterest.from_settings({"roi": [10, 10, 5, 20]})
+    with pytest.raises(ValueError):
+        RegionOfInterest.from_settings({"roi": [[0, 0], [10, 10]]})
+
+
+def test_camera_regions_are_loaded_from_the_camera_settings(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anpr.db'}")
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add_all([
+            Camera(id=1, name="A", location_name="Entrée", camera_settings={"roi": [0, 300, 1280, 720]}),
+            Camera(id=2, name="B", location_name="Sortie", camera_settings={"roi": "everything"}),
+            Camera(id=3, name="C", location_name="Quai", camera_settings={"roi": [0, 0, 10, 10]}, is_active=False),
+        ])
+        db.commit()
+
+        regions = CameraRegions()
+        assert regions.refresh(db) == 1
+    assert regions.get("1").box == [0, 300, 1280, 720] and regions.get(2) is None and regions.get(None) is None
+    engine.dispose()
+
+
+def test_ingestor_detects_on_the_region_of_interest():
+    class CropANPR:
+        def run_sync(self, images, stream_ids=None):
+            self.shapes = [image.shape for image in images]
+            return [[NumberPlate(det_box=[0, 0, 10, 10], det_conf=0.9)] for _ in images]
+
+    anpr = CropANPR()
+    ingestor = StreamIngestor(anpr, sink=None)
+    ingestor.regions[1] = RegionOfInterest([[20, 10, 60, 30]])
+    image = np.zeros((48, 64, 3), dtype=np.uint8)
+    _, results = ingestor._recognise([Frame(1, None, image), Frame(2, None, image)])
+
+    assert anpr.shapes == [(20, 40, 3), (48, 64, 3)]
+    assert [result[0].det_box for result in results] == [[20, 10, 30, 20], [0, 0, 10, 10]]
@@ -0,0 +1,46 @@
+import cv2
+import numpy as np
+from pathlib import Path
+from services.streams import StreamIngestor, parse_resolution
+
+
+class FrameIndexANPR:
+    """Stands in for FastANPR, returning the index written in the first pixel of each frame."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def run_sync(self, images, stream_ids=None):
+        self.batch_sizes.append(len(images))
+        return [[int(image[0, 0, 0])] for image in images]
+
+
+def write_video(path: Path, frames: int, fps: float, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    for index in range(frames):
+        writer.write(np.full((size[1], size[0], 3), index * 4, dtype=np.uint8))
+    writer.release()
+
+
+def test_video_file_frames_are_sampled_and_batched(tmp_path: Path):
+    video = tmp_path / "camera.avi"
+    write_video(video, frames=40, fps=20)
+    results = []
+    anpr = FrameIndexANPR()
+
+    ingestor = StreamIngestor(anpr, sink=lambda frames, plates: results.extend(zip(frames, plates)), batch_size=4)
+    ingestor.add_source(camera_id=7, url=str(video), sample_fps=5, resolution=(32, 24))
+    ingestor.run()
+
+    # 2 seconds of video sampled at 5 fps
+    assert len(results) == 10
+    assert all(frame.camera_id == 7 and frame.image.shape == (24, 32, 3) for frame, _ in results)
+    assert all(size <= 4 for size in anpr.batch_sizes)
+    captured = [frame.captured_at for frame, _ in results]
+    assert captured == sorted(captured)
+
+
+def test_parse_resolution():
+    assert parse_resolution("1280x720") == (1280, 720)
+    assert parse_resolution([640, 480]) == (640, 480)
+    assert parse_resolution(None) is None
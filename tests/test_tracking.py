@@ -0,0 +1,104 @@
+import numpy as np
+from anpr.detection import Detection
+from anpr.recognition import Recognition
+from anpr.tracking import PlateTracker
+
+
+def make_detection(box, size_scale: int = 1) -> Detection:
+    height, width = (box[3] - box[1]) * size_scale, (box[2] - box[0]) * size_scale
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:, ::4] = 255
+    return Detection(image=image, box=box, conf=0.9)
+
+
+def test_plate_is_only_read_when_it_first_appears():
+    tracker = PlateTracker()
+    detection = make_detection([100, 100, 200, 140])
+    first = tracker.associate("camera", [detection])
+    track, _, sharpness = first[0]
+    track.add_read(Recognition(text="AB123", poly=[[0, 0], [100, 0], [100, 40], [0, 40]], conf=0.8),
+                   detection.image, sharpness)
+    second = tracker.associate("camera", [make_detection([105, 102, 205, 142])])
+
+    assert first[0][1] is True
+    assert second[0][1] is False
+    assert first[0][0].track_id == second[0][0].track_id
+    assert (tracker.ocr_calls, tracker.ocr_skipped) == (1, 1)
+
+
+def test_plate_is_read_again_until_text_is_read():
+    tracker = PlateTracker()
+    detection = make_detection([100, 100, 200, 140])
+    track, _, sharpness = tracker.associate("camera", [detection])[0]
+    track.add_read(None, detection.image, sharpness)
+
+    assert tracker.associate("camera", [detection])[0][1] is True
+
+
+def test_plate_is_read_again_when_crop_gets_larger():
+    tracker = PlateTracker(area_gain=1.5)
+    detection = make_detection([100, 100, 200, 140])
+    track, needs_ocr, sharpness = tracker.associate("camera", [detection])[0]
+    track.add_read(Recognition(text="AB123", poly=[[0, 0], [100, 0], [100, 40], [0, 40]], conf=0.8),
+                   detection.image, sharpness)
+
+    closer = tracker.associate("camera", [make_detection([90, 95, 230, 150])])[0]
+
+    assert closer[0] is track
+    assert closer[1] is True
+
+
+def test_streams_are_tracked_separately_and_tracks_expire():
+    tracker = PlateTracker(max_missed=1)
+    box = [10, 10, 60, 30]
+    camera_a = tracker.associate("a", [make_detection(box)])[0][0]
+    camera_b = tracker.associate("b", [make_detection(box)])[0][0]
+    assert camera_a.track_id != camera_b.track_id
+
+    tracker.associate("a", [])
+    tracker.associate("a", [])
+    assert tracker.associate("a", [make_detection(box)])[0][0] is not camera_a
+
+
+def test_track_read_merges_votes():
+    tracker = PlateTracker()
+    detection = make_detection([0, 0, 100, 40])
+    track, _, sharpness = tracker.associate("camera", [detection])[0]
+    poly = [[10, 5], [90, 5], [90, 35], [10, 35]]
+    for text, conf in [("AB123", 0.9), ("A8123", 0.95), ("AB123", 0.7)]:
+        track.add_read(Recognition(text=text, poly=poly, conf=conf), detection.image, sharpness)
+
+    read = track.read(make_detection([0, 0, 200, 80]).image)
+    assert read.text == "AB123"
+    assert read.conf == 0.9
+    assert read.poly == [[20, 10], [180, 10], [180, 70], [20, 70]]
+
+
+def test_new_plate_on_several_frames_of_a_batch_is_read_once(monkeypatch):
+    from anpr import fastanpr
+
+    class MovingPlateDetector:
+        """Finds the same plate moving 5 pixels right on each frame."""
+
+        def run(self, images):
+            return [[make_detection([100 + 5 * index, 100, 200 + 5 * index, 140])] for index in range(len(images))]
+
+    class CountingRecogniser:
+        crops = 0
+
+        def run_batch(self, crops):
+            self.crops += len(crops)
+            return [Recognition(text="AB123", poly=[[0, 0], [100, 0], [100, 40], [0, 40]], conf=0.8) for _ in crops]
+
+    recogniser = CountingRecogniser()
+    monkeypatch.setattr(fastanpr, "create_detector", lambda *args: MovingPlateDetector())
+    monkeypatch.setattr(fastanpr, "create_recogniser", lambda *args: recogniser)
+    anpr = fastanpr.FastANPR(executor="inline", tracker=PlateTracker())
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+
+    results = anpr.run_sync([frame, frame], stream_ids=["camera", "camera"])
+
+    assert recogniser.crops == 1
+    assert [plates[0].rec_text for plates in results] == ["AB123", "AB123"]
+    assert results[0][0].track_id == results[1][0].track_id
+    assert results[1][0].timings["ocr"] == 0.0
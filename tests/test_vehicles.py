@@ -0,0 +1,135 @@
+import pytest
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Detection, Vehicle
+from services.detection_writer import DetectionWriter
+from services.vehicles import VehicleResolver
+
+
+@pytest.fixture
+def session_factory(tmp_path: Path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anpr.db'}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    with session_factory() as db:
+        db.add(Vehicle(plate_number="AB1234CD", brand="Toyota"))
+        db.commit()
+    yield session_factory
+    engine.dispose()
+
+
+def count_queries(db) -> list:
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute",
+                 lambda connection, cursor, statement, *args: statements.append(statement))
+    return statements
+
+
+def test_plates_are_resolved_from_the_cache(session_factory):
+    resolver = VehicleResolver(create_unknown=False, refresh_interval=None)
+    with session_factory() as db:
+        known = db.query(Vehicle.id).filter_by(plate_number="AB1234CD").scalar()
+        assert resolver.resolve(db, ["AB1234CD", "XY9876ZT"]) == {"AB1234CD": known, "XY9876ZT": None}
+        statements = count_queries(db)
+        # Known and unknown plates are both cached
+        assert resolver.resolve(db, ["AB1234CD", "XY9876ZT"]) == {"AB1234CD": known, "XY9876ZT": None}
+    assert statements == []
+    assert resolver.stats()["hits"] == 2 and resolver.stats()["lookups"] == 1
+
+
+def test_unknown_plates_are_created_in_one_batch(session_factory):
+    resolver = VehicleResolver(min_confidence=0.5, refresh_interval=None)
+    rows = [
+        {"plate_number": "AB1234CD", "confidence": 0.9},
+        {"plate_number": "XY9876ZT", "confidence": 0.9},
+        {"plate_number": "XY9876ZT", "confidence": 0.8},
+        {"plate_number": "LOW0000", "confidence": 0.1},
+        {"plate_number": "LINKED00", "confidence": 0.9, "vehicle_id": 42},
+    ]
+    with session_factory() as db:
+        statements = count_queries(db)
+        assigned = resolver.assign(db, rows)
+        db.commit()
+    assert len(statements) == 2
+    assert "vehicle_id" not in rows[0]
+    assert assigned[1]["vehicle_id"] == assigned[2]["vehicle_id"] is not None
+    assert assigned[3]["vehicle_id"] is None and assigned[4]["vehicle_id"] == 42
+    with session_factory() as db:
+        assert db.query(Vehicle).filter_by(plate_number="XY9876ZT").one().country == "BENIN"
+        assert db.query(Vehicle).filter_by(plate_number="LOW0000").count() == 0
+
+    # The created vehicle is cached once committed, and the negative entry of a confident read is not trusted
+    with session_factory() as db:
+        statements = count_queries(db)
+        assigned = resolver.assign(db, [{"plate_number": "XY9876ZT", "confidence": 0.9}])
+        assert resolver.assign(db, [{"plate_number": "LOW0000", "confidence": 0.1}])[0]["vehicle_id"] is None
+        assert assigned[0]["vehicle_id"] is not None and statements == []
+        assert resolver.assign(db, [{"plate_number": "LOW0000", "confidence": 0.9}])[0]["vehicle_id"] is not None
+        db.rollback()
+
+    # A rolled back vehicle is never cached
+    assert resolver.stats()["entries"] == 3
+    with session_factory() as db:
+        assert db.query(Vehicle).filter_by(plate_number="LOW0000").count() == 0
+
+
+def test_only_confident_reads_create_vehicles_by_default(session_factory):
+    resolver = VehicleResolver(refresh_interval=None)
+    with session_factory() as db:
+        assigned = resolver.assign(db, [{"plate_number": "AB1234CD", "confidence": 0.95},
+                                        {"plate_number": "A81234C0", "confidence": 0.6}])
+        db.commit()
+    assert assigned[0]["vehicle_id"] is not None and assigned[1]["vehicle_id"] is None
+    with session_factory() as db:
+        assert [vehicle.plate_number for vehicle in db.query(Vehicle)] == ["AB1234CD"]
+
+
+def test_vehicle_changes_invalidate_the_cache(session_factory):
+    resolver = VehicleResolver(create_unknown=False, refresh_interval=None)
+    with session_factory() as db:
+        assert resolver.resolve(db, ["NEW0001"]) == {"NEW0001": None}
+        vehicle = db.query(Vehicle).filter_by(plate_number="AB1234CD").one()
+        resolver.resolve(db, ["AB1234CD"])
+
+        db.add(Vehicle(plate_number="NEW0001"))
+        vehicle.plate_number = "AB1234CE"
+        db.commit()
+        assert len(resolver) == 0
+        assert resolver.resolve(db, ["NEW0001", "AB1234CD"])["AB1234CD"] is None
+
+
+def test_refresh_reads_the_vehicles_changed_by_other_processes(session_factory):
+    now = [0.0]
+    resolver = VehicleResolver(create_unknown=False, refresh_interval=30, clock=lambda: now[0])
+    with session_factory() as db:
+        resolver.resolve(db, ["AB1234CD", "OTHER01"])
+        # Core statements, as run by another process, bypass the mapper events
+        db.execute(update(Vehicle).values(plate_number="OTHER01", updated_at=datetime(2100, 1, 1)))
+        db.commit()
+        assert resolver.resolve(db, ["OTHER01"]) == {"OTHER01": None}
+
+        now[0] = 31.0
+        vehicle_id = db.query(Vehicle.id).scalar()
+        assert resolver.resolve(db, ["OTHER01", "AB1234CD"]) == {"OTHER01": vehicle_id, "AB1234CD": None}
+
+
+def test_writer_links_detections_to_vehicles(session_factory, tmp_path: Path):
+    resolver = VehicleResolver(refresh_interval=None)
+    writer = DetectionWriter(session_factory, batch_size=10, flush_interval=0.1, spill_dir=tmp_path,
+                             vehicle_resolver=resolver)
+    detected_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    writer.start()
+    writer.submit([
+        {"plate_number": plate_number, "confidence": 0.9, "detected_at": detected_at}
+        for plate_number in ("AB1234CD", "XY9876ZT", "AB1234CD")
+    ])
+    writer.stop()
+
+    with session_factory() as db:
+        detections = db.query(Detection).order_by(Detection.id).all()
+        assert [detection.vehicle.plate_number for detection in detections] == ["AB1234CD", "XY9876ZT", "AB1234CD"]
+    assert writer.stats()["vehicles"]["created"] == 1
@@ -0,0 +1,95 @@
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import StolenVehicle, User, Vehicle
+from models.alert import AlertSeverity, AlertType
+from services.watchlist import Watchlist, WatchlistEntry, canonical_plate, edit_distance, stolen_vehicle_alert
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, email="agent@example.com", hashed_password="x", first_name="A", last_name="B"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_stolen(db, stolen_id: int, plate: str, updated_at: datetime, is_active: bool = True) -> StolenVehicle:
+    if db.get(Vehicle, stolen_id) is None:
+        db.add(Vehicle(id=stolen_id, plate_number=plate, is_stolen=True))
+    stolen = StolenVehicle(
+        id=stolen_id, plate_number=plate, report_number=f"R{stolen_id}", stolen_date=updated_at,
+        vehicle_id=stolen_id, reported_by_id=1, is_active=is_active, updated_at=updated_at
+    )
+    db.merge(stolen)
+    db.commit()
+    return stolen
+
+
+def test_canonical_plate_merges_confusable_characters():
+    assert canonical_plate("ab-1O8 cd") == canonical_plate("AB 108 CD") == canonical_plate("A8I0BC0")
+    assert edit_distance("AB123CD", "AB123C", 1) == 1
+    assert edit_distance("AB123CD", "XY123CD", 1) == 2
+
+
+def test_exact_and_fuzzy_matches():
+    watchlist = Watchlist(max_distance=1)
+    watchlist.add(WatchlistEntry(1, 10, "AB1234CD"))
+    watchlist.add(WatchlistEntry(2, 20, "XY9876ZT"))
+
+    assert watchlist.match("AB1234CD").distance == 0
+    assert watchlist.match("A81234CO").entry.stolen_vehicle_id == 1
+    assert watchlist.match("AB1234C").distance == 1
+    assert watchlist.match("AB1274CD").distance == 1
+    assert watchlist.match("XY9876ZT").entry.vehicle_id == 20
+    assert watchlist.match("AB1274CE") is None
+    assert watchlist.match("AB12") is None
+    assert watchlist.match(None) is None
+
+    watchlist.remove(1)
+    assert watchlist.match("AB1234CD") is None
+
+
+def test_refresh_is_incremental(db):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    add_stolen(db, 1, "AB1234CD", start)
+    add_stolen(db, 2, "XY9876ZT", start, is_active=False)
+    watchlist = Watchlist()
+
+    assert watchlist.refresh(db) == 1
+    assert len(watchlist) == 1 and watchlist.match("XY9876ZT") is None
+
+    add_stolen(db, 2, "XY9876ZT", start + timedelta(minutes=1))
+    add_stolen(db, 1, "AB1234CD", start + timedelta(minutes=1), is_active=False)
+    watchlist.refresh(db)
+    assert watchlist.match("AB1234CD") is None
+    assert watchlist.match("XY9876ZT").entry.stolen_vehicle_id == 2
+
+
+def test_matches_build_stolen_vehicle_alerts(db):
+    add_stolen(db, 1, "AB1234CD", datetime(2024, 1, 1, tzinfo=timezone.utc))
+    watchlist = Watchlist()
+    watchlist.refresh(db)
+
+    exact = stolen_vehicle_alert(watchlist.match("AB1234CD"), detection_id=5, camera_id=None)
+    assert exact.type == AlertType.STOLEN_VEHICLE and exact.severity == AlertSeverity.CRITICAL
+    assert (exact.detection_id, exact.vehicle_id) == (5, 1)
+    assert stolen_vehicle_alert(watchlist.match("AB1284CD")).severity == AlertSeverity.HIGH
+
+
+def test_large_watchlist_lookups_are_fast():
+    watchlist = Watchlist()
+    for index in range(100_000):
+        watchlist.add(WatchlistEntry(index, index, f"AA{index:06d}"))
+
+    start = time.perf_counter()
+    for index in range(1000):
+        assert watchlist.match(f"AA{index:06d}X") is not None
+    assert (time.perf_counter() - start) / 1000 < 1e-3